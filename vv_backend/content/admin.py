@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from content.models.content import Video, Podcast
 from content.models.metadata import Category, Language, Region, Hashtag, Tag, ContentTitle, ChannelDetail, ThumbnailDetail, VideoLocalization
+from content.models.trending import TrendingVideo
 from content.models.people import IndustryPersonnel, ContentPersonnelCast, ContentPersonnelProduce
 
 admin.site.register(
@@ -22,6 +23,8 @@ admin.site.register(
         IndustryPersonnel,
         ContentPersonnelCast,
         ContentPersonnelProduce,
-        VideoLocalization
+        VideoLocalization,
+        # Rankings
+        TrendingVideo,
     ]
 )
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Deletion of contents (Video/Podcast) together with every row that points at them through content_type + content_id.
+
+Those generic relations have no DB-level foreign key, so nothing cascades by itself.
+Dependents are deleted with one "DELETE ... WHERE content_type_id = ... AND content_id IN (...)" per dependent table,
+whatever the number of contents, so a takedown sweep of 10k videos is a handful of statements instead of 6 per video.
+
+Sample usage:
+
+    Video.objects.filter(uploaded_by=user).delete()      # ContentQuerySet.delete() goes through here
+    delete_contents(Video, video_ids)
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from user_interactions.models import Activity, Comment, LikeDislike, PlaylistContent
+from content.models.people import ContentPersonnelCast, ContentPersonnelProduce
+from content.models.metadata import ContentTitle
+from content.models.recommendations import Recommendation, RelatedContent
+
+# Every model with a content_type + content_id pair pointing at a content
+GENERIC_DEPENDENT_MODELS = (
+    # first, the likes/comments/playlist entries then have no activity left to cascade to
+    Activity,
+    Comment,
+    LikeDislike,
+    PlaylistContent,
+    ContentPersonnelCast,
+    ContentPersonnelProduce,
+    ContentTitle,
+    # the rows recommending the content, those of the lists next to it are replaced by the next build
+    RelatedContent,
+    Recommendation,
+)
+
+
+def delete_content_dependents(model, content_ids):
+    """
+    Delete everything pointing at the contents of type `model` with the given ids (a list or a values('pk') queryset).
+    Returns the number of deleted rows per dependent model label, like QuerySet.delete() does.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    deleted = {}
+    for dependent in GENERIC_DEPENDENT_MODELS:
+        # Queryset-level delete: no per-row delete() call, so removing likes of a deleted content doesn't touch its counters
+        count, _ = dependent._base_manager.filter(content_type=content_type, content_id__in=content_ids).delete()
+        if count:
+            deleted[dependent._meta.label] = count
+    return deleted
+
+
+def delete_contents(model, content_ids):
+    """
+    Delete many contents of one type and all their dependents in one transaction.
+    Returns (total deleted rows, deleted rows per model label), like QuerySet.delete().
+    """
+    with transaction.atomic():
+        return model.objects.filter(pk__in=content_ids).delete()
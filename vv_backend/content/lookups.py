@@ -0,0 +1,206 @@
+"""
+Process-local cache of the small metadata (dimension) tables: Category, Language, Region, Hashtag and Tag.
+
+They are tiny and almost never change, but serializers and imports would otherwise query them on every request
+(e.g. rendering the language name of every title of a page). LookupCache keeps id -> object and name -> id in memory:
+- bounded (least recently used entries are evicted past MAX_ENTRIES) and every entry expires after TTL seconds
+- invalidated on save/delete of the row by the signals in content/signals.py (in this process; other processes
+  see the change when their entry expires, or right away with a shared cache tier)
+- optionally backed by a Django cache (SHARED_CACHE alias, e.g. Redis/memcached) shared by all the processes
+ContentType lookups don't need this, ContentType.objects already caches them per process (see user_interactions/generic.py).
+
+Sample usage:
+
+    get_lookup(Language).get_by_id(video.original_language_id)
+    get_lookup(Tag).get_many_by_name(["music", "live"])     # {name: Tag}, one query for all the misses
+    get_lookup(Tag).get_or_create_by_name("music")
+    get_lookup(Tag).stats()                                # hit rate etc.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from content.models.metadata import Category, Hashtag, Language, Region, Tag
+
+LOOKUP_MODELS = (Category, Language, Region, Hashtag, Tag)
+
+
+class LookupCache:
+    def __init__(self, model, ttl=300, max_entries=10_000, shared_cache=None):
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # django.core.cache alias of the optional shared tier, None to only cache in this process
+        self.shared_cache = shared_cache
+
+        self._lock = threading.Lock()
+        # pk -> (expires at, object), least recently used first
+        self._by_id = OrderedDict()
+        # name -> pk, checked against the object's current name on read (so renames don't need a reverse index)
+        self._id_by_name = {}
+
+        # metrics
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_by_id(self, pk):
+        return self.get_many_by_id([pk]).get(pk)
+
+    def get_many_by_id(self, pks):
+        """
+        {pk: object} for the given pks, the ones that don't exist are left out. One query at most, for all the misses.
+        """
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for pk in set(pks):
+                if pk is None:
+                    continue
+                entry = self._by_id.get(pk)
+                if entry is not None and entry[0] > now:
+                    self._by_id.move_to_end(pk)
+                    found[pk] = entry[1]
+                    self._hits += 1
+                else:
+                    missing.append(pk)
+
+        if missing and self.shared_cache:
+            shared = caches[self.shared_cache].get_many([self._shared_key(pk) for pk in missing])
+            for pk in list(missing):
+                obj = shared.get(self._shared_key(pk))
+                if obj is not None:
+                    found[pk] = obj
+                    missing.remove(pk)
+                    self._store([obj], shared=False)
+                    with self._lock:
+                        self._shared_hits += 1
+
+        if missing:
+            loaded = self.model._default_manager.in_bulk(missing)
+            with self._lock:
+                self._misses += len(missing)
+            self._store(loaded.values())
+            found.update(loaded)
+        return found
+
+    def get_by_name(self, name):
+        return self.get_many_by_name([name]).get(name)
+
+    def get_many_by_name(self, names):
+        """
+        {name: object} for the given names, the ones that don't exist are left out. One query at most, for all the misses.
+        """
+        names = set(names)
+        with self._lock:
+            pks = {name: self._id_by_name[name] for name in names if name in self._id_by_name}
+        found = {}
+        for pk, obj in self.get_many_by_id(pks.values()).items():
+            if obj.name in names:
+                found[obj.name] = obj
+
+        missing = names - set(found)
+        if missing:
+            loaded = list(self.model._default_manager.filter(name__in=missing))
+            with self._lock:
+                self._misses += len(missing)
+            self._store(loaded)
+            found.update({obj.name: obj for obj in loaded})
+        return found
+
+    def get_or_create_by_name(self, name):
+        obj = self.get_by_name(name)
+        if obj is None:
+            obj, created = self.model._default_manager.get_or_create(name=name)
+            # a row created in a transaction that gets rolled back must not end up in the cache
+            transaction.on_commit(lambda: self._store([obj]))
+        return obj
+
+    def invalidate(self, obj):
+        with self._lock:
+            self._by_id.pop(obj.pk, None)
+            self._id_by_name.pop(obj.name, None)
+            self._invalidations += 1
+        if self.shared_cache:
+            caches[self.shared_cache].delete(self._shared_key(obj.pk))
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._id_by_name.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._shared_hits + self._misses
+            return {
+                'entries': len(self._by_id),
+                'hits': self._hits,
+                'shared_hits': self._shared_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'hit_rate': (self._hits + self._shared_hits) / lookups if lookups else None,
+            }
+
+    def _store(self, objs, shared=True):
+        objs = list(objs)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for obj in objs:
+                self._by_id[obj.pk] = (expires_at, obj)
+                self._by_id.move_to_end(obj.pk)
+                self._id_by_name[obj.name] = obj.pk
+            while len(self._by_id) > self.max_entries:
+                pk, (_, evicted) = self._by_id.popitem(last=False)
+                if self._id_by_name.get(evicted.name) == pk:
+                    del self._id_by_name[evicted.name]
+                self._evictions += 1
+        if shared and self.shared_cache and objs:
+            caches[self.shared_cache].set_many({self._shared_key(obj.pk): obj for obj in objs}, timeout=self.ttl)
+
+    def _shared_key(self, pk):
+        return f"lookup:{self.model._meta.label_lower}:{pk}"
+
+
+_lookups = {}
+_lookups_lock = threading.Lock()
+
+
+def get_lookup(model):
+    """
+    The process-wide LookupCache of one of the LOOKUP_MODELS.
+    """
+    lookup = _lookups.get(model)
+    if lookup is None:
+        if model not in LOOKUP_MODELS:
+            raise ValueError(f"{model.__name__} is not a cached lookup model.")
+        options = getattr(settings, 'METADATA_LOOKUP_CACHE', {})
+        with _lookups_lock:
+            lookup = _lookups.setdefault(model, LookupCache(
+                model,
+                ttl=options.get('TTL', 300),
+                max_entries=options.get('MAX_ENTRIES', 10_000),
+                shared_cache=options.get('SHARED_CACHE'),
+            ))
+    return lookup
+
+
+def clear_lookup_caches():
+    for lookup in list(_lookups.values()):
+        lookup.clear()
+
+
+@receiver(setting_changed)
+def _reset_lookups(setting, **kwargs):
+    if setting == 'METADATA_LOOKUP_CACHE':
+        _lookups.clear()
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from content.lookups import LOOKUP_MODELS, clear_lookup_caches, get_lookup
+from content.views import VideoListView
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the latency of the video list endpoint with the metadata lookup cache (content/lookups.py) warm "
+        "vs cleared before every request, on the videos already in the DB."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per measurement, the median is reported.")
+
+    def handle(self, *args, **options):
+        view = VideoListView.as_view()
+        factory = APIRequestFactory()
+
+        def request():
+            response = view(factory.get('/content/', {'page_size': options['page_size']}))
+            response.render()
+            return response
+
+        def measure(before_each):
+            timings, queries = [], []
+            for _ in range(options['repeat']):
+                before_each()
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    request()
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries.append(len(captured))
+            return statistics.median(timings), statistics.median(queries)
+
+        cold = measure(clear_lookup_caches)
+        request()  # warm up
+        warm = measure(lambda: None)
+
+        self.stdout.write(f"{'':>8} {'latency (ms)':>14} {'queries':>9}")
+        self.stdout.write(f"{'without':>8} {cold[0]:>14.2f} {cold[1]:>9}")
+        self.stdout.write(f"{'with':>8} {warm[0]:>14.2f} {warm[1]:>9}")
+        for model in LOOKUP_MODELS:
+            self.stdout.write(f"{model.__name__}: {get_lookup(model).stats()}")
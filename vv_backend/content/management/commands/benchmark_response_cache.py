@@ -0,0 +1,70 @@
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from content.models.content import Video
+from content.views import VideoListView
+
+SEED_PREFIX = 'bench-cache-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the video list endpoint: throughput of anonymous requests to the same hot pages "
+        "without and with the response cache (content/response_cache.py). Seeds --rows videos first if needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000, help="Number of seeded videos.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per measurement.")
+        parser.add_argument('--pages', type=int, default=5, help="Number of distinct hot pages (page sizes) requested in turn.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="bulk_create batch size when seeding.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the seeded videos afterwards.")
+
+    def handle(self, *args, **options):
+        seeded = Video.objects.filter(youtube_video_id__startswith=SEED_PREFIX)
+        existing = seeded.count()
+        if existing < options['rows']:
+            self.seed(existing, options['rows'], options['batch_size'])
+
+        view = VideoListView.as_view()
+        factory = APIRequestFactory()
+        page_sizes = [10 + i for i in range(options['pages'])]
+
+        def run():
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                for i in range(options['requests']):
+                    response = view(factory.get('/content/', {'page_size': page_sizes[i % len(page_sizes)]}))
+                    response.render()
+                elapsed = time.perf_counter() - start
+            return options['requests'] / elapsed, len(captured) / options['requests']
+
+        with override_settings(RESPONSE_CACHE={'ENABLED': False}):
+            uncached = run()
+        caches['default'].clear()
+        cached = run()
+
+        self.stdout.write(f"{'':>8} {'requests/sec':>14} {'queries/request':>16}")
+        self.stdout.write(f"{'without':>8} {uncached[0]:>14.0f} {uncached[1]:>16.2f}")
+        self.stdout.write(f"{'with':>8} {cached[0]:>14.0f} {cached[1]:>16.2f}")
+        self.stdout.write(f"Speedup: x{cached[0] / uncached[0]:.1f}")
+
+        if options['cleanup']:
+            seeded._raw_delete(seeded.db)
+            self.stdout.write("Seeded videos deleted.")
+
+    def seed(self, start, rows, batch_size):
+        self.stdout.write(f"Seeding {rows - start} videos...")
+        for batch_start in range(start, rows, batch_size):
+            batch_end = min(batch_start + batch_size, rows)
+            with transaction.atomic():
+                Video.objects.bulk_create(
+                    [Video(youtube_video_id=f"{SEED_PREFIX}{i}", description="benchmark") for i in range(batch_start, batch_end)],
+                    batch_size=batch_size,
+                )
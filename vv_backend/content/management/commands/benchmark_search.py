@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from content.models.content import Video
+from content.models.metadata import ContentTitle
+from content.search import get_search_backend
+
+SEED_PREFIX = 'bench-search-'
+WORDS = (
+    'cooking', 'pasta', 'travel', 'japan', 'guitar', 'lesson', 'football', 'highlights', 'python', 'tutorial',
+    'piano', 'cover', 'street', 'food', 'review', 'camera', 'drone', 'mountain', 'ocean', 'documentary',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark title search: ContentTitle.title_text__icontains (sequential scan) vs the search backend (content/search.py). "
+        "Seeds --rows titled videos and indexes them first if there are fewer benchmark rows than that."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Number of seeded titled videos to benchmark against.")
+        parser.add_argument('--query', default='guitar lesson')
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the median is reported.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="bulk_create/index batch size when seeding.")
+
+    def handle(self, *args, **options):
+        seeded = Video.objects.filter(youtube_video_id__startswith=SEED_PREFIX)
+        existing = seeded.count()
+        if existing < options['rows']:
+            self.seed(existing, options['rows'], options['batch_size'])
+
+        query = options['query']
+        backend = get_search_backend()
+
+        def icontains():
+            return list(ContentTitle.objects.filter(title_text__icontains=query).values_list('content_id', flat=True)[:20])
+
+        def search():
+            return backend.search(query, limit=20)
+
+        self.stdout.write(f"{'icontains (ms)':>16} {'search backend (ms)':>20}")
+        self.stdout.write(f"{self.measure(icontains, options['repeat']):>16.2f} {self.measure(search, options['repeat']):>20.2f}")
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def seed(self, start, rows, batch_size):
+        self.stdout.write(f"Seeding and indexing {rows - start} videos...")
+        backend = get_search_backend()
+        for batch_start in range(start, rows, batch_size):
+            batch_end = min(batch_start + batch_size, rows)
+            with transaction.atomic():
+                # bulk_create doesn't send signals, so the batch is indexed explicitly
+                videos = Video.objects.bulk_create(
+                    [Video(youtube_video_id=f"{SEED_PREFIX}{i}") for i in range(batch_start, batch_end)],
+                    batch_size=batch_size,
+                )
+                ContentTitle.objects.bulk_create(
+                    [
+                        ContentTitle(
+                            content_object=video,
+                            title_text=" ".join(WORDS[(i * k) % len(WORDS)] for k in (1, 3, 7)),
+                        )
+                        for i, video in enumerate(videos, start=batch_start)
+                    ],
+                    batch_size=batch_size,
+                )
+                backend.index_videos([video.pk for video in videos])
+        self.stdout.write(f"Seeded {rows - start} videos.")
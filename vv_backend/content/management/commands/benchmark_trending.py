@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from content.models.content import Video
+from content.models.metadata import Region
+from content.models.trending import TrendingVideo
+from content.trending import get_trending, ranked_videos, refresh_trending
+
+SEED_PREFIX = 'bench-trending-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark serving a regional top-k list: ad-hoc scoring + ORDER BY score LIMIT k over all the videos of the region "
+        "vs reading the precomputed TrendingVideo list (content/trending.py). "
+        "Seeds --rows videos spread over --regions regions first if there are fewer benchmark rows than that."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Number of seeded videos to benchmark against.")
+        parser.add_argument('--regions', type=int, default=50)
+        parser.add_argument('--k', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the median is reported.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="bulk_create batch size when seeding.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the seeded videos and regions afterwards.")
+
+    def handle(self, *args, **options):
+        regions = [Region.objects.get_or_create(name=f"{SEED_PREFIX}{i}")[0] for i in range(options['regions'])]
+        seeded = Video.objects.filter(youtube_video_id__startswith=SEED_PREFIX)
+        existing = seeded.count()
+        if existing < options['rows']:
+            self.seed(existing, options['rows'], regions, options['batch_size'])
+
+        k = options['k']
+        region = regions[0]
+
+        start = time.perf_counter()
+        refresh_trending(scopes=[TrendingVideo.Scope.REGION], k=k)
+        self.stdout.write(f"Refresh of all regional lists: {(time.perf_counter() - start) * 1000:.2f} ms (done periodically, off the request path)")
+
+        def ad_hoc():
+            return list(ranked_videos(TrendingVideo.Scope.REGION, k=k).filter(upload_region=region))
+
+        def precomputed():
+            return list(get_trending(TrendingVideo.Scope.REGION, region.id, k=k))
+
+        self.stdout.write(f"{'ad-hoc ORDER BY ... LIMIT k (ms)':>34} {'precomputed (ms)':>18}")
+        self.stdout.write(f"{self.measure(ad_hoc, options['repeat']):>34.2f} {self.measure(precomputed, options['repeat']):>18.2f}")
+
+        if options['cleanup']:
+            TrendingVideo.objects.filter(scope=TrendingVideo.Scope.REGION, scope_id__in=[r.id for r in regions]).delete()
+            # nothing else references the seeded rows, so skip the delete collector
+            seeded._raw_delete(seeded.db)
+            Region.objects.filter(name__startswith=SEED_PREFIX).delete()
+            self.stdout.write("Seeded videos deleted.")
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def seed(self, start, rows, regions, batch_size):
+        self.stdout.write(f"Seeding {rows - start} videos...")
+        for batch_start in range(start, rows, batch_size):
+            batch_end = min(batch_start + batch_size, rows)
+            with transaction.atomic():
+                Video.objects.bulk_create(
+                    [
+                        Video(
+                            youtube_video_id=f"{SEED_PREFIX}{i}",
+                            upload_region=regions[i % len(regions)],
+                            view_count=random.randint(0, 1_000_000),
+                            like_count=random.randint(0, 10_000),
+                        )
+                        for i in range(batch_start, batch_end)
+                    ],
+                    batch_size=batch_size,
+                )
+        self.stdout.write(f"Seeded {rows - start} videos.")
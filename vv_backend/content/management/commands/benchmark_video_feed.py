@@ -0,0 +1,82 @@
+import time
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from content.models.content import Video
+
+SEED_PREFIX = 'bench-feed-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark deep-page latency of the video feed: OFFSET/COUNT pagination (the old PageNumberPagination) "
+        "vs keyset pagination on (created_at, id) (content/pagination.py). "
+        "Seeds --rows videos first if there are fewer benchmark rows than that."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Number of seeded videos to benchmark against.")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the median is reported.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="bulk_create batch size when seeding.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the seeded videos afterwards.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        page_size = options['page_size']
+        seeded = Video.objects.filter(youtube_video_id__startswith=SEED_PREFIX)
+
+        existing = seeded.count()
+        if existing < rows:
+            self.seed(existing, rows, options['batch_size'])
+
+        ordering = ('-created_at', '-id')
+        queryset = Video.objects.order_by(*ordering)
+        self.stdout.write(f"{'depth':>10} {'offset (ms)':>12} {'keyset (ms)':>12}")
+        for depth in (0, rows // 10, rows // 2, rows - page_size):
+            # the cursor of a keyset page is the position of the last row of the previous page,
+            # clients get it for free from the previous response, so it is not part of the timing
+            cursor = None
+            if depth:
+                cursor = queryset.values_list('created_at', flat=True)[depth - 1]
+
+            def offset_page():
+                # what PageNumberPagination does: COUNT(*) + OFFSET scan
+                Video.objects.count()
+                return list(queryset[depth:depth + page_size])
+
+            def keyset_page():
+                # what VideoFeedPagination does: range read on the (created_at, id) index
+                page = queryset if cursor is None else queryset.filter(created_at__lt=cursor)
+                return list(page[:page_size + 1])
+
+            self.stdout.write(
+                f"{depth:>10} {self.measure(offset_page, options['repeat']):>12.2f} "
+                f"{self.measure(keyset_page, options['repeat']):>12.2f}"
+            )
+
+        if options['cleanup']:
+            # nothing references the seeded rows, so skip the delete collector
+            seeded._raw_delete(seeded.db)
+            self.stdout.write("Seeded videos deleted.")
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def seed(self, start, rows, batch_size):
+        self.stdout.write(f"Seeding {rows - start} videos...")
+        for batch_start in range(start, rows, batch_size):
+            batch_end = min(batch_start + batch_size, rows)
+            with transaction.atomic():
+                Video.objects.bulk_create(
+                    [Video(youtube_video_id=f"{SEED_PREFIX}{i}", description="benchmark") for i in range(batch_start, batch_end)],
+                    batch_size=batch_size,
+                )
+        self.stdout.write(f"Seeded {rows - start} videos.")
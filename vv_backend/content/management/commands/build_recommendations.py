@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the related contents and the recommendations of the users from the likes, playlists and metadata "
+        "(content/recommendations.py). Meant to be run periodically, e.g. nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=None, help="Related contents per content, defaults to RECOMMENDATIONS['TOP_N'].")
+        parser.add_argument('--user-top-n', type=int, default=None, help="Recommendations per user, defaults to RECOMMENDATIONS['USER_TOP_N'].")
+        parser.add_argument('--skip-users', action='store_true', help="Only rebuild the related contents.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = build_recommendations(top_n=options['top_n'], user_top_n=options['user_top_n'], users=not options['skip_users'])
+        self.stdout.write(
+            f"{stats['contents']} contents, {stats['users']} users, {stats['interactions']} interactions: "
+            f"{stats['related']} related contents and {stats['recommendations']} recommendations written "
+            f"in {time.monotonic() - started:.1f}s"
+        )
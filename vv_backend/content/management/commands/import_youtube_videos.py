@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from content.youtube_import import YoutubeVideoImporter, read_batches
+
+
+class Command(BaseCommand):
+    help = (
+        "Import YouTube Data API video resources from a JSON Lines file, one video per line (content/youtube_import.py). "
+        "Videos are upserted by youtube_video_id, so an import can be re-run or resumed safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON Lines file of video resources.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Videos imported per transaction.")
+        parser.add_argument('--offset', type=int, default=0, help="Byte offset to start reading from.")
+        parser.add_argument('--checkpoint', help="File the byte offset of the next line is written to after every batch.")
+        parser.add_argument('--resume', action='store_true', help="Start from the offset saved in --checkpoint.")
+
+    def handle(self, *args, **options):
+        offset = options['offset']
+        checkpoint = options['checkpoint']
+        if options['resume']:
+            if not checkpoint:
+                raise CommandError("--resume needs --checkpoint.")
+            if os.path.exists(checkpoint):
+                with open(checkpoint) as f:
+                    offset = int(f.read().strip() or 0)
+                self.stdout.write(f"Resuming from byte {offset}.")
+
+        importer = YoutubeVideoImporter()
+        imported = invalid = 0
+        start = time.perf_counter()
+        for records, offset, batch_invalid in read_batches(options['path'], options['batch_size'], offset):
+            imported += importer.import_batch(records)
+            invalid += batch_invalid
+            if checkpoint:
+                # written after the batch is committed, so a crash re-imports at most one batch
+                with open(checkpoint, 'w') as f:
+                    f.write(str(offset))
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"Imported {imported} videos ({imported / elapsed:.0f} rows/sec), at byte {offset}...")
+
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f"Done, {imported} videos imported in {elapsed:.1f}s ({rate:.0f} rows/sec), {invalid} invalid lines skipped.")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from content.models.content import Video
+from content.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "(Re)index every video in the search backend (content/search.py), e.g. after bulk imports that bypass the signals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help="Empty the index first.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if options['clear']:
+            backend.clear()
+
+        batch_size = options['batch_size']
+        indexed = 0
+        last_pk = None
+        while True:
+            # keyset iteration over the primary key, no OFFSET scan on big tables
+            videos = Video.objects.order_by('pk')
+            if last_pk is not None:
+                videos = videos.filter(pk__gt=last_pk)
+            batch = list(videos.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            backend.index_videos(batch)
+            indexed += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f"Indexed {indexed} videos...")
+        self.stdout.write(f"Done, {indexed} videos indexed.")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from content.models.trending import TrendingVideo
+from content.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed top-k trending video lists (content/trending.py). Meant to be run periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scope', action='append', choices=TrendingVideo.Scope.values,
+            help="Only refresh the lists of this scope type, can be given several times. Default: all of them.",
+        )
+        parser.add_argument('--k', type=int, default=None, help="Length of the lists, defaults to TRENDING['TOP_K'].")
+
+    def handle(self, *args, **options):
+        written = refresh_trending(scopes=options['scope'], k=options['k'])
+        for scope, count in written.items():
+            self.stdout.write(f"{scope}: {count} entries")
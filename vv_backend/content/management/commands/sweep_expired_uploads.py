@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from content.uploads import delete_expired_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the expired resumable uploads and their temporary files (content/uploads.py). "
+        "Meant to be run periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Uploads deleted per statement.")
+
+    def handle(self, *args, **options):
+        deleted = delete_expired_uploads(batch_size=options['batch_size'])
+        self.stdout.write(f"{deleted} expired uploads deleted")
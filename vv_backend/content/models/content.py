@@ -1,15 +1,40 @@
 import uuid
 
-from django.db import models
-from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.contrib.contenttypes.fields import GenericRelation
 
 from users.models import User
-from user_interactions.models import Comment, LikeDislike, PlaylistContent
+from content.deletion import delete_content_dependents
 from content.models.people import ContentPersonnelCast, ContentPersonnelProduce
 from content.models.metadata import Category, Language, Region, Hashtag, ContentTitle, Tag, ThumbnailDetail, ChannelDetail, VideoLocalization
 
 # TODO: Nishil - Would media be a better name than content?
 
+class ContentQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        A plain QuerySet.delete() doesn't call BaseContentModel.delete(), so the comments/likes/playlist entries/... of the deleted
+        contents would be left behind. Delete them first, one statement per dependent table (see content/deletion.py).
+        """
+        with transaction.atomic(using=self.db):
+            dependents = delete_content_dependents(self.model, self.values('pk'))
+            total, deleted = super().delete()
+        for label, count in dependents.items():
+            deleted[label] = deleted.get(label, 0) + count
+        return total + sum(dependents.values()), deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class VideoQuerySet(ContentQuerySet):
+    def visible(self):
+        """
+        The videos anyone may find and watch, i.e. all but the private ones. exclude() keeps the videos without a privacy status.
+        """
+        return self.exclude(privacy_status=Video.PRIVACY_PRIVATE)
+
+
 class BaseContentModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='%(class)s_uploaded_contents')
@@ -23,6 +48,14 @@ class BaseContentModel(models.Model):
     categories = models.ManyToManyField(Category, related_name='%(class)s_all_contents')
     hashtags = models.ManyToManyField(Hashtag, related_name='%(class)s_all_contents')
     score_imdb = models.DecimalField(null=True, max_digits=3, decimal_places=1) # 0.0 - 10.0, 3 digits max, 1 decimal_place
+    # reverse sides of the content_object of every ContentRelationModel (user_interactions/generic.py),
+    # so e.g. the titles or likes of a page of contents can be prefetched in one query
+    titles = GenericRelation(ContentTitle, content_type_field='content_type', object_id_field='content_id')
+    comments = GenericRelation('user_interactions.Comment', content_type_field='content_type', object_id_field='content_id')
+    likes_dislikes = GenericRelation('user_interactions.LikeDislike', content_type_field='content_type', object_id_field='content_id')
+    playlist_entries = GenericRelation('user_interactions.PlaylistContent', content_type_field='content_type', object_id_field='content_id')
+    cast_entries = GenericRelation(ContentPersonnelCast, content_type_field='content_type', object_id_field='content_id')
+    produce_entries = GenericRelation(ContentPersonnelProduce, content_type_field='content_type', object_id_field='content_id')
 
     # inferenced viewer stats data 
     like_count = models.IntegerField(default=0)
@@ -42,51 +75,23 @@ class BaseContentModel(models.Model):
     """
     file = models.FileField()
 
+    objects = ContentQuerySet.as_manager()
+
     class Meta:
         abstract = True
+        indexes = [
+            # backs the keyset (cursor) pagination of the feeds, see content/pagination.py
+            models.Index(fields=['created_at', 'id'], name='%(app_label)s_%(class)s_feed_idx'),
+        ]
 
     def delete(self, *args, **kwargs):
         """
-        Override delete method, so that we can delete all related comments/like-dislikes/, and removing it from all playlists
+        Override delete method, so that we can delete all related comments/like-dislikes/cast/produce/titles, and removing it from all playlists
         """
-        # Delete all related comments
-        Comment.objects.filter(
-            content_type=ContentType.objects.get_for_model(self),
-            content_id=self.id
-        ).delete()
-
-        # delete all related like-dislikes
-        LikeDislike.objects.filter(
-            content_type=ContentType.objects.get_for_model(self),
-            content_id=self.id
-        ).delete()
-
-        # remove from all playlists
-        PlaylistContent.objects.filter(
-            content_type=ContentType.objects.get_for_model(self), 
-            content_id=self.id
-        ).delete()
-        
-        # remove all cast table entries 
-        ContentPersonnelCast.objects.filter(
-            content_type=ContentType.objects.get_for_model(self),
-            content_id=self.id
-        ).delete()
-
-        # remove all produce table entries
-        ContentPersonnelProduce.objects.filter(
-            content_type=ContentType.objects.get_for_model(self),
-            content_id=self.id
-        ).delete()
-
-        # remove all titles
-        ContentTitle.objects.filter(
-            content_type=ContentType.objects.get_for_model(self),
-            content_id=self.id
-        ).delete()
-
-        # call parent method to actually delete the content itself
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            delete_content_dependents(type(self), [self.pk])
+            # call parent method to actually delete the content itself
+            return super().delete(*args, **kwargs)
 
 class Video(BaseContentModel):
     # file format
@@ -120,6 +125,8 @@ class Video(BaseContentModel):
 
     # Video status, may or may not be needed.
     upload_status = models.CharField(max_length=255, null=True)
+    # YouTube's privacyStatus: 'public', 'unlisted' or 'private', only private videos are hidden (see VideoQuerySet.visible())
+    PRIVACY_PRIVATE = 'private'
     privacy_status = models.CharField(max_length=255, null=True)
     # Time the video is scheduled to publish
     publish_at = models.DateTimeField(auto_now=True)
@@ -135,6 +142,8 @@ class Video(BaseContentModel):
     channel_info = models.OneToOneField(ChannelDetail, on_delete=models.CASCADE, related_name='%(class)s_details',null=True,blank=True)
     localization = models.OneToOneField(VideoLocalization, on_delete=models.CASCADE, related_name='%(class)s_details',null=True,blank=True)
 
+    objects = VideoQuerySet.as_manager()
+
   
 
 
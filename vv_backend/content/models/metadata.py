@@ -1,7 +1,6 @@
 from django.db import models
 
-from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+from user_interactions.generic import ContentRelationModel
 
 """
 Category, Language, Region: they seemed coupled, but 
@@ -33,15 +32,11 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
-class ContentTitle(models.Model):
+class ContentTitle(ContentRelationModel):
     title_text = models.CharField(null=False)
     language = models.ForeignKey(Language, on_delete=models.SET_NULL, null=True, related_name = "titles")
     is_native = models.BooleanField(null=True)
 
-    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True) # Its not a good idea to delete a content type anyway
-    content_id = models.UUIDField()
-    content_object = GenericForeignKey('content_type', 'content_id')
-
 
 ### Additional Youtube fields
 class VideoLocalization(models.Model):
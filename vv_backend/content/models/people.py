@@ -1,8 +1,8 @@
 import uuid
 
 from django.db import models
-from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+
+from user_interactions.generic import ContentRelationModel
 
 # TODO: Nishil - I think we should have just one people model for any and all people, cast, crew, etc.
 
@@ -16,13 +16,9 @@ class IndustryPersonnel(models.Model):
     last_name = models.CharField()
     # other fields can be added if needed
 
-class ContentPersonnelCast(models.Model):
+class ContentPersonnelCast(ContentRelationModel):
     personnel = models.ForeignKey(IndustryPersonnel, on_delete=models.CASCADE, related_name="cast_contents_table_entries")
 
-    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True) # Its not a good idea to delete a content type anyway
-    content_id = models.UUIDField()
-    content_object = GenericForeignKey('content_type', 'content_id')
-
     class CastType(models.IntegerChoices):
         UNSPECIFIED = 0, 'UNSPECIFIED'
         MAIN_ACTOR = 1, 'MAIN_ACTOR'
@@ -32,12 +28,14 @@ class ContentPersonnelCast(models.Model):
         default = CastType.UNSPECIFIED, 
     )
 
-class ContentPersonnelProduce(models.Model):
-    personnel = models.ForeignKey(IndustryPersonnel, on_delete=models.CASCADE, related_name='produce_contents_table_entries')
+    class Meta(ContentRelationModel.Meta):
+        constraints = [
+            # a personnel is cast once per content
+            models.UniqueConstraint(fields=['personnel', 'content_type', 'content_id'], name='unique_cast_per_content'),
+        ]
 
-    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True) # Its not a good idea to delete a content type anyway
-    content_id = models.UUIDField()
-    content_object = GenericForeignKey('content_type', 'content_id')
+class ContentPersonnelProduce(ContentRelationModel):
+    personnel = models.ForeignKey(IndustryPersonnel, on_delete=models.CASCADE, related_name='produce_contents_table_entries')
 
     class ProduceType(models.IntegerChoices):
         UNSPECIFIED = 0, 'UNSPECIFIED'
@@ -46,4 +44,10 @@ class ContentPersonnelProduce(models.Model):
     produce_type = models.IntegerField(
         choices = ProduceType.choices, 
         default = ProduceType.UNSPECIFIED, 
-    )
\ No newline at end of file
+    )
+
+    class Meta(ContentRelationModel.Meta):
+        constraints = [
+            # a personnel can both direct and produce a content, but only once as each
+            models.UniqueConstraint(fields=['personnel', 'content_type', 'content_id', 'produce_type'], name='unique_produce_per_content'),
+        ]
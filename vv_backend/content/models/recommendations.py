@@ -0,0 +1,41 @@
+from django.db import models
+from django.contrib.contenttypes.models import ContentType
+
+from users.models import User
+from user_interactions.generic import ContentRelationModel
+
+
+class RelatedContent(ContentRelationModel):
+    """
+    Precomputed top-N neighbours of a content ("up next"), one row per (source, rank), built by content/recommendations.py.
+    content_type/content_id is the recommended content, source_type/source_id the content it is recommended next to.
+    Serving the list of a content is an N rows range read on the (source_type, source_id, rank) index.
+    """
+    # no index of its own, the (source_type, source_id, rank) index starts with it
+    source_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+', db_index=False)
+    source_id = models.UUIDField()
+    rank = models.IntegerField()    # 1 = most similar
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta(ContentRelationModel.Meta):
+        indexes = ContentRelationModel.Meta.indexes + [
+            models.Index(fields=['source_type', 'source_id', 'rank'], name='content_related_rank_idx'),
+        ]
+
+
+class Recommendation(ContentRelationModel):
+    """
+    Precomputed top-N recommended contents of a user (home feed), one row per (user, rank), built by
+    content/recommendations.py from the neighbours of the contents the user liked or put in their playlists.
+    """
+    # no index of its own, the (user, rank) index starts with it
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    rank = models.IntegerField()    # 1 = best
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta(ContentRelationModel.Meta):
+        indexes = ContentRelationModel.Meta.indexes + [
+            models.Index(fields=['user', 'rank'], name='content_recommend_rank_idx'),
+        ]
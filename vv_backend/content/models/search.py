@@ -0,0 +1,24 @@
+from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+from content.models.content import Video
+
+
+class VideoSearchDocument(models.Model):
+    """
+    Denormalised search document of a video, kept in sync by content/search.py (PostgresSearchBackend).
+    The text is gathered from the video's titles, localizations, tags, hashtags and description,
+    and search_vector is its weighted tsvector (titles A, tags/hashtags B, description C), GIN indexed.
+    """
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    titles = models.TextField(blank=True)
+    keywords = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+    search_vector = SearchVectorField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='content_video_search_idx'),
+        ]
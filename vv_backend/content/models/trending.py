@@ -0,0 +1,30 @@
+from django.db import models
+
+from content.models.content import Video
+
+
+class TrendingVideo(models.Model):
+    """
+    Precomputed top-k trending videos, one row per (scope, scope_id, rank), refreshed by content/trending.py.
+    Serving a top-k list is then a k rows range read on the (scope, scope_id, rank) index,
+    instead of scoring and sorting every video of the region/language/category on each request.
+    """
+
+    class Scope(models.TextChoices):
+        GLOBAL = "global", "Global"
+        REGION = "region", "Region"
+        LANGUAGE = "language", "Language"
+        CATEGORY = "category", "Category"
+    scope = models.CharField(max_length=10, choices=Scope.choices)
+    # Region/Language/Category id, null for the global list
+    scope_id = models.BigIntegerField(null=True)
+    rank = models.IntegerField()    # 1 = most trending
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='trending_entries')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['scope', 'scope_id', 'rank'], name='content_trending_rank_idx'),
+        ]
@@ -0,0 +1,66 @@
+import uuid
+
+from django.db import models
+from django.contrib.contenttypes.models import ContentType
+
+from users.models import User
+
+
+class MediaUpload(models.Model):
+    """
+    A resumable chunked upload of a video/podcast file (see content/uploads.py).
+    The file is assembled in a temporary file of MEDIA_UPLOADS['TEMP_DIR'] named after the upload id, chunk `index`
+    covering the bytes [index * chunk_size, (index + 1) * chunk_size) of it.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        COMPLETE = "complete", "Complete"
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='media_uploads')
+    # Video or Podcast, created on finalize
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    content_id = models.UUIDField(null=True)
+
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # abandoned uploads (and their temporary file) are deleted past this, see "python manage.py sweep_expired_uploads"
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='content_upload_expiry_idx'),
+        ]
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def chunk_range(self, index):
+        """
+        (offset, size) of chunk `index` in the file, the last chunk can be shorter.
+        """
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, self.total_size - offset)
+
+
+class MediaUploadChunk(models.Model):
+    """
+    A chunk received (and verified) for a MediaUpload. Chunks can arrive in any order and in parallel,
+    the missing ones are the indexes without a row.
+    """
+    upload = models.ForeignKey(MediaUpload, on_delete=models.CASCADE, related_name='chunks')
+    index = models.IntegerField()
+    size = models.IntegerField()
+    # sha256 hex digest, as sent by the client and verified on receipt
+    checksum = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'index'], name='content_upload_chunk_unique'),
+        ]
@@ -0,0 +1,16 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class VideoFeedPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination for the video feed, newest first.
+    Unlike PageNumberPagination there is no COUNT(*) and no OFFSET scan: every page is a
+    "WHERE created_at < <cursor> ORDER BY created_at DESC, id DESC LIMIT n" range read on the
+    (created_at, id) index of BaseContentModel, so page 1 and page 10000 cost the same.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.CONTENT_FEED_PAGINATION['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = settings.CONTENT_FEED_PAGINATION['MAX_PAGE_SIZE']
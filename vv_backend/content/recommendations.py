@@ -0,0 +1,334 @@
+"""
+Personalised recommendations: "up next" contents similar to a content, and a home feed per user.
+
+Both lists are precomputed in batch by "python manage.py build_recommendations" and materialised into RelatedContent
+(top TOP_N neighbours of every content) and Recommendation (top USER_TOP_N contents of every user with interactions),
+replacing the previous lists in one transaction. Serving a list is then an N rows index range read plus the hydration of
+the contents (get_related(), get_recommendations()), whatever the number of interactions.
+
+The build works on sparse matrices (SciPy), the contents that can be recommended being the columns:
+- X, one row per user (the contents they liked) and one row per playlist (its contents). Item-to-item co-occurrence is
+  X^T X, normalised into a cosine similarity (columns of X scaled to unit length). The rows with more than MAX_ROW_ITEMS
+  contents are randomly sampled down to that many, a row of n contents adds n^2 pairs.
+- F, one row per content, one column per category/hashtag/tag/region/language, weighted by TF-IDF and scaled to unit
+  length. Content-based similarity is F F^T, it gives neighbours to contents nobody interacted with yet. The features
+  found on more than MAX_FEATURE_FREQUENCY of the contents are dropped: they say little about similarity and would make
+  F F^T dense.
+- The similarity of every content is X^T X + CONTENT_WEIGHT * F F^T, computed BLOCK_SIZE contents (rows) at a time and
+  cut down to the TOP_N best right away, so the full items x items matrix never exists in memory.
+- The recommendations of a user are the sum of the neighbours (top-N similarity matrix) of the contents in their profile
+  (likes and the contents of their own playlists), minus those contents, again BLOCK_SIZE users at a time.
+
+The interactions are streamed from the DB into typed arrays (no model instances), so tens of millions of them fit in a few
+hundred MB. Private videos are never recommended, nor used as a signal.
+
+Sample usage:
+
+    build_recommendations()
+    get_related(video_type, video.id, n=10)     # RelatedContent rows, best first
+    get_recommendations(user, n=20)            # Recommendation rows, best first
+"""
+
+from array import array
+from itertools import islice
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from content.models.content import Podcast, Video
+from content.models.recommendations import Recommendation, RelatedContent
+from user_interactions.models import LikeDislike, PlaylistContent
+
+
+def _options():
+    options = getattr(settings, 'RECOMMENDATIONS', {})
+    return {
+        'top_n': options.get('TOP_N', 20),
+        'user_top_n': options.get('USER_TOP_N', 50),
+        'like_weight': options.get('LIKE_WEIGHT', 1.0),
+        'playlist_weight': options.get('PLAYLIST_WEIGHT', 1.0),
+        'content_weight': options.get('CONTENT_WEIGHT', 0.3),
+        'max_row_items': options.get('MAX_ROW_ITEMS', 500),
+        'max_feature_frequency': options.get('MAX_FEATURE_FREQUENCY', 0.05),
+        'block_size': options.get('BLOCK_SIZE', 2000),
+        'chunk_size': options.get('CHUNK_SIZE', 10_000),
+        'batch_size': options.get('BATCH_SIZE', 5000),
+        'seed': options.get('SEED', 0),
+    }
+
+
+def recommendable_contents():
+    """
+    {model: queryset} of the contents that can be recommended.
+    """
+    return {
+        Video: Video.objects.visible(),
+        Podcast: Podcast.objects.all(),
+    }
+
+
+# Loading
+
+def _load_items(chunk_size):
+    """
+    (keys, features): the (content_type_id, content_id) of every content, in column order, and the binary
+    contents x metadata matrix.
+    """
+    index = {}
+    keys = []
+    feature_index = {}
+    feature_rows, feature_cols = array('q'), array('q')
+
+    def add_feature(row, kind, pk):
+        if pk is not None:
+            feature_rows.append(row)
+            feature_cols.append(feature_index.setdefault((kind, pk), len(feature_index)))
+
+    for model, queryset in recommendable_contents().items():
+        content_type_id = ContentType.objects.get_for_model(model).id
+        for pk, region, language in queryset.values_list('pk', 'upload_region', 'original_language').iterator(chunk_size=chunk_size):
+            row = index[(content_type_id, pk)] = len(keys)
+            keys.append((content_type_id, pk))
+            add_feature(row, 'region', region)
+            add_feature(row, 'language', language)
+
+        relations = [('category', model.categories.through, 'category_id'), ('hashtag', model.hashtags.through, 'hashtag_id')]
+        if model is Video:
+            relations.append(('tag', Video.tags.through, 'tag_id'))
+        content_field = f'{model._meta.model_name}_id'
+        for kind, through, field in relations:
+            for content_pk, pk in through.objects.values_list(content_field, field).iterator(chunk_size=chunk_size):
+                row = index.get((content_type_id, content_pk))
+                if row is not None:
+                    add_feature(row, kind, pk)
+
+    features = sparse.csr_matrix(
+        (np.ones(len(feature_rows), dtype=np.float32), (np.array(feature_rows, dtype=np.int64), np.array(feature_cols, dtype=np.int64))),
+        shape=(len(keys), len(feature_index)),
+    )
+    return index, keys, features
+
+
+def _load_interactions(index, options):
+    """
+    (user pks, X, U): the co-occurrence matrix X (a row per user of their likes, then a row per playlist of its
+    contents) and the profile matrix U (a row per user, in the order of the user pks: likes and own playlists).
+    """
+    chunk_size = options['chunk_size']
+    users = {}
+
+    like_rows, like_cols = array('q'), array('q')
+    likes = LikeDislike.objects.filter(is_like=True, posted_by__isnull=False)
+    for user_pk, content_type_id, content_id in likes.values_list('posted_by', 'content_type', 'content_id').iterator(chunk_size=chunk_size):
+        col = index.get((content_type_id, content_id))
+        if col is not None:
+            like_rows.append(users.setdefault(user_pk, len(users)))
+            like_cols.append(col)
+
+    playlists = {}
+    entry_rows, entry_owners, entry_cols = array('q'), array('q'), array('q')
+    entries = PlaylistContent.objects.values_list('playlist', 'playlist__created_by', 'content_type', 'content_id')
+    for playlist_pk, owner_pk, content_type_id, content_id in entries.iterator(chunk_size=chunk_size):
+        col = index.get((content_type_id, content_id))
+        if col is not None:
+            entry_rows.append(playlists.setdefault(playlist_pk, len(playlists)))
+            entry_owners.append(users.setdefault(owner_pk, len(users)))
+            entry_cols.append(col)
+
+    shape = (len(users), len(index))
+    like_cols = np.array(like_cols, dtype=np.int64)
+    entry_cols = np.array(entry_cols, dtype=np.int64)
+    liked = sparse.csr_matrix(
+        (np.full(len(like_cols), options['like_weight'], dtype=np.float32), (np.array(like_rows, dtype=np.int64), like_cols)), shape=shape,
+    )
+    entry_weights = np.full(len(entry_cols), options['playlist_weight'], dtype=np.float32)
+    listed = sparse.csr_matrix((entry_weights, (np.array(entry_rows, dtype=np.int64), entry_cols)), shape=(len(playlists), len(index)))
+    owned = sparse.csr_matrix((entry_weights, (np.array(entry_owners, dtype=np.int64), entry_cols)), shape=shape)
+    return list(users), sparse.vstack([liked, listed], format='csr'), (liked + owned).tocsr()
+
+
+# Similarity
+
+def _cap_rows(matrix, cap, rng):
+    """
+    The rows with more than `cap` non-zero entries randomly sampled down to `cap` of them.
+    """
+    lengths = np.diff(matrix.indptr)
+    if not cap or lengths.max(initial=0) <= cap:
+        return matrix
+    keep = np.ones(matrix.nnz, dtype=bool)
+    for row in np.flatnonzero(lengths > cap):
+        dropped = rng.choice(lengths[row], lengths[row] - cap, replace=False)
+        keep[matrix.indptr[row] + dropped] = False
+    rows = np.repeat(np.arange(matrix.shape[0]), lengths)
+    return sparse.csr_matrix((matrix.data[keep], (rows[keep], matrix.indices[keep])), shape=matrix.shape)
+
+
+def _scale(matrix, axis):
+    """
+    The rows (axis=1) or columns (axis=0) of a sparse matrix scaled to unit length, empty ones left as they are.
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=axis)).ravel())
+    inverse = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    scaling = sparse.diags(inverse.astype(np.float32))
+    return (matrix @ scaling if axis == 0 else scaling @ matrix).tocsr()
+
+
+def _content_features(features, max_frequency):
+    """
+    TF-IDF weighted, unit length rows of the binary contents x metadata matrix. Only the features shared by at least
+    2 contents and at most max_frequency of them are kept.
+    """
+    n_items = features.shape[0]
+    features = features.tocsc()
+    frequencies = np.diff(features.indptr)
+    kept = np.flatnonzero((frequencies >= 2) & (frequencies <= max_frequency * n_items))
+    idf = np.log(n_items / frequencies[kept]).astype(np.float32)
+    return _scale(features[:, kept] @ sparse.diags(idf), axis=1)
+
+
+def _top_n(scores, n, offset=None, exclude=None):
+    """
+    (rows, columns, scores, ranks) of the n best positive scores of every row of a sparse matrix, best first.
+    Without the entries (offset + row, row) (a content itself) or, with `exclude`, its non-zero entries.
+    """
+    scores = scores.tocsr()
+    if exclude is not None:
+        # explicit zeros, dropped below
+        scores = (scores - scores.multiply(exclude > 0)).tocsr()
+    indptr, indices, data = scores.indptr, scores.indices, scores.data
+    rows, cols, values, ranks = [], [], [], []
+    for row in range(scores.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        row_cols, row_scores = indices[start:end], data[start:end]
+        keep = row_scores > 0
+        if offset is not None:
+            keep &= row_cols != offset + row
+        row_cols, row_scores = row_cols[keep], row_scores[keep]
+        if len(row_scores) > n:
+            best = np.argpartition(-row_scores, n - 1)[:n]
+            row_cols, row_scores = row_cols[best], row_scores[best]
+        # ties in column order, so the lists are stable from one build to the next
+        order = np.lexsort((row_cols, -row_scores))
+        rows.append(np.full(len(order), row, dtype=np.int64))
+        cols.append(row_cols[order])
+        values.append(row_scores[order])
+        ranks.append(np.arange(1, len(order) + 1))
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32), empty
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(values), np.concatenate(ranks)
+
+
+def related_contents(X, features, top_n, options):
+    """
+    (rows, columns, scores, ranks) of the top_n neighbours of every content, see the module docstring.
+    """
+    n_items = X.shape[1]
+    X = _scale(_cap_rows(X, options['max_row_items'], np.random.default_rng(options['seed'])), axis=0)
+    Xt = X.T.tocsr()
+    content_weight = options['content_weight']
+    if content_weight:
+        F = _content_features(features, options['max_feature_frequency'])
+        Ft = F.T.tocsr()
+
+    parts = []
+    for start in range(0, n_items, options['block_size']):
+        stop = min(start + options['block_size'], n_items)
+        block = Xt[start:stop] @ X
+        if content_weight:
+            block = block + content_weight * (F[start:stop] @ Ft)
+        rows, cols, scores, ranks = _top_n(block, top_n, offset=start)
+        parts.append((rows + start, cols, scores, ranks))
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def recommended_contents(U, neighbours, top_n, block_size):
+    """
+    (rows, columns, scores, ranks) of the top_n recommendations of every row (user) of the profile matrix U, given the
+    sparse contents x contents matrix of the neighbours' scores.
+    """
+    parts = []
+    for start in range(0, U.shape[0], block_size):
+        profiles = U[start:start + block_size]
+        rows, cols, scores, ranks = _top_n(profiles @ neighbours, top_n, exclude=profiles)
+        parts.append((rows + start, cols, scores, ranks))
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+# Materialisation
+
+def _replace(model, objects, batch_size):
+    """
+    Replace all the rows of `model` with an iterable of unsaved instances, readers keep seeing the previous rows until
+    the new ones are committed. Returns the number of rows written.
+    """
+    objects = iter(objects)
+    written = 0
+    with transaction.atomic():
+        model.objects.all().delete()
+        for batch in iter(lambda: list(islice(objects, batch_size)), []):
+            model.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def build_recommendations(top_n=None, user_top_n=None, users=True):
+    """
+    Recompute and replace the related contents of every content and (unless users=False) the recommendations of every
+    user with interactions. Returns the sizes of the build.
+    """
+    options = _options()
+    top_n = top_n or options['top_n']
+    user_top_n = user_top_n or options['user_top_n']
+
+    index, keys, features = _load_items(options['chunk_size'])
+    user_pks, X, U = _load_interactions(index, options)
+    stats = {'contents': len(keys), 'users': len(user_pks), 'interactions': X.nnz, 'related': 0, 'recommendations': 0}
+
+    related = related_contents(X, features, top_n, options) if keys else ()
+    stats['related'] = _replace(RelatedContent, (
+        RelatedContent(
+            source_type_id=keys[row][0], source_id=keys[row][1], content_type_id=keys[col][0], content_id=keys[col][1],
+            rank=rank, score=score,
+        )
+        for row, col, score, rank in zip(*(values.tolist() for values in related))
+    ), options['batch_size'])
+
+    if users:
+        recommended = ()
+        if keys and user_pks:
+            rows, cols, scores, _ = related
+            neighbours = sparse.csr_matrix((scores, (rows, cols)), shape=(len(keys), len(keys)))
+            recommended = recommended_contents(U, neighbours, user_top_n, options['block_size'])
+        stats['recommendations'] = _replace(Recommendation, (
+            Recommendation(
+                user_id=user_pks[row], content_type_id=keys[col][0], content_id=keys[col][1], rank=rank, score=score,
+            )
+            for row, col, score, rank in zip(*(values.tolist() for values in recommended))
+        ), options['batch_size'])
+    return stats
+
+
+# Serving
+
+def get_related(content_type, content_id, n=None):
+    """
+    The precomputed neighbours of a content, best first. Only reads n rows.
+    """
+    n = n or _options()['top_n']
+    return RelatedContent.objects.filter(source_type=content_type, source_id=content_id, rank__lte=n).order_by('rank')
+
+
+def get_recommendations(user, n=None):
+    """
+    The precomputed recommendations of a user, best first (none for users without interactions). Only reads n rows.
+    """
+    n = n or _options()['user_top_n']
+    return Recommendation.objects.filter(user=user, rank__lte=n).order_by('rank')
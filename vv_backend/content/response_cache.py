@@ -0,0 +1,185 @@
+"""
+Response cache of the content read endpoints (video list/detail, trending), for anonymous requests.
+
+A rendered response is cached under a key made of the view, the URL (path and query params), the Accept header and
+the current *versions* of what the response shows. Nothing is ever deleted from the cache to invalidate it: changing a
+video bumps the version of that video and of the video lists, so the next requests compute their key with the new
+versions and miss, and the stale entries just expire (TIMEOUT). A hit is served without touching the DB.
+
+Versions are counters kept in the same cache:
+- "content.video": every video list (the feed, the trending lists)
+- "content.video:<id>": the detail of one video
+- "content.trendingvideo": the precomputed trending lists, bumped by refresh_trending()
+They are bumped by content/signals.py (a video, its titles, localizations, thumbnail, channel, tags... saved or deleted)
+and by bulk writes that send no signals (e.g. content/youtube_import.py), both right away and once the transaction
+commits, so a request running meanwhile can't cache the old rows under the new version.
+The counter engine (user_interactions/counters.py) only bumps the details of the contents: with steady like/view traffic,
+bumping "content.video" would invalidate every list all the time. The counters shown by the cached lists are at most
+TIMEOUT seconds old.
+
+Every cached response carries an ETag (hash of the body) and Last-Modified (latest updated_at of the contents in it),
+and requests with a matching If-None-Match get a 304 Not Modified. If-Modified-Since is not answered: the counters
+(likes, views...) change without updated_at, so Last-Modified can't tell whether the client's copy is stale. The ETag
+is a hash of the payload for the same reason.
+
+Sample usage:
+
+    class VideoListView(CachedResponseMixin, ListAPIView):
+        def get_cache_versions(self):
+            return [version_name(Video)]
+
+    invalidate_contents(Video, [video.id])
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _options():
+    options = getattr(settings, 'RESPONSE_CACHE', {})
+    return {
+        'enabled': options.get('ENABLED', True),
+        'cache': options.get('CACHE', 'default'),
+        'timeout': options.get('TIMEOUT', 60 * 5),
+    }
+
+
+def version_name(model, pk=None):
+    label = model._meta.label_lower
+    return label if pk is None else f"{label}:{pk}"
+
+
+def _version_key(name):
+    return f"response_cache:version:{name}"
+
+
+def get_versions(names):
+    """
+    [current version of every name], in the same order. One cache round trip when they all exist.
+    """
+    cache = caches[_options()['cache']]
+    keys = [_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # never seen (or evicted): start from the clock, so a version is never reused for stale entries
+        for key in missing:
+            cache.add(key, time.time_ns())
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def bump_versions(names):
+    cache = caches[_options()['cache']]
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+def invalidate(names):
+    """
+    Bump the versions now and again once the current transaction commits (only now when not in a transaction).
+    """
+    names = list(names)
+    if not names:
+        return
+    bump_versions(names)
+    if not transaction.get_connection().in_atomic_block:
+        return
+    transaction.on_commit(lambda: bump_versions(names))
+
+
+def invalidate_contents(model, pks, lists=True):
+    """
+    Invalidate the cached responses showing these contents: their detail and (unless lists=False) every list of their model.
+    """
+    names = [version_name(model, pk) for pk in set(pks)]
+    invalidate([version_name(model)] + names if lists else names)
+
+
+class CachedResponseMixin:
+    """
+    Cache the GET responses of an APIView for anonymous requests (see the module docstring).
+    Views say which versions their responses depend on with get_cache_versions(), and how old an object they render
+    is with get_last_modified().
+    """
+
+    def get_cache_versions(self):
+        raise NotImplementedError
+
+    def get_last_modified(self, obj):
+        return obj.updated_at
+
+    def get(self, request, *args, **kwargs):
+        self._response_cache_key = None
+        self._served_objects = []
+        options = _options()
+        # the payloads don't depend on the user, but authenticating would cost queries, only cache anonymous requests
+        if not options['enabled'] or 'HTTP_AUTHORIZATION' in request.META:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry = caches[options['cache']].get(key)
+        if entry is not None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['X-Cache'] = 'HIT'
+            return self._conditional_response(request, response, entry)
+
+        self._response_cache_key = key
+        return super().get(request, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        versions = get_versions(self.get_cache_versions())
+        parts = [
+            type(self).__qualname__,
+            request.path,
+            '&'.join(f'{name}={value}' for name, value in sorted(request.query_params.lists())),
+            request.META.get('HTTP_ACCEPT', ''),
+            ','.join(str(version) for version in versions),
+        ]
+        return 'response_cache:' + hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+    def get_serializer(self, *args, **kwargs):
+        # remember what is rendered, for Last-Modified
+        instance = args[0] if args else kwargs.get('instance')
+        if instance is not None:
+            # list() fills the queryset's result cache, so the serializer doesn't query it again
+            self._served_objects = list(instance) if kwargs.get('many') else [instance]
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if key is None or response.status_code != 200:
+            return response
+
+        response.render()
+        last_modified = max((self.get_last_modified(obj) for obj in self._served_objects), default=None)
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': '"%s"' % hashlib.md5(response.content).hexdigest(),
+            'last_modified': last_modified.timestamp() if last_modified else None,
+        }
+        options = _options()
+        caches[options['cache']].set(key, entry, options['timeout'])
+        response['X-Cache'] = 'MISS'
+        return self._conditional_response(request, response, entry)
+
+    def _conditional_response(self, request, response, entry):
+        response['ETag'] = entry['etag']
+        last_modified = entry['last_modified']
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # the ETag only, see the module docstring
+        return get_conditional_response(request, etag=entry['etag'], response=response)
@@ -0,0 +1,232 @@
+"""
+Full-text search over videos.
+
+A video's search document is made of its titles (ContentTitle and VideoLocalization titles), its tag/hashtag names
+and its description. Private videos are not indexed (and are removed from the index when they become private).
+Two interchangeable backends keep an index of these documents:
+- PostgresSearchBackend: weighted tsvector (titles A, tags/hashtags B, description C) in VideoSearchDocument, GIN indexed,
+  queried with websearch_to_tsquery and ranked with ts_rank. This is the one to use in production.
+- InMemorySearchBackend: a process-local inverted index, for tests and local development without the Postgres index.
+Pick one with CONTENT_SEARCH['BACKEND'] and always go through get_search_backend().
+
+The index is kept in sync by content/signals.py: saving/deleting a video, a title, a localization, or changing its tags/hashtags
+only marks the video as dirty (schedule_reindex()), and all the dirty videos are reindexed in one batch when the transaction commits.
+Queryset update()/bulk_create() don't send signals, call schedule_reindex() (or "python manage.py rebuild_search_index") after those.
+
+Sample usage:
+
+    get_search_backend().search("cooking pasta", offset=0, limit=20)   # [(video_id, score), ...] best first
+    get_search_backend().index_videos([video.id])
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from content.models.content import Video
+from content.models.search import VideoSearchDocument
+
+# Everything build_document() reads, loaded for a whole batch of videos at once
+DOCUMENT_PREFETCH = ('titles', 'video_localizations', 'tags', 'hashtags')
+
+
+def build_documents(video_ids):
+    """
+    {video id: {'titles': ..., 'keywords': ..., 'description': ...}} for the videos that still exist and aren't private.
+    """
+    videos = Video.objects.visible().filter(pk__in=video_ids).select_related('localization').prefetch_related(*DOCUMENT_PREFETCH)
+    documents = {}
+    for video in videos:
+        titles = [title.title_text for title in video.titles.all()]
+        titles += [localization.title for localization in video.video_localizations.all()]
+        if video.localization is not None:
+            titles.append(video.localization.title)
+        keywords = [tag.name for tag in video.tags.all()] + [hashtag.name for hashtag in video.hashtags.all()]
+        documents[video.pk] = {
+            # dict.fromkeys() drops duplicates and keeps the order
+            'titles': '\n'.join(dict.fromkeys(titles)),
+            'keywords': '\n'.join(dict.fromkeys(keywords)),
+            'description': video.description or '',
+        }
+    return documents
+
+
+class SearchBackend:
+    def index_videos(self, video_ids):
+        """
+        (Re)index the given videos, the ones that don't exist anymore or are private are removed from the index.
+        """
+        video_ids = set(video_ids)
+        if not video_ids:
+            return
+        documents = build_documents(video_ids)
+        if documents:
+            self.store(documents)
+        removed = video_ids - set(documents)
+        if removed:
+            self.remove_videos(removed)
+
+    def store(self, documents):
+        raise NotImplementedError
+
+    def remove_videos(self, video_ids):
+        raise NotImplementedError
+
+    def search(self, query, offset=0, limit=20):
+        """
+        Ranked page of the videos matching query: [(video id, score), ...], best first.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    def __init__(self, config='simple'):
+        # text search configuration, e.g. 'english' for stemming, 'simple' works for any language
+        self.config = config
+
+    def store(self, documents):
+        VideoSearchDocument.objects.bulk_create(
+            [VideoSearchDocument(video_id=video_id, **document) for video_id, document in documents.items()],
+            update_conflicts=True,
+            unique_fields=['video'],
+            update_fields=['titles', 'keywords', 'description'],
+        )
+        VideoSearchDocument.objects.filter(video_id__in=documents).update(
+            search_vector=(
+                SearchVector('titles', weight='A', config=self.config)
+                + SearchVector('keywords', weight='B', config=self.config)
+                + SearchVector('description', weight='C', config=self.config)
+            )
+        )
+
+    def remove_videos(self, video_ids):
+        VideoSearchDocument.objects.filter(video_id__in=video_ids).delete()
+
+    def search(self, query, offset=0, limit=20):
+        search_query = SearchQuery(query, search_type='websearch', config=self.config)
+        return list(
+            VideoSearchDocument.objects
+            .filter(search_vector=search_query)
+            .annotate(score=SearchRank(F('search_vector'), search_query))
+            .order_by('-score', 'video_id')
+            .values_list('video_id', 'score')[offset:offset + limit]
+        )
+
+    def clear(self):
+        VideoSearchDocument.objects.all().delete()
+
+
+class InMemorySearchBackend(SearchBackend):
+    """
+    Inverted index: term -> {video id: weighted term frequency}. A video matches when it contains every term of the query,
+    and is scored with tf * idf, using the same field weights as ts_rank's defaults.
+    No stemming and no query operators, the query is just a list of terms.
+    """
+    field_weights = {'titles': 1.0, 'keywords': 0.4, 'description': 0.2}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        # video id -> its terms, to remove a video from the postings without scanning them all
+        self._terms = {}
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r'\w+', text.lower())
+
+    def store(self, documents):
+        with self._lock:
+            for video_id, document in documents.items():
+                self._remove(video_id)
+                weights = defaultdict(float)
+                for field, weight in self.field_weights.items():
+                    for term in self.tokenize(document[field]):
+                        weights[term] += weight
+                for term, weight in weights.items():
+                    self._postings[term][video_id] = weight
+                self._terms[video_id] = set(weights)
+
+    def remove_videos(self, video_ids):
+        with self._lock:
+            for video_id in video_ids:
+                self._remove(video_id)
+
+    def _remove(self, video_id):
+        for term in self._terms.pop(video_id, ()):
+            postings = self._postings[term]
+            postings.pop(video_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query, offset=0, limit=20):
+        terms = set(self.tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            # intersect starting from the rarest term
+            postings.sort(key=len)
+            matches = set(postings[0])
+            for term_postings in postings[1:]:
+                matches.intersection_update(term_postings)
+            total = len(self._terms)
+            idf = [math.log(1 + total / len(term_postings)) for term_postings in postings if term_postings]
+            scored = [
+                (sum(term_postings[video_id] * term_idf for term_postings, term_idf in zip(postings, idf)), video_id)
+                for video_id in matches
+            ]
+        best = heapq.nsmallest(offset + limit, scored, key=lambda item: (-item[0], str(item[1])))
+        return [(video_id, score) for score, video_id in best[offset:]]
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    options = getattr(settings, 'CONTENT_SEARCH', {})
+    backend_class = import_string(options.get('BACKEND', 'content.search.PostgresSearchBackend'))
+    return backend_class(**options.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def _reset_search_backend(setting, **kwargs):
+    if setting == 'CONTENT_SEARCH':
+        get_search_backend.cache_clear()
+
+
+_dirty = threading.local()
+
+
+def schedule_reindex(video_ids):
+    """
+    Reindex the videos once the current transaction commits (right away when not in a transaction),
+    all the videos changed in one transaction are reindexed together.
+    """
+    if not hasattr(_dirty, 'video_ids'):
+        _dirty.video_ids = set()
+    _dirty.video_ids.update(video_ids)
+    # a flush with nothing left to do is a no-op, so registering it on every call is fine
+    transaction.on_commit(flush_reindex)
+
+
+def flush_reindex():
+    video_ids, _dirty.video_ids = getattr(_dirty, 'video_ids', set()), set()
+    if video_ids:
+        get_search_backend().index_videos(video_ids)
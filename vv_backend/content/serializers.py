@@ -1,7 +1,233 @@
 from rest_framework import serializers
 from content.models.content import Video
+from content.models.trending import TrendingVideo
+from content.models.uploads import MediaUpload
+from content.models.metadata import ContentTitle, ThumbnailDetail, ChannelDetail, VideoLocalization, Language, Region
+from content.lookups import get_lookup
+from content import uploads
+from user_interactions.generic import CONTENT_MODEL_NAMES, resolve_content_type
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes an additional `fields` argument that controls which fields should be displayed.
+    Ref: https://www.django-rest-framework.org/api-guide/serializers/#dynamically-modifying-fields
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            # Drop any fields that are not specified in the `fields` argument.
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class EagerLoadingMixin:
+    """
+    Serializers that render relations declare how to load them here, so the view loads a whole page of rows
+    in a constant number of queries instead of one query per row and relation (N+1).
+
+    select_related_fields: serializer field name -> select_related() lookup (forward FK/one-to-one, joined in the same query)
+    prefetch_related_fields: serializer field name -> prefetch_related() lookup or Prefetch (many-to-many/generic, one query each)
+
+    Sample usage:
+
+        queryset = VideoSerializer.setup_eager_loading(Video.objects.all())
+        queryset = VideoSerializer.setup_eager_loading(Video.objects.all(), fields=['id', 'tags'])  # only prefetches tags
+    """
+    select_related_fields = {}
+    prefetch_related_fields = {}
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """
+        Apply the loading plan to queryset, only for the relations among `fields` if given (see DynamicFieldsModelSerializer).
+        """
+        select_related = [lookup for name, lookup in cls.select_related_fields.items() if fields is None or name in fields]
+        prefetch_related = [lookup for name, lookup in cls.prefetch_related_fields.items() if fields is None or name in fields]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+class CachedLookupField(serializers.Field):
+    """
+    A foreign key to a Category/Language/Region/Hashtag/Tag, rendered as its name from the lookup cache (content/lookups.py),
+    so neither a query nor a select_related() is needed. Takes a name on write.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Object with name={name} does not exist.',
+    }
+
+    def __init__(self, model, **kwargs):
+        self.model = model
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        # the raw foreign key column, doesn't load the related object
+        return getattr(instance, instance._meta.get_field(self.source).attname)
+
+    def to_representation(self, pk):
+        obj = get_lookup(self.model).get_by_id(pk)
+        return obj.name if obj is not None else None
+
+    def to_internal_value(self, data):
+        obj = get_lookup(self.model).get_by_name(str(data))
+        if obj is None:
+            self.fail('does_not_exist', name=data)
+        return obj
+
+
+class ContentTitleSerializer(serializers.ModelSerializer):
+    language = CachedLookupField(Language, read_only=True)
+
+    class Meta:
+        model = ContentTitle
+        fields = ('title_text', 'language', 'is_native')
+
+
+class ThumbnailDetailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ThumbnailDetail
+        fields = ('url', 'width', 'height')
+
+
+class ChannelDetailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChannelDetail
+        fields = ('channel_title', 'channel_id')
+
+
+class VideoLocalizationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoLocalization
+        fields = ('language', 'title', 'description')
+
+
+class VideoSerializer(EagerLoadingMixin, DynamicFieldsModelSerializer):
+    """
+    Read serializer for the video feed.
+    """
+    categories = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+    hashtags = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+    tags = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+    titles = ContentTitleSerializer(many=True, read_only=True)
+    thumbnail = ThumbnailDetailSerializer(read_only=True)
+    original_language = CachedLookupField(Language, read_only=True)
+    upload_region = CachedLookupField(Region, read_only=True)
+
+    select_related_fields = {
+        'thumbnail': 'thumbnail',
+    }
+    prefetch_related_fields = {
+        'categories': 'categories',
+        'hashtags': 'hashtags',
+        'tags': 'tags',
+        'titles': 'titles',
+    }
 
-class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class VideoDetailSerializer(VideoSerializer):
+    """
+    Read serializer for a single video, also renders the channel and localization details.
+    """
+    channel_info = ChannelDetailSerializer(read_only=True)
+    localization = VideoLocalizationSerializer(read_only=True)
+
+    select_related_fields = {
+        **VideoSerializer.select_related_fields,
+        'channel_info': 'channel_info',
+        'localization': 'localization',
+    }
+
+    class Meta(VideoSerializer.Meta):
+        pass
+
+
+class TrendingVideoSerializer(serializers.ModelSerializer):
+    video = VideoSerializer(read_only=True)
+
+    class Meta:
+        model = TrendingVideo
+        fields = ('rank', 'score', 'video')
+
+
+class MediaUploadSerializer(serializers.ModelSerializer):
+    """
+    Creates a resumable upload (see content/uploads.py) and renders its progress.
+    """
+    content_type = serializers.ChoiceField(choices=CONTENT_MODEL_NAMES, source='content_type.model')
+    chunk_size = serializers.IntegerField(required=False)
+    chunk_count = serializers.IntegerField(read_only=True)
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MediaUpload
+        fields = ('id', 'content_type', 'filename', 'total_size', 'chunk_size', 'chunk_count', 'missing_chunks',
+                  'status', 'content_id', 'created_at', 'expires_at')
+        read_only_fields = ('status', 'content_id', 'created_at', 'expires_at')
+
+    def get_missing_chunks(self, upload):
+        if upload.status != MediaUpload.Status.PENDING:
+            return []
+        return uploads.missing_chunks(upload)
+
+    def validate(self, data):
+        content_type = resolve_content_type(data['content_type']['model'])
+        try:
+            chunk_size = uploads.validate_upload(
+                content_type.model_class(), data['filename'], data['total_size'], data.get('chunk_size'),
+            )
+        except uploads.UploadError as error:
+            raise serializers.ValidationError({error.field: str(error)} if error.field else str(error))
+        data['content_type'] = content_type
+        data['chunk_size'] = chunk_size
+        return data
+
+    def create(self, validated_data):
+        return uploads.create_upload(self.context['request'].user, **validated_data)
+
+
+class ContentCardSerializer(serializers.Serializer):
+    """
+    Compact representation of a video or podcast, shared by the lists mixing both (playlists).
+    Load the contents with card_queryset() and rendering a card doesn't query anything.
+    """
+    id = serializers.UUIDField()
+    content_type = serializers.SerializerMethodField()
+    title = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    duration = serializers.DurationField()
+    view_count = serializers.IntegerField()
+    like_count = serializers.IntegerField()
+    created_at = serializers.DateTimeField()
+
+    card_fields = ('id', 'duration', 'view_count', 'like_count', 'created_at')
+
+    @classmethod
+    def card_queryset(cls, model):
+        queryset = model.objects.only(*cls.card_fields).prefetch_related('titles')
+        if model is Video:
+            queryset = queryset.select_related('thumbnail').only(*cls.card_fields, 'thumbnail', 'thumbnail__url')
+        return queryset
+
+    def get_content_type(self, content):
+        return content._meta.model_name
+
+    def get_title(self, content):
+        # the native title if there is one
+        titles = content.titles.all()
+        title = next((title for title in titles if title.is_native), titles[0] if titles else None)
+        return title.title_text if title is not None else None
+
+    def get_thumbnail(self, content):
+        thumbnail = getattr(content, 'thumbnail', None)
+        return thumbnail.url if thumbnail is not None else None
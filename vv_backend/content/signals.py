@@ -0,0 +1,128 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from content.models.content import Video
+from content.models.metadata import ChannelDetail, ContentTitle, Hashtag, Tag, ThumbnailDetail, VideoLocalization
+from content.search import schedule_reindex
+from content.response_cache import invalidate_contents
+from content.lookups import LOOKUP_MODELS, get_lookup
+from content.models.uploads import MediaUpload
+from content.uploads import remove_temp_file
+
+
+# Keep the search index in sync (see content/search.py). The receivers only mark videos as dirty, no query here
+# unless stated otherwise, they are reindexed in one batch when the transaction commits.
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def reindex_video(sender, instance, **kwargs):
+    schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=ContentTitle)
+@receiver(post_delete, sender=ContentTitle)
+def reindex_title_video(sender, instance, **kwargs):
+    # ContentTypes are cached per process, no query
+    if instance.content_type_id == ContentType.objects.get_for_model(Video).id:
+        schedule_reindex([instance.content_id])
+
+
+@receiver(post_save, sender=VideoLocalization)
+@receiver(post_delete, sender=VideoLocalization)
+def reindex_localization_video(sender, instance, **kwargs):
+    schedule_reindex([instance.video_id])
+
+
+# through model -> name of the Video field
+VIDEO_KEYWORD_FIELDS = {
+    Video.tags.through: 'tags',
+    Video.hashtags.through: 'hashtags',
+}
+
+
+@receiver(m2m_changed, sender=Video.tags.through)
+@receiver(m2m_changed, sender=Video.hashtags.through)
+def reindex_keyword_videos(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            schedule_reindex([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # instance is the tag/hashtag, pk_set the videos
+        schedule_reindex(pk_set)
+    elif action == 'pre_clear':
+        # the videos are gone after the clear, so look them up before (one query)
+        field = VIDEO_KEYWORD_FIELDS[sender]
+        schedule_reindex(Video.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Hashtag)
+def reindex_renamed_keyword_videos(sender, instance, created, **kwargs):
+    # a renamed tag/hashtag changes the documents of all its videos (one query)
+    if not created:
+        field = 'tags' if sender is Tag else 'hashtags'
+        schedule_reindex(Video.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+
+# Invalidate the cached responses of the content read endpoints (see content/response_cache.py)
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_video_responses(sender, instance, **kwargs):
+    invalidate_contents(Video, [instance.pk])
+
+
+@receiver(post_save, sender=ContentTitle)
+@receiver(post_delete, sender=ContentTitle)
+def invalidate_title_video_responses(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Video).id:
+        invalidate_contents(Video, [instance.content_id])
+
+
+@receiver(post_save, sender=VideoLocalization)
+@receiver(post_delete, sender=VideoLocalization)
+@receiver(post_save, sender=ThumbnailDetail)
+@receiver(post_delete, sender=ThumbnailDetail)
+@receiver(post_save, sender=ChannelDetail)
+@receiver(post_delete, sender=ChannelDetail)
+def invalidate_detail_video_responses(sender, instance, **kwargs):
+    invalidate_contents(Video, [instance.video_id])
+
+
+VIDEO_M2M_FIELDS = {
+    **VIDEO_KEYWORD_FIELDS,
+    Video.categories.through: 'categories',
+}
+
+
+@receiver(m2m_changed, sender=Video.tags.through)
+@receiver(m2m_changed, sender=Video.hashtags.through)
+@receiver(m2m_changed, sender=Video.categories.through)
+def invalidate_m2m_video_responses(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_contents(Video, [instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_contents(Video, pk_set)
+    elif action == 'pre_clear':
+        # instance is the tag/hashtag/category, its videos are gone after the clear (one query)
+        field = VIDEO_M2M_FIELDS[sender]
+        invalidate_contents(Video, Video.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+
+def invalidate_lookup(sender, instance, **kwargs):
+    get_lookup(sender).invalidate(instance)
+
+
+# Keep the metadata lookup cache in sync (see content/lookups.py)
+for model in LOOKUP_MODELS:
+    post_save.connect(invalidate_lookup, sender=model, dispatch_uid=f'invalidate_lookup_{model.__name__}_save')
+    post_delete.connect(invalidate_lookup, sender=model, dispatch_uid=f'invalidate_lookup_{model.__name__}_delete')
+
+
+# Remove the temporary file of a deleted upload (aborted, expired or its user deleted, see content/uploads.py)
+
+@receiver(post_delete, sender=MediaUpload)
+def remove_upload_temp_file(sender, instance, **kwargs):
+    remove_temp_file(instance)
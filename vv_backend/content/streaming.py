@@ -0,0 +1,167 @@
+"""
+Byte serving of the content files (GET /content/<content_type>/<id>/stream/).
+
+The files used to be meant as static assets: no access control, and Django's FileResponse always sends the whole file,
+so seeking in a 2GB video downloaded it from the start. ContentStreamView checks the viewer may watch the content
+(Video.privacy_status, see can_stream()) and honours single `Range: bytes=...` requests with a 206 and only the
+requested bytes (If-Range is supported, multi-range requests get the whole file, as RFC 9110 allows). The bytes are sent:
+- by the web server, with MEDIA_STREAMING['OFFLOAD'] = 'x-accel-redirect' (nginx, an internal location serving
+  MEDIA_ROOT at OFFLOAD_PREFIX) or 'x-sendfile' (Apache mod_xsendfile, lighttpd). Django only checks the access and the
+  server does the range handling with zero-copy sendfile(). Only for storages with local files.
+- else by Django: ranges up to the end of the file (the common case, a player seeking forward) as a FileResponse,
+  which WSGI servers with a wsgi.file_wrapper (gunicorn, uWSGI) send with sendfile(), other ranges with an iterator
+  reading BLOCK_SIZE bytes at a time. The file is never read whole into memory.
+
+Sample usage (nginx, with OFFLOAD = 'x-accel-redirect' and OFFLOAD_PREFIX = '/protected-media/'):
+
+    location /protected-media/ {
+        internal;
+        alias /srv/vv/media/;
+    }
+"""
+
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, quote_etag
+
+from content.models.content import Video
+
+# single byte range, "bytes=500-999", "bytes=500-" or "bytes=-500" (the last 500 bytes)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _options():
+    options = getattr(settings, 'MEDIA_STREAMING', {})
+    return {
+        'offload': options.get('OFFLOAD'),
+        'offload_prefix': options.get('OFFLOAD_PREFIX', '/protected-media/'),
+        'block_size': options.get('BLOCK_SIZE', 64 * 1024),
+    }
+
+
+def can_stream(user, content):
+    """
+    Public and unlisted contents (and those without a privacy status, e.g. imported ones) can be streamed by every
+    authenticated user, private ones only by their uploader and staff.
+    """
+    if getattr(content, 'privacy_status', None) != Video.PRIVACY_PRIVATE:
+        return True
+    return user.is_staff or (content.uploaded_by_id is not None and content.uploaded_by_id == user.pk)
+
+
+def parse_range(header, size):
+    """
+    (first byte, last byte) of a Range header, None when the whole file should be sent (no header, multi-range or
+    unknown unit). Raises RangeNotSatisfiable when the range lies outside the file.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # suffix range
+        length = int(end)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+class RangeFileIterator:
+    """
+    The `length` bytes of a file from `start`, block_size bytes at a time. Closes the file when the response is closed.
+    """
+
+    def __init__(self, file, start, length, block_size):
+        self.file = file
+        self.start = start
+        self.length = length
+        self.block_size = block_size
+
+    def __iter__(self):
+        self.file.seek(self.start)
+        remaining = self.length
+        while remaining > 0:
+            data = self.file.read(min(self.block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.file.close()
+
+
+def validators(content, size):
+    """
+    (ETag, Last-Modified) of a content's file, If-Range is compared to them.
+    """
+    last_modified = http_date(content.updated_at.timestamp())
+    etag = quote_etag(f"{content.pk.hex}-{int(content.updated_at.timestamp())}-{size}")
+    return etag, last_modified
+
+
+def stream_response(request, content):
+    """
+    The (partial) response with the file of a content, the access is expected to be checked already.
+    """
+    options = _options()
+    name = content.file.name
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    if options['offload'] == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = options['offload_prefix'] + quote(name)
+        return response
+    if options['offload'] == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = content.file.path
+        return response
+
+    size = content.file.size
+    etag, last_modified = validators(content, size)
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size) if if_range in (None, etag, last_modified) else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    file = content.file.storage.open(name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        if end == size - 1:
+            # up to the end of the file, the WSGI server can sendfile() it from the current position
+            file.seek(start)
+            response = FileResponse(file, content_type=content_type, status=206)
+        else:
+            response = StreamingHttpResponse(
+                RangeFileIterator(file, start, end - start + 1, options['block_size']), content_type=content_type, status=206,
+            )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = 'private'
+    return response
@@ -1,11 +1,45 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 
 from content.models.content import Video, Podcast
-from content.models.metadata import ContentTitle, Category, Language
+from content.models.metadata import ContentTitle, Category, Language, Region, Hashtag, Tag, ThumbnailDetail, ChannelDetail, VideoLocalization
 from content.models.people import IndustryPersonnel, ContentPersonnelCast, ContentPersonnelProduce
+from content.pagination import VideoFeedPagination
+from content.serializers import VideoSerializer
+from content.deletion import delete_contents
+from content.models.trending import TrendingVideo
+from content.trending import refresh_trending, get_trending
+from content.search import get_search_backend
+from content.lookups import LookupCache, get_lookup, clear_lookup_caches
+from content.youtube_import import YoutubeVideoImporter, read_batches
+from content.models.uploads import MediaUpload
+from content.uploads import delete_expired_uploads, temp_path
+from content.models.recommendations import Recommendation, RelatedContent
+from content.recommendations import build_recommendations, get_recommendations, get_related
+from user_interactions.models import Comment, LikeDislike, Playlist, PlaylistContent
+from user_interactions.counters import update_content_counters
+
+from rest_framework import status
+from rest_framework.test import APITestCase
 
 User = get_user_model() # This should be the standard way to make reference to the User model, since we have overridden the default user model
 
@@ -141,4 +175,836 @@ class IndustryPersonnelTests(TestCase):
         self.actor.delete()
         self.assertEqual(ContentPersonnelCast.objects.filter(personnel=self.actor).count(), 0)
         self.director.delete()
-        self.assertEqual(ContentPersonnelProduce.objects.filter(personnel=self.director).count(), 0)
\ No newline at end of file
+        self.assertEqual(ContentPersonnelProduce.objects.filter(personnel=self.director).count(), 0)
+
+
+class VideoListViewTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.videos = [Video.objects.create(duration='00:01:00', description=f'Video {i}') for i in range(5)]
+
+    def test_cursor_pagination_walks_feed_newest_first(self):
+        url = reverse('video-list')
+        seen = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen += [video['id'] for video in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [str(video.id) for video in reversed(self.videos)])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(VideoFeedPagination, 'max_page_size', 3):
+            response = self.client.get(reverse('video-list'), {'page_size': 10 ** 6})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_fields_projection(self):
+        response = self.client.get(reverse('video-list'), {'fields': 'id,duration,like_count'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'duration', 'like_count'})
+
+    def test_fields_projection_rejects_unknown_fields(self):
+        response = self.client.get(reverse('video-list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class VideoQueryCountTest(APITestCase):
+    """
+    A page of videos must cost a constant number of queries, whatever the number of videos and of their relations:
+    1 for the videos (thumbnail/channel_info/localization joined) + 1 per prefetched relation (categories, hashtags, tags, titles).
+    """
+    list_queries = 5
+    detail_queries = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.language = Language.objects.create(name="English")
+        cls.categories = [Category.objects.create(name=f"Category {i}") for i in range(2)]
+        cls.hashtags = [Hashtag.objects.create(name=f"hashtag{i}") for i in range(2)]
+        cls.tags = [Tag.objects.create(name=f"tag{i}") for i in range(2)]
+        cls.videos = [cls.create_video(i) for i in range(10)]
+
+    @classmethod
+    def create_video(cls, i):
+        video = Video.objects.create(duration='00:01:00', description=f'Video {i}')
+        video.categories.set(cls.categories)
+        video.hashtags.set(cls.hashtags)
+        video.tags.set(cls.tags)
+        ContentTitle.objects.create(title_text=f"Title {i}", language=cls.language, is_native=True, content_object=video)
+        video.thumbnail = ThumbnailDetail.objects.create(video=video, url=f"https://example.com/{i}.jpg", width=120, height=90)
+        video.channel_info = ChannelDetail.objects.create(video=video, channel_title="Channel", channel_id="UC123")
+        video.localization = VideoLocalization.objects.create(video=video, language="en", title=f"Title {i}")
+        video.save()
+        return video
+
+    def setUp(self):
+        # the language names come from the metadata lookup cache, warm it so that only the page queries are counted
+        clear_lookup_caches()
+        get_lookup(Language).get_by_id(self.language.id)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        for page_size in (1, 3, 10):
+            with self.assertNumQueries(self.list_queries):
+                response = self.client.get(reverse('video-list'), {'page_size': page_size})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), page_size)
+
+        video = response.data['results'][0]
+        self.assertEqual(sorted(video['tags']), ['tag0', 'tag1'])
+        self.assertEqual(video['titles'][0]['language'], 'English')
+        self.assertEqual(video['thumbnail']['width'], 120)
+
+    def test_list_projection_only_loads_requested_relations(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('video-list'), {'page_size': 10, 'fields': 'id,tags,thumbnail'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'tags', 'thumbnail'})
+
+    def test_detail_query_count(self):
+        video = self.videos[0]
+        with self.assertNumQueries(self.detail_queries):
+            response = self.client.get(reverse('video-detail', args=[video.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['channel_info']['channel_id'], 'UC123')
+        self.assertEqual(response.data['localization']['language'], 'en')
+        self.assertEqual(len(response.data['titles']), 1)
+
+
+class BulkContentDeletionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='takedownuser', password='Cc123456789')
+        cls.playlist = Playlist.objects.create(name="Takedown", created_by=cls.user)
+        cls.actor = IndustryPersonnel.objects.create(first_name="John", middle_name="", last_name="Doe")
+        cls.kept_video = cls.create_content(Video)
+        cls.kept_podcast = cls.create_content(Podcast)
+
+    @classmethod
+    def create_content(cls, model):
+        content = model.objects.create(duration='00:01:00', uploaded_by=cls.user)
+        Comment.objects.create(text="Comment", posted_by=cls.user, content_object=content)
+        LikeDislike.objects.create(is_like=True, posted_by=cls.user, content_object=content)
+        PlaylistContent.objects.create(playlist=cls.playlist, content_object=content)
+        ContentPersonnelCast.objects.create(personnel=cls.actor, content_object=content)
+        ContentPersonnelProduce.objects.create(personnel=cls.actor, content_object=content)
+        ContentTitle.objects.create(title_text="Title", content_object=content)
+        return content
+
+    def dependent_count(self, content):
+        content_type = ContentType.objects.get_for_model(content)
+        return sum(
+            model.objects.filter(content_type=content_type, content_id=content.id).count()
+            for model in (Comment, LikeDislike, PlaylistContent, ContentPersonnelCast, ContentPersonnelProduce, ContentTitle)
+        )
+
+    def test_queryset_delete_removes_dependents(self):
+        videos = [self.create_content(Video) for _ in range(3)]
+        total, deleted = Video.objects.filter(id__in=[video.id for video in videos]).delete()
+
+        self.assertEqual(deleted['content.Video'], 3)
+        self.assertEqual(deleted['user_interactions.Comment'], 3)
+        self.assertEqual(deleted['content.ContentTitle'], 3)
+        for video in videos:
+            self.assertEqual(self.dependent_count(video), 0)
+        # other contents keep theirs
+        self.assertEqual(self.dependent_count(self.kept_video), 6)
+        self.assertEqual(self.dependent_count(self.kept_podcast), 6)
+
+    def test_delete_contents(self):
+        podcasts = [self.create_content(Podcast) for _ in range(2)]
+        delete_contents(Podcast, [podcast.id for podcast in podcasts])
+        self.assertFalse(Podcast.objects.filter(id__in=[podcast.id for podcast in podcasts]).exists())
+        for podcast in podcasts:
+            self.assertEqual(self.dependent_count(podcast), 0)
+        self.assertEqual(self.dependent_count(self.kept_podcast), 6)
+
+    def test_statement_count_does_not_grow_with_number_of_contents(self):
+        def count_delete_queries(n):
+            videos = [self.create_content(Video) for _ in range(n)]
+            with CaptureQueriesContext(connection) as queries:
+                Video.objects.filter(id__in=[video.id for video in videos]).delete()
+            return len(queries)
+
+        self.assertEqual(count_delete_queries(2), count_delete_queries(20))
+
+
+class TrendingVideoTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.europe = Region.objects.create(name="Europe")
+        cls.asia = Region.objects.create(name="Asia")
+        cls.drama = Category.objects.create(name="Drama")
+        # view counts: Europe 300, 200, 100 / Asia 50
+        cls.europe_videos = [
+            Video.objects.create(duration='00:01:00', upload_region=cls.europe, view_count=views)
+            for views in (100, 300, 200)
+        ]
+        cls.asia_video = Video.objects.create(duration='00:01:00', upload_region=cls.asia, view_count=50)
+        cls.europe_videos[0].categories.add(cls.drama)
+        cls.asia_video.categories.add(cls.drama)
+
+    def setUp(self):
+        refresh_trending(k=2)
+        clear_lookup_caches()
+        get_lookup(Region).get_many_by_id([self.europe.id, self.asia.id])
+
+    def test_regional_top_k(self):
+        trending = list(get_trending(TrendingVideo.Scope.REGION, self.europe.id))
+        self.assertEqual([entry.video_id for entry in trending], [self.europe_videos[1].id, self.europe_videos[2].id])
+        self.assertEqual([entry.rank for entry in trending], [1, 2])
+
+        trending = list(get_trending(TrendingVideo.Scope.REGION, self.asia.id))
+        self.assertEqual([entry.video_id for entry in trending], [self.asia_video.id])
+
+    def test_global_and_category_lists(self):
+        self.assertEqual(
+            [entry.video_id for entry in get_trending(TrendingVideo.Scope.GLOBAL)],
+            [self.europe_videos[1].id, self.europe_videos[2].id],
+        )
+        self.assertEqual(
+            [entry.video_id for entry in get_trending(TrendingVideo.Scope.CATEGORY, self.drama.id)],
+            [self.europe_videos[0].id, self.asia_video.id],
+        )
+
+    def test_likes_and_refresh(self):
+        Video.objects.filter(id=self.asia_video.id).update(upload_region=self.europe, like_count=100)
+        refresh_trending(scopes=[TrendingVideo.Scope.REGION], k=2)
+        trending = list(get_trending(TrendingVideo.Scope.REGION, self.europe.id))
+        self.assertEqual(trending[0].video_id, self.asia_video.id)
+        self.assertFalse(get_trending(TrendingVideo.Scope.REGION, self.asia.id).exists())
+
+    def test_old_videos_do_not_trend(self):
+        Video.objects.filter(id=self.europe_videos[1].id).update(created_at=timezone.now() - timedelta(days=365))
+        refresh_trending(scopes=[TrendingVideo.Scope.REGION], k=2)
+        trending = list(get_trending(TrendingVideo.Scope.REGION, self.europe.id))
+        self.assertNotIn(self.europe_videos[1].id, [entry.video_id for entry in trending])
+
+    def test_private_videos_do_not_trend(self):
+        Video.objects.filter(id=self.europe_videos[1].id).update(privacy_status='private')
+        refresh_trending(scopes=[TrendingVideo.Scope.GLOBAL], k=2)
+        self.assertEqual(
+            [entry.video_id for entry in get_trending(TrendingVideo.Scope.GLOBAL)],
+            [self.europe_videos[2].id, self.europe_videos[0].id],
+        )
+        # made private since the last refresh
+        Video.objects.filter(id=self.europe_videos[2].id).update(privacy_status='private')
+        self.assertEqual([entry.video_id for entry in get_trending(TrendingVideo.Scope.GLOBAL)], [self.europe_videos[0].id])
+
+    def test_trending_endpoint(self):
+        url = reverse('trending-video-list')
+        with self.assertNumQueries(6):
+            response = self.client.get(url, {'region': self.europe.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['video']['id'] for entry in response.data], [str(self.europe_videos[1].id), str(self.europe_videos[2].id)])
+
+        response = self.client.get(url, {'k': 1})
+        self.assertEqual(len(response.data), 1)
+
+        response = self.client.get(url, {'region': self.europe.id, 'language': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SearchTestsMixin:
+    """
+    Run against every backend, the index is kept in sync by the signals in content/signals.py on commit.
+    """
+
+    def setUp(self):
+        get_search_backend().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pasta = self.create_video("Cooking pasta at home", tags=["cooking"], description="Fresh pasta from scratch")
+            self.guitar = self.create_video("Guitar lesson for beginners", tags=["music"], description="Learn three chords")
+            self.pasta_song = self.create_video("A song about dinner", tags=["pasta"], description="Music video")
+
+    def create_video(self, title, tags=(), description=''):
+        video = Video.objects.create(duration='00:01:00', description=description)
+        ContentTitle.objects.create(title_text=title, content_object=video)
+        video.tags.set([Tag.objects.get_or_create(name=tag)[0] for tag in tags])
+        return video
+
+    def search_ids(self, query, **kwargs):
+        return [video_id for video_id, _ in get_search_backend().search(query, **kwargs)]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search_ids("pasta"), [self.pasta.id, self.pasta_song.id])
+        self.assertEqual(self.search_ids("guitar lesson"), [self.guitar.id])
+        self.assertEqual(self.search_ids("chords"), [self.guitar.id])
+        self.assertEqual(self.search_ids("nothing matches this"), [])
+
+    def test_pagination(self):
+        self.assertEqual(self.search_ids("pasta", offset=1, limit=1), [self.pasta_song.id])
+        self.assertEqual(self.search_ids("pasta", offset=2, limit=1), [])
+
+    def test_index_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            VideoLocalization.objects.create(video=self.guitar, language="fr", title="Cours de guitare")
+        self.assertEqual(self.search_ids("guitare"), [self.guitar.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guitar.tags.add(Tag.objects.get(name="cooking"))
+        self.assertIn(self.guitar.id, self.search_ids("cooking"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ContentTitle.objects.filter(content_id=self.pasta.id).delete()
+        self.assertEqual(self.search_ids("home"), [])
+        # only its description still mentions pasta, below a tag match
+        self.assertEqual(self.search_ids("pasta"), [self.pasta_song.id, self.pasta.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pasta_song.delete()
+        self.assertEqual(self.search_ids("pasta"), [self.pasta.id])
+
+    def test_private_videos_are_not_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guitar.privacy_status = 'private'
+            self.guitar.save()
+        self.assertEqual(self.search_ids("guitar"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guitar.privacy_status = 'public'
+            self.guitar.save()
+        self.assertEqual(self.search_ids("guitar"), [self.guitar.id])
+
+    def test_search_endpoint(self):
+        url = reverse('video-search')
+        response = self.client.get(url, {'q': 'pasta', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([video['id'] for video in response.data['results']], [str(self.pasta.id)])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([video['id'] for video in response.data['results']], [str(self.pasta_song.id)])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PostgresSearchBackendTest(SearchTestsMixin, APITestCase):
+    pass
+
+
+@override_settings(CONTENT_SEARCH={'BACKEND': 'content.search.InMemorySearchBackend'})
+class InMemorySearchBackendTest(SearchTestsMixin, APITestCase):
+    pass
+
+
+class LookupCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [Tag.objects.create(name=f"tag{i}") for i in range(5)]
+
+    def setUp(self):
+        self.lookup = LookupCache(Tag, ttl=60, max_entries=3)
+
+    def test_hits_and_misses(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.lookup.get_by_id(self.tags[0].id), self.tags[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup.get_by_id(self.tags[0].id), self.tags[0])
+            self.assertEqual(self.lookup.get_by_name("tag0"), self.tags[0])
+        self.assertIsNone(self.lookup.get_by_id(-1))
+
+        stats = self.lookup.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_get_many_by_name_is_one_query(self):
+        with self.assertNumQueries(1):
+            found = self.lookup.get_many_by_name(["tag1", "tag2", "unknown"])
+        self.assertEqual(set(found), {"tag1", "tag2"})
+        with self.assertNumQueries(0):
+            self.lookup.get_many_by_name(["tag1", "tag2"])
+
+    def test_ttl_and_max_entries(self):
+        self.lookup.get_many_by_id([tag.id for tag in self.tags])
+        self.assertEqual(self.lookup.stats()['entries'], 3)
+        self.assertEqual(self.lookup.stats()['evictions'], 2)
+
+        self.lookup.get_by_id(self.tags[4].id)
+        with mock.patch('content.lookups.time.monotonic', return_value=time.monotonic() + 61):
+            with self.assertNumQueries(1):
+                self.lookup.get_by_id(self.tags[4].id)
+
+    def test_invalidated_on_save_and_delete(self):
+        lookup = get_lookup(Tag)
+        lookup.clear()
+        tag = lookup.get_by_name("tag3")
+        tag.name = "renamed"
+        tag.save()
+        self.assertIsNone(lookup.get_by_name("tag3"))
+        self.assertEqual(lookup.get_by_id(tag.id).name, "renamed")
+
+        tag.delete()
+        self.assertIsNone(lookup.get_by_id(tag.id))
+
+    def test_shared_cache_tier(self):
+        shared = LookupCache(Tag, ttl=60, shared_cache='default')
+        other_process = LookupCache(Tag, ttl=60, shared_cache='default')
+        shared.get_by_id(self.tags[0].id)
+        with self.assertNumQueries(0):
+            self.assertEqual(other_process.get_by_id(self.tags[0].id), self.tags[0])
+        self.assertEqual(other_process.stats()['shared_hits'], 1)
+
+        shared.invalidate(self.tags[0])
+        other_process.clear()
+        with self.assertNumQueries(1):
+            other_process.get_by_id(self.tags[0].id)
+
+    def test_serializer_renders_names_from_the_cache(self):
+        video = Video.objects.create(duration=timedelta(minutes=1), original_language=Language.objects.create(name="French"))
+        get_lookup(Language).clear()
+        get_lookup(Region).clear()
+        self.assertEqual(VideoSerializer(video).data['original_language'], "French")
+        with self.assertNumQueries(0):
+            self.assertEqual(VideoSerializer(video, fields=['original_language', 'upload_region']).data, {'original_language': "French", 'upload_region': None})
+
+
+def youtube_resource(video_id, title="A video", tags=(), **snippet):
+    return {
+        'id': video_id,
+        'snippet': {
+            'publishedAt': '2023-05-01T10:00:00Z',
+            'channelId': 'UC123',
+            'channelTitle': 'A channel',
+            'title': title,
+            'description': 'Some words #cooking',
+            'thumbnails': {
+                'default': {'url': f'https://i.ytimg.com/vi/{video_id}/default.jpg', 'width': 120, 'height': 90},
+                'high': {'url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg', 'width': 480, 'height': 360},
+            },
+            'tags': list(tags),
+            'categoryId': '10',
+            'defaultLanguage': 'en',
+            **snippet,
+        },
+        'contentDetails': {'duration': 'PT4M13S', 'definition': 'hd', 'caption': 'true'},
+        'status': {'privacyStatus': 'public', 'license': 'youtube', 'embeddable': True},
+        'statistics': {'viewCount': '1000', 'likeCount': '10'},
+        'localizations': {'en': {'title': title}, 'fr': {'title': 'Une vidéo'}},
+    }
+
+
+class YoutubeImportTest(TestCase):
+    def setUp(self):
+        clear_lookup_caches()
+        self.addCleanup(clear_lookup_caches)
+
+    def write_jsonl(self, resources, invalid_lines=0):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            for resource in resources:
+                f.write(json.dumps(resource) + '\n')
+            f.write('{not json\n' * invalid_lines)
+        return path
+
+    def test_import_creates_videos_and_details(self):
+        YoutubeVideoImporter().import_batch([youtube_resource('yt1', "Pasta", tags=['food', 'italian'])])
+
+        video = Video.objects.get(youtube_video_id='yt1')
+        self.assertEqual(video.duration, timedelta(minutes=4, seconds=13))
+        self.assertEqual(video.view_count, 1000)
+        self.assertTrue(video.caption)
+        self.assertEqual(video.original_language.name, 'en')
+        self.assertEqual(video.thumbnail.width, 480)
+        self.assertEqual(video.channel_info.channel_id, 'UC123')
+        self.assertEqual(video.localization.language, 'en')
+        self.assertEqual(video.video_localizations.count(), 2)
+        self.assertEqual([title.title_text for title in video.titles.all()], ["Pasta"])
+        self.assertEqual({tag.name for tag in video.tags.all()}, {'food', 'italian'})
+        self.assertEqual([hashtag.name for hashtag in video.hashtags.all()], ['#cooking'])
+        self.assertEqual([category.name for category in video.categories.all()], ['Music'])
+
+    def test_reimport_updates_in_place(self):
+        importer = YoutubeVideoImporter()
+        importer.import_batch([youtube_resource('yt1', "Old title", tags=['old'])])
+        video_id = Video.objects.get(youtube_video_id='yt1').id
+
+        importer.import_batch([youtube_resource('yt1', "New title", tags=['new'])])
+        video = Video.objects.get(youtube_video_id='yt1')
+        self.assertEqual(video.id, video_id)
+        self.assertEqual([title.title_text for title in video.titles.all()], ["New title"])
+        self.assertEqual([tag.name for tag in video.tags.all()], ['new'])
+        self.assertEqual(ThumbnailDetail.objects.filter(video=video).count(), 1)
+        self.assertEqual(ChannelDetail.objects.filter(video=video).count(), 1)
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        importer = YoutubeVideoImporter()
+        # the language/category/hashtag shared by all the resources are then in the lookup cache
+        importer.import_batch([youtube_resource('warmup')])
+        with CaptureQueriesContext(connection) as small:
+            importer.import_batch([youtube_resource(f'a{i}', tags=[f'a{i}']) for i in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            importer.import_batch([youtube_resource(f'b{i}', tags=[f'b{i}']) for i in range(20)])
+        self.assertEqual(len(small), len(large))
+
+    def test_read_batches_resumes_from_offset(self):
+        path = self.write_jsonl([youtube_resource(f'yt{i}') for i in range(5)], invalid_lines=1)
+        batches = list(read_batches(path, batch_size=2))
+        self.assertEqual([len(records) for records, _, _ in batches], [2, 2, 1])
+        self.assertEqual(sum(invalid for _, _, invalid in batches), 1)
+
+        _, offset, _ = batches[0]
+        resumed = [record['id'] for records, _, _ in read_batches(path, batch_size=2, offset=offset) for record in records]
+        self.assertEqual(resumed, ['yt2', 'yt3', 'yt4'])
+
+    def test_command_with_checkpoint(self):
+        path = self.write_jsonl([youtube_resource(f'yt{i}') for i in range(3)])
+        checkpoint = path + '.checkpoint'
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.remove(checkpoint))
+
+        out = StringIO()
+        call_command('import_youtube_videos', path, batch_size=2, checkpoint=checkpoint, stdout=out)
+        self.assertEqual(Video.objects.filter(youtube_video_id__startswith='yt').count(), 3)
+        self.assertIn('rows/sec', out.getvalue())
+        with open(checkpoint) as f:
+            self.assertEqual(int(f.read()), os.path.getsize(path))
+
+        # nothing left to import past the checkpoint
+        out = StringIO()
+        call_command('import_youtube_videos', path, checkpoint=checkpoint, resume=True, stdout=out)
+        self.assertIn('Done, 0 videos imported', out.getvalue())
+
+
+class ResponseCacheTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.videos = [Video.objects.create(duration='00:01:00', description=f'Video {i}') for i in range(3)]
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_list_is_served_from_the_cache(self):
+        url = reverse('video-list')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json(), response.json())
+
+        # other query params, other entry
+        self.assertEqual(self.client.get(url, {'page_size': 1})['X-Cache'], 'MISS')
+
+    def test_conditional_get(self):
+        url = reverse('video-detail', args=[self.videos[0].id])
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        # the counters change without updated_at, Last-Modified can't tell
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, status.HTTP_200_OK)
+
+    def test_invalidated_when_the_video_changes(self):
+        video = self.videos[0]
+        detail_url = reverse('video-detail', args=[video.id])
+        other_url = reverse('video-detail', args=[self.videos[1].id])
+        list_url = reverse('video-list')
+        for url in (detail_url, other_url, list_url):
+            self.client.get(url)
+
+        ContentTitle.objects.create(title_text="New title", is_native=True, content_object=video)
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['titles'][0]['title_text'], "New title")
+        self.assertEqual(self.client.get(list_url)['X-Cache'], 'MISS')
+        # targeted, the other videos stay cached
+        self.assertEqual(self.client.get(other_url)['X-Cache'], 'HIT')
+
+        update_content_counters(ContentType.objects.get_for_model(Video).id, video.id, like_count=1)
+        response = self.client.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['like_count'], 1)
+        # the lists keep their slightly stale counters until they expire
+        self.assertEqual(self.client.get(list_url)['X-Cache'], 'HIT')
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': False})
+    def test_disabled(self):
+        url = reverse('video-list')
+        self.client.get(url)
+        self.assertNotIn('X-Cache', self.client.get(url))
+
+
+class MediaUploadTest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            MEDIA_UPLOADS={'TEMP_DIR': os.path.join(media_root, 'tmp'), 'MIN_CHUNK_SIZE': 4, 'FFPROBE': None},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username="uploader", email="uploader@example.com", password="Cc123456789")
+        self.client.force_authenticate(self.user)
+        self.data = b"0123456789abcdefghijklmnopqrstuvwxyz"    # 36 bytes: 4 chunks of 10 bytes, the last one 6 bytes
+
+    def create_upload(self, filename='holidays.mp4'):
+        response = self.client.post(reverse('media-upload-create'), {
+            'content_type': 'video', 'filename': filename, 'total_size': len(self.data), 'chunk_size': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data
+
+    def put_chunk(self, upload_id, index, data=None, checksum=None):
+        data = self.data[index * 10:(index + 1) * 10] if data is None else data
+        return self.client.put(
+            reverse('media-upload-chunk', args=[upload_id, index]), data, content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    def test_resumable_upload(self):
+        upload = self.create_upload()
+        self.assertEqual(upload['chunk_count'], 4)
+        self.assertEqual(upload['missing_chunks'], [0, 1, 2, 3])
+
+        # out of order, and chunk 1 is corrupted on the way
+        self.assertEqual(self.put_chunk(upload['id'], 3).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.put_chunk(upload['id'], 0).status_code, status.HTTP_200_OK)
+        corrupted = self.put_chunk(upload['id'], 1, data=b"xxxxxxxxxx", checksum=hashlib.sha256(self.data[10:20]).hexdigest())
+        self.assertEqual(corrupted.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.put_chunk(upload['id'], 2, data=b"short").status_code, status.HTTP_400_BAD_REQUEST)
+
+        progress = self.client.get(reverse('media-upload-detail', args=[upload['id']]))
+        self.assertEqual(progress.data['missing_chunks'], [1, 2])
+        response = self.client.post(reverse('media-upload-finalize', args=[upload['id']]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # resume
+        for index in progress.data['missing_chunks']:
+            self.assertEqual(self.put_chunk(upload['id'], index).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('media-upload-finalize', args=[upload['id']]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+        video = Video.objects.get(pk=response.data['content_id'])
+        self.assertEqual(video.uploaded_by, self.user)
+        self.assertEqual(video.format, Video.VideoFileFormat.MP4)
+        self.assertEqual(video.upload_status, 'uploaded')
+        with video.file.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        upload = MediaUpload.objects.get(pk=upload['id'])
+        self.assertEqual(upload.status, MediaUpload.Status.COMPLETE)
+        self.assertFalse(os.path.exists(temp_path(upload)))
+
+        # finalizing again returns the same video
+        again = self.client.post(reverse('media-upload-finalize', args=[upload.id]))
+        self.assertEqual(again.data['content_id'], video.pk)
+        self.assertEqual(Video.objects.count(), 1)
+
+    def test_validation(self):
+        url = reverse('media-upload-create')
+        response = self.client.post(url, {'content_type': 'video', 'filename': 'song.mp3', 'total_size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('filename', response.data)
+        response = self.client.post(url, {'content_type': 'podcast', 'filename': 'song.mp3', 'total_size': 10, 'chunk_size': 2}, format='json')
+        self.assertIn('chunk_size', response.data)
+        self.assertEqual(self.put_chunk(self.create_upload()['id'], 4, data=b"x").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_the_owner_can_upload(self):
+        upload = self.create_upload()
+        other = User.objects.create_user(username="other", email="other@example.com", password="Cc123456789")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.put_chunk(upload['id'], 0).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('media-upload-detail', args=[upload['id']])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expired_upload_is_rejected_before_the_sweep(self):
+        upload = self.create_upload()
+        for index in range(3):
+            self.put_chunk(upload['id'], index)
+        MediaUpload.objects.filter(pk=upload['id']).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.put_chunk(upload['id'], 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], "The upload has expired.")
+        response = self.client.post(reverse('media-upload-finalize', args=[upload['id']]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['detail'], "The upload has expired.")
+        self.assertFalse(Video.objects.exists())
+
+    def test_expired_uploads_are_deleted(self):
+        upload = MediaUpload.objects.get(pk=self.create_upload()['id'])
+        self.put_chunk(upload.id, 0)
+        self.assertTrue(os.path.exists(temp_path(upload)))
+
+        self.assertEqual(delete_expired_uploads(), 0)
+        self.assertEqual(delete_expired_uploads(now=upload.expires_at + timedelta(seconds=1)), 1)
+        self.assertFalse(MediaUpload.objects.exists())
+        self.assertFalse(os.path.exists(temp_path(upload)))
+
+
+class ContentStreamTest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user(username="owner", email="owner@example.com", password="Cc123456789")
+        self.viewer = User.objects.create_user(username="viewer", email="viewer@example.com", password="Cc123456789")
+        self.data = bytes(range(256)) * 40
+        self.video = Video(uploaded_by=self.owner, privacy_status='public')
+        self.video.file.save('videos/stream.mp4', ContentFile(self.data))
+        self.url = reverse('content-stream', args=['video', self.video.id])
+        self.client.force_authenticate(self.viewer)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_whole_file(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='video/*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(self.body(response), self.data)
+
+    def test_ranges(self):
+        size = len(self.data)
+        for header, start, end in (('bytes=100-199', 100, 199), ('bytes=10000-', 10000, size - 1), ('bytes=-50', size - 50, size - 1)):
+            with self.subTest(header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+                self.assertEqual(response['Content-Range'], f"bytes {start}-{end}/{size}")
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+                self.assertEqual(self.body(response), self.data[start:end + 1])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f"bytes */{size}")
+
+        # the file changed since the client got its first bytes: whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_access(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        Video.objects.filter(pk=self.video.pk).update(privacy_status='private')
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(reverse('content-stream', args=['channel', self.video.id])).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_STREAMING={'OFFLOAD': 'x-accel-redirect', 'OFFLOAD_PREFIX': '/protected-media/'})
+    def test_offload(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], f"/protected-media/{self.video.file.name}")
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(RECOMMENDATIONS={'CONTENT_WEIGHT': 0, 'BLOCK_SIZE': 2})
+class RecommendationTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f"viewer{i}", email=f"viewer{i}@example.com", password="Cc123456789")
+            for i in range(4)
+        ]
+        cls.videos = [Video.objects.create(duration='00:01:00') for _ in range(4)]
+        cls.private_video = Video.objects.create(duration='00:01:00', privacy_status='private')
+        cls.podcast = Podcast.objects.create(duration='00:30:00')
+        cls.video_type = ContentType.objects.get_for_model(Video)
+
+        # users 0 and 1 like videos 0 and 1, user 2 likes videos 2 and 3 and has video 0 and the podcast in a playlist
+        for user, videos in ((cls.users[0], cls.videos[:2]), (cls.users[1], cls.videos[:2]), (cls.users[2], cls.videos[2:])):
+            for video in videos:
+                LikeDislike.objects.create(is_like=True, posted_by=user, content_object=video)
+        LikeDislike.objects.create(is_like=True, posted_by=cls.users[0], content_object=cls.private_video)
+        playlist = Playlist.objects.create(name="Mix", created_by=cls.users[2])
+        PlaylistContent.objects.create(playlist=playlist, content_object=cls.videos[0])
+        PlaylistContent.objects.create(playlist=playlist, content_object=cls.podcast)
+
+    def test_related_contents_from_co_occurrences(self):
+        stats = build_recommendations()
+        self.assertEqual(stats['contents'], 5)
+        self.assertEqual(stats['interactions'], 8)
+
+        # video 1 is liked with video 0 twice (cosine 2 / sqrt(3 * 2)), the podcast is in one playlist with it (1 / sqrt(3))
+        related = list(get_related(self.video_type, self.videos[0].id))
+        self.assertEqual([(entry.content_id, entry.rank) for entry in related], [(self.videos[1].id, 1), (self.podcast.id, 2)])
+        self.assertAlmostEqual(related[0].score, 2 / 6 ** 0.5, places=5)
+        self.assertEqual([entry.content_id for entry in get_related(self.video_type, self.videos[2].id)], [self.videos[3].id])
+        self.assertFalse(RelatedContent.objects.filter(content_id=self.private_video.id).exists())
+
+    def test_user_recommendations_skip_known_contents(self):
+        build_recommendations()
+        self.assertEqual([entry.content_id for entry in get_recommendations(self.users[0])], [self.podcast.id])
+        self.assertEqual([entry.content_id for entry in get_recommendations(self.users[2])], [self.videos[1].id])
+        self.assertFalse(get_recommendations(self.users[3]).exists())
+
+        # rebuilding replaces the lists, users=False leaves the user lists alone
+        recommendations = list(Recommendation.objects.order_by('user', 'rank').values_list('user', 'content_id', 'rank'))
+        build_recommendations(top_n=1, users=False)
+        self.assertEqual(RelatedContent.objects.filter(rank__gt=1).count(), 0)
+        self.assertEqual(
+            list(Recommendation.objects.order_by('user', 'rank').values_list('user', 'content_id', 'rank')), recommendations,
+        )
+
+    @override_settings(RECOMMENDATIONS={'CONTENT_WEIGHT': 1.0, 'MAX_FEATURE_FREQUENCY': 0.5})
+    def test_content_based_neighbours(self):
+        # no interactions, only a tag in common (the region is on every video, too common to matter)
+        europe = Region.objects.create(name="Europe")
+        surfing = Tag.objects.create(name="surfing")
+        new_videos = [Video.objects.create(duration='00:01:00', upload_region=europe) for _ in range(2)]
+        for video in new_videos:
+            video.tags.add(surfing)
+        Video.objects.filter(id__in=[video.id for video in self.videos]).update(upload_region=europe)
+
+        build_recommendations()
+        self.assertEqual([entry.content_id for entry in get_related(self.video_type, new_videos[0].id)], [new_videos[1].id])
+
+    def test_deleted_contents_are_not_recommended(self):
+        build_recommendations()
+        self.videos[1].delete()
+        self.assertEqual([entry.content_id for entry in get_related(self.video_type, self.videos[0].id)], [self.podcast.id])
+
+    def test_related_api(self):
+        build_recommendations()
+        ContentTitle.objects.create(title_text="Podcast", is_native=True, content_object=self.podcast)
+        # the list, then the videos and the podcasts with their titles
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('content-related', args=['video', self.videos[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([card['id'] for card in response.data['results']], [str(self.videos[1].id), str(self.podcast.id)])
+        self.assertEqual(response.data['results'][1]['title'], "Podcast")
+
+        response = self.client.get(reverse('content-related', args=['video', self.videos[0].id]), {'n': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        # made private since the build
+        Video.objects.filter(id=self.videos[1].id).update(privacy_status='private')
+        response = self.client.get(reverse('content-related', args=['video', self.videos[0].id]))
+        self.assertEqual([card['id'] for card in response.data['results']], [str(self.podcast.id)])
+
+    def test_recommendations_api(self):
+        build_recommendations()
+        refresh_trending()
+        url = reverse('content-recommendations')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.users[2])
+        response = self.client.get(url)
+        self.assertEqual(response.data['source'], 'recommendations')
+        self.assertEqual([card['id'] for card in response.data['results']], [str(self.videos[1].id)])
+
+        # nothing liked yet
+        self.client.force_authenticate(self.users[3])
+        response = self.client.get(url)
+        self.assertEqual(response.data['source'], 'trending')
+        self.assertNotIn(str(self.private_video.id), [card['id'] for card in response.data['results']])
@@ -0,0 +1,128 @@
+"""
+Top-k trending videos, globally and per Region/Language/Category (the "TOP-k regional popular videos" of the globe feature).
+
+Score of a video (Hacker News style gravity, so old videos make room for new ones):
+
+    (view_count + LIKE_WEIGHT * like_count) / (age_in_hours + 2) ^ GRAVITY
+
+The ranking is computed in the DB, one query per scope type (a ROW_NUMBER() window partitioned by region/language/category,
+over the videos of the last WINDOW_DAYS only), and materialised into TrendingVideo, replacing the previous lists of that scope
+type in one transaction. Reading a list is then a k rows index range read (see get_trending()).
+Refresh it periodically with "python manage.py refresh_trending", scope types can be refreshed independently.
+A refresh recomputes the lists of a scope type from scratch rather than incrementally: the scores decay with the age of
+the videos, so every list changes between two refreshes even when no video does, and the query only reads the videos
+of the window anyway. Private videos never trend.
+
+Sample usage:
+
+    refresh_trending()                                          # all scope types
+    refresh_trending(scopes=[TrendingVideo.Scope.REGION])
+    get_trending(TrendingVideo.Scope.REGION, region.id, k=10)
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, DurationField, ExpressionWrapper, F, FloatField, Value, Window
+from django.db.models.functions import Cast, Extract, Power, RowNumber
+from django.utils import timezone
+
+from content.models.content import Video
+from content.models.trending import TrendingVideo
+from content.response_cache import invalidate, version_name
+
+# Scope type -> Video field the lists are partitioned by (None: one global list)
+SCOPE_FIELDS = {
+    TrendingVideo.Scope.GLOBAL: None,
+    TrendingVideo.Scope.REGION: 'upload_region',
+    TrendingVideo.Scope.LANGUAGE: 'original_language',
+    TrendingVideo.Scope.CATEGORY: 'categories',
+}
+
+
+def _options():
+    options = getattr(settings, 'TRENDING', {})
+    return {
+        'top_k': options.get('TOP_K', 50),
+        'window_days': options.get('WINDOW_DAYS', 30),
+        'like_weight': options.get('LIKE_WEIGHT', 10),
+        'gravity': options.get('GRAVITY', 1.5),
+    }
+
+
+def trending_score(now=None, like_weight=10, gravity=1.5):
+    """
+    The trending score as a DB expression, see the module docstring.
+    """
+    now = now or timezone.now()
+    age = ExpressionWrapper(Value(now) - F('created_at'), output_field=DurationField())
+    age_hours = Cast(Extract(age, 'epoch'), FloatField()) / 3600
+    popularity = Cast(F('view_count') + like_weight * F('like_count'), FloatField())
+    return popularity / Power(age_hours + 2, gravity)
+
+
+def ranked_videos(scope, k=None, now=None):
+    """
+    Queryset of the top-k (video id, scope id, rank, score) rows of every list of the given scope type, computed from scratch.
+    This is also the ad-hoc "ORDER BY score LIMIT k" the materialised lists replace.
+    """
+    options = _options()
+    k = k or options['top_k']
+    now = now or timezone.now()
+    scope_field = SCOPE_FIELDS[scope]
+
+    queryset = Video.objects.visible().filter(created_at__gte=now - timedelta(days=options['window_days']))
+    if scope_field is not None:
+        queryset = queryset.filter(**{f'{scope_field}__isnull': False})
+
+    score = trending_score(now, options['like_weight'], options['gravity'])
+    return (
+        queryset
+        .annotate(
+            scope_id=F(scope_field) if scope_field else Value(None, output_field=BigIntegerField()),
+            score=score,
+        )
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F(scope_field)] if scope_field else None,
+            order_by=[F('score').desc(), F('id').asc()],
+        ))
+        .filter(rank__lte=k)
+        .values('id', 'scope_id', 'rank', 'score')
+    )
+
+
+def refresh_trending(scopes=None, k=None):
+    """
+    Recompute and replace the trending lists of the given scope types (all of them by default).
+    Returns {scope: number of rows written}.
+    """
+    now = timezone.now()
+    written = {}
+    for scope in scopes or SCOPE_FIELDS:
+        rows = [
+            TrendingVideo(scope=scope, scope_id=row['scope_id'], rank=row['rank'], video_id=row['id'], score=row['score'])
+            for row in ranked_videos(scope, k=k, now=now)
+        ]
+        # readers keep seeing the previous lists until the new ones are committed
+        with transaction.atomic():
+            TrendingVideo.objects.filter(scope=scope).delete()
+            TrendingVideo.objects.bulk_create(rows, batch_size=1000)
+            invalidate([version_name(TrendingVideo)])
+        written[scope] = len(rows)
+    return written
+
+
+def get_trending(scope, scope_id=None, k=None):
+    """
+    The precomputed top-k list of one scope, best first. Only reads k rows.
+    Videos made private since the last refresh are left out.
+    """
+    k = k or _options()['top_k']
+    return (
+        TrendingVideo.objects
+        .filter(scope=scope, scope_id=scope_id, rank__lte=k)
+        .exclude(video__privacy_status=Video.PRIVACY_PRIVATE)
+        .order_by('rank')
+    )
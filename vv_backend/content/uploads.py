@@ -0,0 +1,274 @@
+"""
+Resumable chunked uploads of the video/podcast files.
+
+A multi-GB file can't go through a single request: one dropped connection and the whole upload starts over, and it
+holds a worker for its whole duration. Instead the client:
+1. creates an upload (POST /content/uploads/): the file size and a chunk size, it gets back the upload id and chunk count.
+   A temporary file of the final size is allocated in MEDIA_UPLOADS['TEMP_DIR'] (sparse, it takes no disk space yet).
+2. PUTs every chunk (PUT /content/uploads/<id>/chunks/<index>/), in any order and in parallel, with the sha256 of the chunk
+   in the X-Chunk-Checksum header. The body is streamed straight to its offset (index * chunk_size) in the temporary file
+   with pwrite(), verified on the fly, and recorded as a MediaUploadChunk row once it matches. A chunk whose checksum
+   doesn't match is rejected and just PUT again. Every request writes its own byte range, so parallel PUTs never overlap.
+3. after an interruption, asks which chunks are missing (GET /content/uploads/<id>/) and only sends those.
+4. finalizes (POST /content/uploads/<id>/finalize/) once every chunk is received: the temporary file is handed to the
+   storage of the content's file field as it is (FileSystemStorage moves it in place, other storages stream it), never
+   read into memory, and the Video/Podcast is created with its format, duration (ffprobe, if available) and upload_status.
+
+Abandoned uploads and their temporary file are deleted past MEDIA_UPLOADS['EXPIRY'] by "python manage.py sweep_expired_uploads".
+
+Sample usage:
+
+    upload = create_upload(user, resolve_content_type('video'), 'holidays.mp4', total_size=3 * 1024 ** 3)
+    write_chunk(upload, 0, request.stream, checksum)   # for every chunk
+    missing_chunks(upload)                            # [3, 7]
+    video = finalize_upload(upload)
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from content.models.uploads import MediaUpload, MediaUploadChunk
+
+
+class UploadError(ValueError):
+    """
+    A request the upload can't accept, the message is meant for the client. `field` is the request field at fault, if any.
+    """
+
+    def __init__(self, message, field=None):
+        super().__init__(message)
+        self.field = field
+
+
+def _options():
+    options = getattr(settings, 'MEDIA_UPLOADS', {})
+    return {
+        'temp_dir': options.get('TEMP_DIR') or os.path.join(tempfile.gettempdir(), 'vv_uploads'),
+        'chunk_size': options.get('CHUNK_SIZE', 8 * 1024 * 1024),
+        'min_chunk_size': options.get('MIN_CHUNK_SIZE', 256 * 1024),
+        'max_chunk_size': options.get('MAX_CHUNK_SIZE', 64 * 1024 * 1024),
+        'max_size': options.get('MAX_SIZE', 20 * 1024 ** 3),
+        'expiry': options.get('EXPIRY', timedelta(days=1)),
+        'read_size': options.get('READ_SIZE', 1024 * 1024),
+        'ffprobe': options.get('FFPROBE', 'ffprobe'),
+    }
+
+
+def temp_path(upload):
+    return os.path.join(_options()['temp_dir'], f"{upload.pk}.part")
+
+
+def remove_temp_file(upload):
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def file_formats(model):
+    """
+    {file extension: value of the model's format choices}, e.g. {'mp4': Video.VideoFileFormat.MP4, ...}
+    """
+    return {
+        label.lower(): value
+        for value, label in model._meta.get_field('format').choices
+        if value
+    }
+
+
+def validate_upload(model, filename, total_size, chunk_size=None):
+    """
+    Check the file format, size and chunk size of a new upload against MEDIA_UPLOADS. Returns the chunk size to use
+    (the default one if None), raises UploadError with the field at fault otherwise.
+    """
+    options = _options()
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    formats = file_formats(model)
+    if extension not in formats:
+        raise UploadError(f"Unsupported file format, expected one of: {', '.join(sorted(formats))}.", field='filename')
+    if not 0 < total_size <= options['max_size']:
+        raise UploadError(f"Must be between 1 and {options['max_size']} bytes.", field='total_size')
+    chunk_size = options['chunk_size'] if chunk_size is None else chunk_size
+    if not options['min_chunk_size'] <= chunk_size <= options['max_chunk_size']:
+        raise UploadError(
+            f"Must be between {options['min_chunk_size']} and {options['max_chunk_size']} bytes.", field='chunk_size',
+        )
+    return chunk_size
+
+
+def create_upload(user, content_type, filename, total_size, chunk_size=None):
+    """
+    Create a pending upload and allocate its temporary file. The arguments are expected to be validated already
+    (see validate_upload()).
+    """
+    options = _options()
+    upload = MediaUpload.objects.create(
+        created_by=user,
+        content_type=content_type,
+        filename=filename,
+        total_size=total_size,
+        chunk_size=chunk_size or options['chunk_size'],
+        expires_at=timezone.now() + options['expiry'],
+    )
+    os.makedirs(options['temp_dir'], exist_ok=True)
+    with open(temp_path(upload), 'wb') as temp_file:
+        # sparse on every usual filesystem, the blocks are only allocated as the chunks are written
+        temp_file.truncate(total_size)
+    return upload
+
+
+def write_chunk(upload, index, stream, checksum):
+    """
+    Stream chunk `index` from a file-like object (the request body) to its place in the temporary file.
+    Raises UploadError if the chunk doesn't have the expected size or sha256 hex digest, the chunk is then not recorded.
+    """
+    if upload.status != MediaUpload.Status.PENDING:
+        raise UploadError("The upload is already finalized.")
+    # not swept yet, its temporary file may still be there
+    if upload.expires_at <= timezone.now():
+        raise UploadError("The upload has expired.")
+    if not 0 <= index < upload.chunk_count:
+        raise UploadError(f"Chunk index out of range, the upload has {upload.chunk_count} chunks.")
+    checksum = (checksum or '').strip().lower()
+    if len(checksum) != 64:
+        raise UploadError("The X-Chunk-Checksum header must be the sha256 hex digest of the chunk.")
+
+    offset, size = upload.chunk_range(index)
+    read_size = _options()['read_size']
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        fd = os.open(temp_path(upload), os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadError("The upload has expired.")
+    try:
+        while received <= size:
+            # one byte past the expected size is enough to tell the chunk is too long
+            data = stream.read(min(read_size, size + 1 - received)) if stream is not None else b''
+            if not data:
+                break
+            if received + len(data) > size:
+                raise UploadError(f"Chunk {index} must be {size} bytes.")
+            digest.update(data)
+            os.pwrite(fd, data, offset + received)
+            received += len(data)
+    finally:
+        os.close(fd)
+
+    if received != size:
+        raise UploadError(f"Chunk {index} must be {size} bytes, got {received}.")
+    if digest.hexdigest() != checksum:
+        raise UploadError(f"Checksum mismatch for chunk {index}.")
+
+    # a retried chunk replaces the previous row
+    chunk, = MediaUploadChunk.objects.bulk_create(
+        [MediaUploadChunk(upload=upload, index=index, size=size, checksum=checksum)],
+        update_conflicts=True, unique_fields=['upload', 'index'], update_fields=['size', 'checksum', 'received_at'],
+    )
+    return chunk
+
+
+def missing_chunks(upload):
+    received = set(upload.chunks.values_list('index', flat=True))
+    return [index for index in range(upload.chunk_count) if index not in received]
+
+
+def probe_duration(path):
+    """
+    Duration of a media file according to ffprobe, None if ffprobe isn't installed or can't read the file.
+    """
+    ffprobe = _options()['ffprobe']
+    if not ffprobe or shutil.which(ffprobe) is None:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path],
+            capture_output=True, text=True, timeout=60, check=True,
+        )
+        return timedelta(seconds=float(result.stdout.strip()))
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+class AssembledFile(File):
+    """
+    The complete temporary file of an upload. Storages that support temporary_file_path() (FileSystemStorage) move it
+    in place instead of copying it, the others read it in chunks.
+    """
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def finalize_upload(upload):
+    """
+    Create the Video/Podcast from a completely received upload and return it. Idempotent, finalizing an upload twice
+    returns the content created the first time.
+    """
+    model = upload.content_type.model_class()
+    with transaction.atomic():
+        upload = MediaUpload.objects.select_for_update().select_related('content_type').get(pk=upload.pk)
+        if upload.status == MediaUpload.Status.COMPLETE:
+            return model.objects.get(pk=upload.content_id)
+        if upload.expires_at <= timezone.now():
+            raise UploadError("The upload has expired.")
+        missing = missing_chunks(upload)
+        if missing:
+            raise UploadError(f"Missing chunks: {', '.join(map(str, missing[:20]))}{'...' if len(missing) > 20 else ''}")
+
+        path = temp_path(upload)
+        if not os.path.exists(path):
+            raise UploadError("The upload has expired.")
+        extension = os.path.splitext(upload.filename)[1].lstrip('.').lower()
+        content = model(
+            uploaded_by_id=upload.created_by_id,
+            format=file_formats(model).get(extension, 0),
+            duration=probe_duration(path),
+        )
+        if hasattr(content, 'upload_status'):
+            content.upload_status = 'uploaded'
+
+        assembled = AssembledFile(path, f"{model._meta.model_name}s/{content.pk}.{extension or 'bin'}")
+        try:
+            content.file.save(assembled.name, assembled, save=False)
+        finally:
+            assembled.close()
+        content.save()
+
+        upload.status = MediaUpload.Status.COMPLETE
+        upload.content_id = content.pk
+        upload.save(update_fields=['status', 'content_id'])
+        upload.chunks.all().delete()
+    # left behind by storages that copied it
+    remove_temp_file(upload)
+    return content
+
+
+def delete_expired_uploads(now=None, batch_size=100):
+    """
+    Delete the expired uploads, their temporary file is removed by the post_delete receiver. Returns the number deleted.
+    """
+    expired = MediaUpload.objects.filter(expires_at__lte=now or timezone.now())
+    total = 0
+    while True:
+        pks = list(expired.order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        MediaUpload.objects.filter(pk__in=pks).delete()
+        total += len(pks)
+        if len(pks) < batch_size:
+            break
+    return total
@@ -1,6 +1,19 @@
 from django.urls import path
-from .views import VideoListView
+from .views import VideoListView, VideoDetailView, TrendingVideoListView, VideoSearchView
+from .views import ContentStreamView
+from .views import RelatedContentView, RecommendationView
+from .views import MediaUploadCreateView, MediaUploadDetailView, MediaUploadChunkView, MediaUploadFinalizeView
 
 urlpatterns = [
     path('', VideoListView.as_view(), name='video-list'),
+    path('trending/', TrendingVideoListView.as_view(), name='trending-video-list'),
+    path('search/', VideoSearchView.as_view(), name='video-search'),
+    path('recommendations/', RecommendationView.as_view(), name='content-recommendations'),
+    path('<uuid:pk>/', VideoDetailView.as_view(), name='video-detail'),
+    path('<str:content_type>/<uuid:pk>/stream/', ContentStreamView.as_view(), name='content-stream'),
+    path('<str:content_type>/<uuid:pk>/related/', RelatedContentView.as_view(), name='content-related'),
+    path('uploads/', MediaUploadCreateView.as_view(), name='media-upload-create'),
+    path('uploads/<uuid:pk>/', MediaUploadDetailView.as_view(), name='media-upload-detail'),
+    path('uploads/<uuid:pk>/chunks/<int:index>/', MediaUploadChunkView.as_view(), name='media-upload-chunk'),
+    path('uploads/<uuid:pk>/finalize/', MediaUploadFinalizeView.as_view(), name='media-upload-finalize'),
 ]
\ No newline at end of file
@@ -1,8 +1,315 @@
+from django.conf import settings
+from django.db.models import Prefetch
 from django.shortcuts import render
-from rest_framework.generics import ListAPIView
+from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView, RetrieveDestroyAPIView, get_object_or_404
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
 from content.models.content import Video
-from .serializers import VideoSerializer
+from content.models.trending import TrendingVideo
+from content.models.uploads import MediaUpload
+from content import recommendations, streaming, uploads
+from content.trending import get_trending
+from content.search import get_search_backend
+from content.response_cache import CachedResponseMixin, version_name
+from user_interactions.generic import prefetch_content_objects, resolve_content_type
+from .pagination import VideoFeedPagination
+from .serializers import VideoSerializer, VideoDetailSerializer, TrendingVideoSerializer, MediaUploadSerializer, ContentCardSerializer
 
-class VideoListView(ListAPIView):
+
+class VideoListView(CachedResponseMixin, ListAPIView):
+    """
+    Video feed, newest first, cursor paginated.
+    ?fields=id,duration,like_count limits both the response and the columns selected from the DB,
+    so list callers don't have to pull description and all the Youtube columns.
+    Relations are loaded with the serializer's eager loading plan, so a page costs the same number of queries whatever its size.
+    Anonymous responses are cached until a video changes (see content/response_cache.py).
+    """
     queryset = Video.objects.all()
-    serializer_class = VideoSerializer
\ No newline at end of file
+    serializer_class = VideoSerializer
+    pagination_class = VideoFeedPagination
+
+    # always loaded, the cursor position and Last-Modified are built from them
+    cursor_fields = ('id', 'created_at', 'updated_at')
+
+    def get_cache_versions(self):
+        return [version_name(Video)]
+
+    def get_requested_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(fields) - set(self.get_serializer_class()().fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is not None:
+            # only select the requested concrete columns, many-to-many fields are fetched separately anyway
+            columns = {
+                field.name for field in Video._meta.concrete_fields
+                if field.name in fields
+            }
+            queryset = queryset.only(*columns.union(self.cursor_fields))
+        return self.get_serializer_class().setup_eager_loading(queryset, fields=fields)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class VideoDetailView(CachedResponseMixin, RetrieveAPIView):
+    queryset = Video.objects.all()
+    serializer_class = VideoDetailSerializer
+
+    def get_cache_versions(self):
+        return [version_name(Video, self.kwargs['pk'])]
+
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(super().get_queryset())
+
+
+class TrendingVideoListView(CachedResponseMixin, ListAPIView):
+    """
+    Precomputed top-k trending videos (see content/trending.py), best first.
+    ?region=<id>, ?language=<id> or ?category=<id> selects the list of that region/language/category, else the global one.
+    ?k= returns only the first k entries (at most TRENDING['TOP_K']).
+    """
+    serializer_class = TrendingVideoSerializer
+    pagination_class = None
+
+    def get_cache_versions(self):
+        return [version_name(Video), version_name(TrendingVideo)]
+
+    def get_last_modified(self, entry):
+        return max(entry.computed_at, entry.video.updated_at)
+
+    scope_params = (TrendingVideo.Scope.REGION, TrendingVideo.Scope.LANGUAGE, TrendingVideo.Scope.CATEGORY)
+
+    def get_scope(self):
+        scopes = [scope for scope in self.scope_params if scope in self.request.query_params]
+        if len(scopes) > 1:
+            raise ValidationError({'detail': f"Only one of {', '.join(self.scope_params)} can be given."})
+        if not scopes:
+            return TrendingVideo.Scope.GLOBAL, None
+        scope = scopes[0]
+        return scope, self.get_int_param(scope)
+
+    def get_int_param(self, name, default=None):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({name: "A valid integer is required."})
+        if value < 1:
+            raise ValidationError({name: "Must be a positive integer."})
+        return value
+
+    def get_queryset(self):
+        top_k = getattr(settings, 'TRENDING', {}).get('TOP_K', 50)
+        k = min(self.get_int_param('k', top_k), top_k)
+        scope, scope_id = self.get_scope()
+        videos = VideoSerializer.setup_eager_loading(Video.objects.all())
+        return get_trending(scope, scope_id, k=k).prefetch_related(Prefetch('video', queryset=videos))
+
+
+class VideoSearchView(ListAPIView):
+    """
+    Full-text search over the videos' titles, tags, hashtags and descriptions (see content/search.py), best match first.
+    ?q=<query>, paginated with ?offset= and ?limit=. There is no total count, "next" is null on the last page.
+    """
+    serializer_class = VideoSerializer
+
+    def get_int_param(self, name, default, maximum=None):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: "A valid integer is required."})
+        if value < 0:
+            raise ValidationError({name: "Must not be negative."})
+        return min(value, maximum) if maximum is not None else value
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': "This query parameter is required."})
+        options = getattr(settings, 'CONTENT_SEARCH', {})
+        offset = self.get_int_param('offset', 0)
+        limit = self.get_int_param('limit', options.get('PAGE_SIZE', 20), maximum=options.get('MAX_PAGE_SIZE', 100))
+
+        # one extra hit tells whether there is a next page
+        hits = get_search_backend().search(query, offset=offset, limit=limit + 1)
+        has_next = len(hits) > limit
+        hits = hits[:limit]
+
+        videos = Video.objects.visible().filter(pk__in=[video_id for video_id, _ in hits])
+        videos = VideoSerializer.setup_eager_loading(videos).in_bulk()
+        # keep the ranking order, skip videos deleted (or made private by a queryset update) since they were indexed
+        results = [videos[video_id] for video_id, _ in hits if video_id in videos]
+
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({
+            'next': next_url,
+            'results': self.get_serializer(results, many=True).data,
+        })
+
+
+# Content.Upload API (resumable chunked uploads, see content/uploads.py)
+class MediaUploadCreateView(CreateAPIView):
+    serializer_class = MediaUploadSerializer
+    permission_classes = (permissions.IsAuthenticated, )
+
+
+class MediaUploadOwnerMixin:
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def get_queryset(self):
+        return MediaUpload.objects.filter(created_by=self.request.user).select_related('content_type')
+
+    def get_upload(self):
+        return get_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
+
+
+class MediaUploadDetailView(MediaUploadOwnerMixin, RetrieveDestroyAPIView):
+    """
+    GET: progress of an upload, resume it by PUTting its missing_chunks. DELETE: abort it.
+    """
+    serializer_class = MediaUploadSerializer
+
+
+class MediaUploadChunkView(MediaUploadOwnerMixin, APIView):
+    """
+    PUT the raw bytes of chunk <index> (the bytes at offset index * chunk_size of the file), with their sha256 hex digest
+    in the X-Chunk-Checksum header. The body is streamed to disk, never parsed or buffered.
+    """
+
+    def put(self, request, pk, index):
+        upload = self.get_upload()
+        try:
+            chunk = uploads.write_chunk(upload, index, request.stream, request.headers.get('X-Chunk-Checksum'))
+        except uploads.UploadError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'index': chunk.index, 'size': chunk.size, 'checksum': chunk.checksum}, status=status.HTTP_200_OK)
+
+
+class MediaUploadFinalizeView(MediaUploadOwnerMixin, APIView):
+    def post(self, request, pk):
+        upload = self.get_upload()
+        try:
+            content = uploads.finalize_upload(upload)
+        except uploads.UploadError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            'content_type': upload.content_type.model,
+            'content_id': content.pk,
+            'format': content.format,
+            'duration': content.duration,
+            'upload_status': getattr(content, 'upload_status', None),
+        }, status=status.HTTP_201_CREATED)
+
+
+class IgnoreAcceptNegotiation(BaseContentNegotiation):
+    """
+    Media players send Accept: video/*, which no renderer matches. The stream responses aren't rendered anyway.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+# Content.Stream API (byte serving of the files, see content/streaming.py)
+class ContentStreamView(APIView):
+    """
+    The file of a video/podcast, Range requests get a 206 with only the requested bytes.
+    Private contents are 404 for everyone but their uploader and staff.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+    content_negotiation_class = IgnoreAcceptNegotiation
+
+    def get(self, request, content_type, pk):
+        content_type = resolve_content_type(content_type)
+        if content_type is None:
+            raise NotFound()
+        model = content_type.model_class()
+        fields = ['pk', 'file', 'updated_at', 'uploaded_by'] + (['privacy_status'] if model is Video else [])
+        content = get_object_or_404(model.objects.only(*fields), pk=pk)
+        if not content.file or not streaming.can_stream(request.user, content):
+            raise NotFound()
+        return streaming.stream_response(request, content)
+
+
+# Content.Recommendation API (precomputed lists, see content/recommendations.py)
+class ContentCardListMixin:
+    """
+    Renders a precomputed list as content cards: one query per content type plus their titles, whatever its length.
+    Contents deleted or made private since the list was built are left out.
+    """
+
+    def get_n(self, default):
+        value = self.request.query_params.get('n')
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({'n': "A valid integer is required."})
+        if value < 1:
+            raise ValidationError({'n': "Must be a positive integer."})
+        return min(value, default)
+
+    @staticmethod
+    def card_queryset(model):
+        queryset = ContentCardSerializer.card_queryset(model)
+        return queryset.visible() if model is Video else queryset
+
+    def render_cards(self, entries):
+        prefetch_content_objects(entries, self.card_queryset)
+        contents = [entry.content_object for entry in entries if entry.content_object is not None]
+        return ContentCardSerializer(contents, many=True).data
+
+
+class RelatedContentView(ContentCardListMixin, APIView):
+    """
+    "Up next": the contents most similar to a video/podcast, best first. ?n= returns only the first n of them.
+    """
+
+    def get(self, request, content_type, pk):
+        content_type = resolve_content_type(content_type)
+        if content_type is None:
+            raise NotFound()
+        n = self.get_n(getattr(settings, 'RECOMMENDATIONS', {}).get('TOP_N', 20))
+        entries = list(recommendations.get_related(content_type, pk, n=n))
+        return Response({'results': self.render_cards(entries)})
+
+
+class RecommendationView(ContentCardListMixin, APIView):
+    """
+    Home feed: the recommendations of the user, best first. Users without recommendations yet (no likes, no playlists)
+    get the global trending videos instead, "source" tells which. ?n= returns only the first n of them.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def get(self, request):
+        n = self.get_n(getattr(settings, 'RECOMMENDATIONS', {}).get('USER_TOP_N', 50))
+        entries = list(recommendations.get_recommendations(request.user, n=n))
+        if entries:
+            return Response({'source': 'recommendations', 'results': self.render_cards(entries)})
+
+        trending = list(get_trending(TrendingVideo.Scope.GLOBAL, k=n).values_list('video_id', flat=True))
+        videos = self.card_queryset(Video).in_bulk(trending)
+        contents = [videos[video_id] for video_id in trending if video_id in videos]
+        return Response({'source': 'trending', 'results': ContentCardSerializer(contents, many=True).data})
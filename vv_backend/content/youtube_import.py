@@ -0,0 +1,276 @@
+"""
+Bulk import of YouTube Data API video resources (https://developers.google.com/youtube/v3/docs/videos#resource) into Video
+and its detail tables (ContentTitle, ThumbnailDetail, ChannelDetail, VideoLocalization, tags, categories).
+
+The input is JSON Lines, one video resource per line, read as a stream in batches (read_batches()), so memory stays
+constant whatever the size of the file. Every batch is imported in one transaction with a handful of bulk statements:
+- Video rows are upserted by youtube_video_id (bulk_create(update_conflicts=True)), re-importing a video updates it
+- tag/category/language names are resolved through the metadata lookup cache (content/lookups.py), the missing ones are
+  created with one bulk insert per model
+- the detail rows of the batch's videos are replaced with one DELETE + one bulk INSERT per table
+After each batch the byte offset of the next line can be saved as a checkpoint, and an import can resume from it.
+
+Sample usage:
+
+    python manage.py import_youtube_videos videos.jsonl --checkpoint videos.checkpoint
+    python manage.py import_youtube_videos videos.jsonl --checkpoint videos.checkpoint --resume
+"""
+
+import json
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.dateparse import parse_datetime, parse_duration
+
+from content.lookups import clear_lookup_caches, get_lookup
+from content.models.content import Video
+from content.models.metadata import Category, ChannelDetail, ContentTitle, Hashtag, Language, Tag, ThumbnailDetail, VideoLocalization
+from content.response_cache import invalidate_contents
+from content.search import schedule_reindex
+
+logger = logging.getLogger(__name__)
+
+# snippet.categoryId -> name, https://developers.google.com/youtube/v3/docs/videoCategories/list
+YOUTUBE_CATEGORIES = {
+    '1': 'Film & Animation', '2': 'Autos & Vehicles', '10': 'Music', '15': 'Pets & Animals', '17': 'Sports',
+    '19': 'Travel & Events', '20': 'Gaming', '22': 'People & Blogs', '23': 'Comedy', '24': 'Entertainment',
+    '25': 'News & Politics', '26': 'Howto & Style', '27': 'Education', '28': 'Science & Technology', '29': 'Nonprofits & Activism',
+}
+
+# preferred thumbnail sizes, biggest first
+THUMBNAIL_SIZES = ('maxres', 'standard', 'high', 'medium', 'default')
+
+# Video columns an import overwrites on an already imported video
+VIDEO_UPDATE_FIELDS = [
+    'description', 'duration', 'released_date', 'original_language', 'view_count', 'like_count', 'comment_count',
+    'dimension', 'definition', 'caption', 'licensed_content', 'projection', 'has_custom_thumbnail',
+    'default_language', 'default_audio_language', 'live_broadcast_content',
+    'upload_status', 'privacy_status', 'license', 'embeddable', 'public_stats_viewable', 'made_for_kids', 'self_declared_made_for_kids',
+]
+
+
+def read_batches(path, batch_size=1000, offset=0):
+    """
+    Stream a JSON Lines file from the byte offset, yields (records, offset of the next line, number of invalid lines).
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        records, invalid = [], 0
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                invalid += 1
+                logger.warning("Skipping invalid JSON line ending at byte %d", offset)
+            if len(records) >= batch_size:
+                yield records, offset, invalid
+                records, invalid = [], 0
+        if records or invalid:
+            yield records, offset, invalid
+
+
+def _bool(value):
+    # the API sends some flags as strings, e.g. contentDetails.caption = "true"
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class YoutubeVideoImporter:
+    def import_batch(self, resources):
+        """
+        Upsert one batch of video resources and their detail rows in one transaction. Returns the number of imported videos.
+        Resources without an id are skipped. If a video is in the batch twice, the last one wins.
+        """
+        resources = {resource['id']: resource for resource in resources if resource.get('id')}
+        if not resources:
+            return 0
+
+        try:
+            with transaction.atomic():
+                languages = self._resolve_names(Language, {
+                    language
+                    for resource in resources.values()
+                    for language in (self._snippet(resource).get('defaultLanguage'), self._snippet(resource).get('defaultAudioLanguage'))
+                    if language
+                })
+                tags = self._resolve_names(Tag, {tag[:100] for resource in resources.values() for tag in self._snippet(resource).get('tags') or []})
+                hashtags = self._resolve_names(Hashtag, {hashtag for resource in resources.values() for hashtag in self._hashtags(resource)})
+                categories = self._resolve_names(Category, {
+                    self._category_name(resource) for resource in resources.values() if self._category_name(resource)
+                })
+
+                Video.objects.bulk_create(
+                    [self._build_video(resource, languages) for resource in resources.values()],
+                    update_conflicts=True,
+                    unique_fields=['youtube_video_id'],
+                    update_fields=VIDEO_UPDATE_FIELDS,
+                )
+                # the pks of the videos that already existed are not the ones bulk_create generated, read them back
+                video_ids = dict(Video.objects.filter(youtube_video_id__in=resources).values_list('youtube_video_id', 'id'))
+
+                self._replace_details(resources, video_ids, languages)
+                self._replace_m2m(Video.tags.through, 'tag_id', video_ids, {
+                    youtube_id: [tags[tag[:100]].pk for tag in self._snippet(resource).get('tags') or []]
+                    for youtube_id, resource in resources.items()
+                })
+                self._replace_m2m(Video.hashtags.through, 'hashtag_id', video_ids, {
+                    youtube_id: [hashtags[hashtag].pk for hashtag in self._hashtags(resource)]
+                    for youtube_id, resource in resources.items()
+                })
+                self._replace_m2m(Video.categories.through, 'category_id', video_ids, {
+                    youtube_id: [categories[self._category_name(resource)].pk] if self._category_name(resource) else []
+                    for youtube_id, resource in resources.items()
+                })
+                # bulk_create() sends no signals, so keep the search index and the cached responses in sync explicitly
+                schedule_reindex(video_ids.values())
+                invalidate_contents(Video, video_ids.values())
+        except Exception:
+            # the names created by this batch were rolled back but may already be in the lookup cache
+            clear_lookup_caches()
+            raise
+        return len(resources)
+
+    @staticmethod
+    def _snippet(resource):
+        return resource.get('snippet') or {}
+
+    def _category_name(self, resource):
+        category_id = self._snippet(resource).get('categoryId')
+        if not category_id:
+            return None
+        return YOUTUBE_CATEGORIES.get(str(category_id), str(category_id))
+
+    def _hashtags(self, resource):
+        # the API has no hashtag field, they are the #words of the description
+        return [word for word in (self._snippet(resource).get('description') or '').split() if word.startswith('#') and len(word) > 1]
+
+    def _thumbnail(self, resource):
+        thumbnails = self._snippet(resource).get('thumbnails') or {}
+        return next((thumbnails[size] for size in THUMBNAIL_SIZES if size in thumbnails), None)
+
+    def _resolve_names(self, model, names):
+        """
+        {name: object} for all the names, the missing ones are created with one bulk insert.
+        """
+        lookup = get_lookup(model)
+        found = lookup.get_many_by_name(names)
+        missing = names - set(found)
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+            found.update(lookup.get_many_by_name(missing))
+        return found
+
+    def _build_video(self, resource, languages):
+        snippet = self._snippet(resource)
+        details = resource.get('contentDetails') or {}
+        status = resource.get('status') or {}
+        statistics = resource.get('statistics') or {}
+        published_at = parse_datetime(snippet['publishedAt']) if snippet.get('publishedAt') else None
+        original_language = languages.get(snippet.get('defaultAudioLanguage') or snippet.get('defaultLanguage'))
+
+        return Video(
+            youtube_video_id=resource['id'],
+            description=snippet.get('description'),
+            duration=parse_duration(details['duration']) if details.get('duration') else None,
+            released_date=published_at.date() if published_at else None,
+            original_language=original_language,
+            view_count=_int(statistics.get('viewCount')),
+            like_count=_int(statistics.get('likeCount')),
+            comment_count=_int(statistics.get('commentCount')),
+            dimension=details.get('dimension'),
+            definition=details.get('definition'),
+            caption=_bool(details.get('caption', False)),
+            licensed_content=_bool(details.get('licensedContent', False)),
+            projection=details.get('projection'),
+            has_custom_thumbnail=_bool(details.get('hasCustomThumbnail', False)),
+            default_language=snippet.get('defaultLanguage'),
+            default_audio_language=snippet.get('defaultAudioLanguage'),
+            live_broadcast_content=snippet.get('liveBroadcastContent'),
+            upload_status=status.get('uploadStatus'),
+            privacy_status=status.get('privacyStatus'),
+            license=status.get('license'),
+            embeddable=_bool(status.get('embeddable', False)),
+            public_stats_viewable=_bool(status.get('publicStatsViewable', True)),
+            made_for_kids=_bool(status.get('madeForKids', False)),
+            self_declared_made_for_kids=_bool(status.get('selfDeclaredMadeForKids', False)),
+        )
+
+    def _replace_details(self, resources, video_ids, languages):
+        pks = list(video_ids.values())
+        # Video.thumbnail/channel_info/localization cascade on delete, so unlink them before deleting the old detail rows
+        Video.objects.filter(pk__in=pks).update(thumbnail=None, channel_info=None, localization=None)
+        ThumbnailDetail.objects.filter(video_id__in=pks).delete()
+        ChannelDetail.objects.filter(video_id__in=pks).delete()
+        VideoLocalization.objects.filter(video_id__in=pks).delete()
+        video_type = ContentType.objects.get_for_model(Video)
+        ContentTitle.objects.filter(content_type=video_type, content_id__in=pks).delete()
+
+        thumbnails, channels, localizations, titles = [], [], [], []
+        for youtube_id, resource in resources.items():
+            video_id = video_ids[youtube_id]
+            snippet = self._snippet(resource)
+
+            if snippet.get('title'):
+                titles.append(ContentTitle(
+                    title_text=snippet['title'],
+                    language=languages.get(snippet.get('defaultLanguage')),
+                    is_native=True,
+                    content_type=video_type,
+                    content_id=video_id,
+                ))
+
+            thumbnail = self._thumbnail(resource)
+            if thumbnail and thumbnail.get('url'):
+                thumbnails.append(ThumbnailDetail(
+                    video_id=video_id, url=thumbnail['url'], width=_int(thumbnail.get('width')), height=_int(thumbnail.get('height')),
+                ))
+
+            if snippet.get('channelId'):
+                channels.append(ChannelDetail(video_id=video_id, channel_id=snippet['channelId'], channel_title=snippet.get('channelTitle', '')))
+
+            for language, localization in (resource.get('localizations') or {}).items():
+                localizations.append(VideoLocalization(
+                    video_id=video_id, language=language[:10], title=localization.get('title', '')[:255], description=localization.get('description'),
+                ))
+
+        ContentTitle.objects.bulk_create(titles)
+        thumbnails = ThumbnailDetail.objects.bulk_create(thumbnails)
+        channels = ChannelDetail.objects.bulk_create(channels)
+        localizations = VideoLocalization.objects.bulk_create(localizations)
+
+        # link the one-to-ones back, the localization of a video is the one in its default language
+        links = {}
+        for thumbnail in thumbnails:
+            links.setdefault(thumbnail.video_id, Video(pk=thumbnail.video_id)).thumbnail_id = thumbnail.pk
+        for channel in channels:
+            links.setdefault(channel.video_id, Video(pk=channel.video_id)).channel_info_id = channel.pk
+        default_languages = {video_ids[youtube_id]: self._snippet(resource).get('defaultLanguage') for youtube_id, resource in resources.items()}
+        for localization in localizations:
+            if localization.language == default_languages.get(localization.video_id):
+                links.setdefault(localization.video_id, Video(pk=localization.video_id)).localization_id = localization.pk
+        if links:
+            Video.objects.bulk_update(list(links.values()), ['thumbnail', 'channel_info', 'localization'])
+
+    def _replace_m2m(self, through, target_field, video_ids, targets):
+        through.objects.filter(video_id__in=video_ids.values()).delete()
+        through.objects.bulk_create(
+            [
+                through(video_id=video_ids[youtube_id], **{target_field: target_id})
+                for youtube_id, target_ids in targets.items()
+                # dict.fromkeys() drops duplicates and keeps the order
+                for target_id in dict.fromkeys(target_ids)
+            ],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,195 @@
+"""
+Activity feed: what the friends of a user liked, commented on or added to their public playlists, newest first.
+
+Computing it on read would join the likes, comments and playlist entries of all the friends of the reader. Instead:
+- every like/comment/public playlist addition writes a compact Activity row (record() and record_many(), called by the
+  receivers in user_interactions/signals.py and by user_interactions/playlists.py),
+- once the transaction commits, the activity is copied into the timeline (TimelineEntry) of each friend of its actor
+  (fan-out on write), in batches, by a small pool of background threads (synchronously with ACTIVITY_FEED['ASYNC'] = False),
+- a feed page is a keyset range read of the reader's timeline on the (owner, created_at, activity) index.
+
+Users with more than FANOUT_THRESHOLD friends are not fanned out: copying each of their activities into thousands of
+timelines costs more than their friends reading them (fan-out on read). Their activities are marked fanned_out=False
+and merged into the feeds from a partial index holding only those. Timelines are bounded: entries past the
+MAX_TIMELINE_LENGTH newest of a user are deleted by "python manage.py trim_timelines".
+
+Sample usage:
+
+    record(like.posted_by_id, Activity.Verb.LIKED, like.content_type_id, like.content_id, like=like)
+    activities, next_cursor = read_feed(user, cursor=None, limit=20)
+"""
+
+import base64
+import binascii
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from user_interactions.models import Activity, TimelineEntry
+from users.friends import friend_ids
+
+logger = logging.getLogger(__name__)
+
+
+def _options():
+    options = getattr(settings, 'ACTIVITY_FEED', {})
+    return {
+        'fanout_threshold': options.get('FANOUT_THRESHOLD', 1000),
+        'batch_size': options.get('BATCH_SIZE', 1000),
+        'max_timeline_length': options.get('MAX_TIMELINE_LENGTH', 1000),
+        'workers': options.get('WORKERS', 2),
+        'async': options.get('ASYNC', True),
+    }
+
+
+# Writing
+
+def record_many(actor_pk, verb, items):
+    """
+    Record activities of one user, items are (content_type_id, content_id, {'like'/'comment'/'playlist_entry': source}).
+    Their fan-out is scheduled for when the transaction commits.
+    """
+    if not items:
+        return []
+    fanned_out = len(friend_ids(actor_pk)) <= _options()['fanout_threshold']
+    activities = Activity.objects.bulk_create([
+        Activity(actor_id=actor_pk, verb=verb, content_type_id=content_type_id, content_id=content_id, fanned_out=fanned_out, **source)
+        for content_type_id, content_id, source in items
+    ])
+    if fanned_out:
+        schedule_fan_out([activity.pk for activity in activities])
+    return activities
+
+
+def record(actor_pk, verb, content_type_id, content_id, **source):
+    return record_many(actor_pk, verb, [(content_type_id, content_id, source)])[0]
+
+
+def fan_out(activity_pks):
+    """
+    Copy activities into the timelines of the current friends of their actors. Returns the number of entries written.
+    """
+    batch_size = _options()['batch_size']
+    written = 0
+    for activity in Activity.objects.filter(pk__in=activity_pks, fanned_out=True).only('pk', 'actor', 'created_at'):
+        entries = [
+            TimelineEntry(owner_id=owner_pk, activity_id=activity.pk, created_at=activity.created_at)
+            for owner_pk in friend_ids(activity.actor_id)
+        ]
+        TimelineEntry.objects.bulk_create(entries, batch_size=batch_size)
+        written += len(entries)
+    return written
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_options()['workers'], thread_name_prefix='activity-fan-out')
+    return _executor
+
+
+def _fan_out_in_background(activity_pks):
+    try:
+        fan_out(activity_pks)
+    except Exception:
+        logger.exception("Failed to fan out activities %s", activity_pks)
+    finally:
+        # this thread has its own DB connection
+        close_old_connections()
+
+
+def schedule_fan_out(activity_pks):
+    if _options()['async']:
+        transaction.on_commit(lambda: _get_executor().submit(_fan_out_in_background, activity_pks))
+    else:
+        transaction.on_commit(lambda: fan_out(activity_pks))
+
+
+def remove_between(user_pk, other_pk):
+    """
+    Drop the activities of two users from each other's timeline, when they stop being friends.
+    """
+    TimelineEntry.objects.filter(
+        Q(owner_id=user_pk, activity__actor_id=other_pk) | Q(owner_id=other_pk, activity__actor_id=user_pk)
+    ).delete()
+
+
+def trim_timelines(max_length=None, batch_size=10_000):
+    """
+    Delete the timeline entries past the max_length newest of every user, batch_size entries per statement.
+    Returns the number of entries deleted.
+    """
+    max_length = max_length or _options()['max_timeline_length']
+    ranked = TimelineEntry.objects.annotate(
+        rank=Window(RowNumber(), partition_by=[F('owner_id')], order_by=[F('created_at').desc(), F('activity_id').desc()]),
+    ).filter(rank__gt=max_length)
+    total = 0
+    while True:
+        pks = list(ranked.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        TimelineEntry.objects.filter(pk__in=pks).delete()
+        total += len(pks)
+        if len(pks) < batch_size:
+            break
+    return total
+
+
+# Reading
+
+def encode_cursor(activity):
+    return base64.urlsafe_b64encode(f"{activity.created_at.isoformat()}|{activity.pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    (created_at, activity pk) of a cursor, raises ValueError if it is malformed.
+    """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as error:
+        raise ValueError(str(error))
+
+
+def read_feed(user, cursor=None, limit=20, queryset=None):
+    """
+    A page of the feed of a user: (activities newest first, cursor of the next page or None).
+    The activities of the page are loaded with `queryset` (e.g. with select_related()), in one query.
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    timeline = TimelineEntry.objects.filter(owner=user)
+    if position is not None:
+        created_at, pk = position
+        timeline = timeline.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, activity_id__lt=pk))
+    keys = list(timeline.order_by('-created_at', '-activity_id').values_list('created_at', 'activity_id')[:limit + 1])
+
+    # the activities of the friends who are not fanned out (fan-out on read)
+    friends = friend_ids(user.pk)
+    if friends:
+        unfanned = Activity.objects.filter(fanned_out=False, actor_id__in=friends)
+        if position is not None:
+            created_at, pk = position
+            unfanned = unfanned.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        keys += unfanned.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit + 1]
+        keys.sort(reverse=True)
+
+    keys = keys[:limit + 1]
+    has_next = len(keys) > limit
+    keys = keys[:limit]
+    activities = (queryset if queryset is not None else Activity.objects.all()).in_bulk([pk for _, pk in keys])
+    page = [activities[pk] for _, pk in keys if pk in activities]
+    return page, encode_cursor(page[-1]) if has_next and page else None
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UserInteractionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user_interactions'
+
+    def ready(self):
+        import user_interactions.signals
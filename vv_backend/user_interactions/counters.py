@@ -0,0 +1,58 @@
+"""
+Counter engine for the denormalised viewer stats on BaseContentModel (like_count, dislike_count, view_count, comment_count).
+
+Every write goes through a single "UPDATE ... SET col = col + n WHERE id = ..." statement built from F() expressions,
+so concurrent likes never read-modify-write the content row and no increment is ever lost.
+It also never touches the other columns of the content row (the old content_object.save() rewrote all of them).
+The cached details of the updated contents are invalidated, not the cached lists: those show counters up to
+RESPONSE_CACHE['TIMEOUT'] seconds old, else every like or view flush would invalidate every list (content/response_cache.py).
+
+Sample usage:
+
+    update_content_counters(like.content_type_id, like.content_id, like_count=1)
+    update_content_counters(ContentType.objects.get_for_model(video).id, video.id, like_count=-1, dislike_count=1)
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+
+from content.response_cache import invalidate_contents
+
+COUNTER_FIELDS = ('like_count', 'dislike_count', 'view_count', 'comment_count')
+
+
+def get_content_model(content_type_id):
+    # ContentType.objects caches get_for_id() per process, so this doesn't hit the DB after the first call
+    return ContentType.objects.get_for_id(content_type_id).model_class()
+
+
+def update_content_counters(content_type_id, content_id, **deltas):
+    """
+    Atomically apply counter deltas (e.g. like_count=1, dislike_count=-1) to one content row.
+    Returns the number of rows updated (0 if the content doesn't exist anymore).
+    """
+    updates = _build_updates(deltas)
+    if not updates or content_type_id is None:
+        return 0
+    model = get_content_model(content_type_id)
+    invalidate_contents(model, [content_id], lists=False)
+    return model._base_manager.filter(pk=content_id).update(**updates)
+
+
+def update_many_content_counters(content_type_id, content_ids, **deltas):
+    """
+    Same as update_content_counters(), but applies the same deltas to many content rows of one type in one statement.
+    """
+    updates = _build_updates(deltas)
+    if not updates or content_type_id is None or not content_ids:
+        return 0
+    model = get_content_model(content_type_id)
+    invalidate_contents(model, content_ids, lists=False)
+    return model._base_manager.filter(pk__in=content_ids).update(**updates)
+
+
+def _build_updates(deltas):
+    unknown = set(deltas) - set(COUNTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown counter field(s): {', '.join(sorted(unknown))}")
+    return {field: F(field) + delta for field, delta in deltas.items() if delta}
@@ -0,0 +1,65 @@
+"""
+Helpers shared by everything that points at a content (Video/Podcast) through content_type + content_id.
+"""
+
+from django.db import models
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+
+# URL names of the content models that viewers can interact with, e.g. /interactions/video/<uuid>/view/
+CONTENT_APP_LABEL = 'content'
+CONTENT_MODEL_NAMES = ('video', 'podcast')
+
+
+def resolve_content_type(model_name):
+    """
+    Map a content model name ("video" or "podcast") to its ContentType, or None if it is not a content model.
+    ContentType.objects caches this per process, so there is no DB query after the first call.
+    """
+    if model_name not in CONTENT_MODEL_NAMES:
+        return None
+    return ContentType.objects.get_by_natural_key(CONTENT_APP_LABEL, model_name)
+
+
+class ContentRelationModel(models.Model):
+    """
+    Abstract base of every model pointing at a content (Video/Podcast) through content_type + content_id.
+    Only content_type gets an automatic FK index, so it declares the (content_type, content_id) composite index all the
+    "likes/titles/comments of this video" lookups (and GenericRelation prefetches) need.
+    Subclasses that declare their own Meta must inherit from ContentRelationModel.Meta and extend its indexes.
+    """
+    # no index of its own, the composite index below starts with it
+    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True, db_index=False) # It is not a good idea to delete a content type anyway
+    content_id = models.UUIDField()
+    content_object = GenericForeignKey('content_type', 'content_id')
+
+    class Meta:
+        abstract = True
+        indexes = [
+            # named after the class only, index names can't be longer than 30 characters
+            models.Index(fields=['content_type', 'content_id'], name='%(class)s_ct_idx'),
+        ]
+
+
+def prefetch_content_objects(relations, get_queryset=None):
+    """
+    Load the content_object of a list of ContentRelationModel rows pointing at mixed content types, with one
+    "id IN (...)" query per content type instead of one query per row. Rows whose content doesn't exist anymore get None.
+    Like prefetch_related('content_object'), but get_queryset(model) can shape the query of each model (only(),
+    select_related(), prefetch_related()), e.g. ContentCardSerializer.card_queryset.
+    Returns the rows.
+    """
+    content_ids = {}
+    for relation in relations:
+        content_ids.setdefault(relation.content_type_id, set()).add(relation.content_id)
+
+    contents = {}
+    for content_type_id, ids in content_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        queryset = get_queryset(model) if get_queryset is not None else model._base_manager.all()
+        contents[content_type_id] = queryset.in_bulk(ids)
+
+    for relation in relations:
+        content_object = contents[relation.content_type_id].get(relation.content_id)
+        relation._meta.get_field('content_object').set_cached_value(relation, content_object)
+    return relations
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from user_interactions.activity import trim_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the timeline entries past ACTIVITY_FEED['MAX_TIMELINE_LENGTH'] newest of every user "
+        "(user_interactions/activity.py). Meant to be run periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int, default=None, help="Entries kept per user.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Entries deleted per statement.")
+
+    def handle(self, *args, **options):
+        deleted = trim_timelines(max_length=options['max_length'], batch_size=options['batch_size'])
+        self.stdout.write(f"{deleted} timeline entries deleted")
@@ -1,12 +1,46 @@
 import uuid
 
-from django.db import models
-from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.utils import timezone
 
 from users.models import User
+from user_interactions.counters import update_content_counters, update_many_content_counters
+from user_interactions.generic import ContentRelationModel
 
-class Comment(models.Model):
+class CommentQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Bulk delete that keeps comment_count/reply_count right: the deleted comments and their replies are counted per content
+        (one query), then the counters are decremented with one UPDATE per (content type, number of deleted comments).
+        """
+        with transaction.atomic(using=self.db):
+            pks = self.values('pk')
+            deleted_comments = Comment.objects.filter(models.Q(pk__in=pks) | models.Q(parent__in=pks))
+            per_content = deleted_comments.values_list('content_type_id', 'content_id').annotate(count=Count('pk')).order_by()
+            # parents that lose replies but are not deleted themselves
+            per_parent = (
+                self.filter(parent__isnull=False).exclude(parent__in=pks)
+                .values_list('parent_id').annotate(count=Count('pk')).order_by()
+            )
+            per_content, per_parent = list(per_content), list(per_parent)
+
+            result = super().delete()
+
+            batches = {}
+            for content_type_id, content_id, count in per_content:
+                batches.setdefault((content_type_id, count), []).append(content_id)
+            for (content_type_id, count), content_ids in batches.items():
+                update_many_content_counters(content_type_id, content_ids, comment_count=-count)
+            for parent_id, count in per_parent:
+                Comment.objects.filter(pk=parent_id).update(reply_count=F('reply_count') - count)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class Comment(ContentRelationModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) 
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -14,7 +48,7 @@ class Comment(models.Model):
     posted_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     """
     Ziming: 
-    these three lines make sure we don't need seperate Video_Comment, Podcast_Comment, and furthermore, Video_like and Podcast_like
+    the content_type/content_id/content_object fields (from ContentRelationModel, see user_interactions/generic.py) make sure we don't need seperate Video_Comment, Podcast_Comment, and furthermore, Video_like and Podcast_like
     
     Sample usage: 
 
@@ -38,11 +72,56 @@ class Comment(models.Model):
     )
 
     """
-    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True) # It is not a good idea to delete a content type anyway
-    content_id = models.UUIDField()
-    content_object = GenericForeignKey('content_type', 'content_id')
 
-class LikeDislike(models.Model):
+    # Threads are one level deep: a reply's parent is always a top level comment (replies to a reply are attached to its parent)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    reply_count = models.IntegerField(default=0)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta(ContentRelationModel.Meta):
+        indexes = ContentRelationModel.Meta.indexes + [
+            # keyset pagination of the top level comments of a content, newest first (see user_interactions/pagination.py)
+            models.Index(
+                fields=['content_type', 'content_id', 'created_at', 'id'],
+                condition=models.Q(parent__isnull=True),
+                name='comment_thread_idx',
+            ),
+            # keyset pagination of the replies of a comment
+            models.Index(fields=['parent', 'created_at', 'id'], name='comment_reply_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Keep BaseContentModel.comment_count (and the parent's reply_count) in step, like LikeDislike.save() does for like counts.
+        """
+        if not self._state.adding:
+            return super(Comment, self).save(*args, **kwargs)
+
+        if self.parent_id is not None and self.parent.parent_id is not None:
+            self.parent_id = self.parent.parent_id
+        with transaction.atomic():
+            super(Comment, self).save(*args, **kwargs)
+            update_content_counters(self.content_type_id, self.content_id, comment_count=1)
+            if self.parent_id is not None:
+                Comment.objects.filter(pk=self.parent_id).update(reply_count=F('reply_count') + 1)
+
+    def delete(self, *args, **kwargs):
+        """
+        Deleting a comment also deletes its replies, comment_count goes down by all of them.
+        """
+        with transaction.atomic():
+            result = super(Comment, self).delete(*args, **kwargs)
+            # Only count rows that were really deleted, a concurrent delete of the same comment must not decrement twice
+            deleted = result[1].get(self._meta.label, 0)
+            if deleted:
+                update_content_counters(self.content_type_id, self.content_id, comment_count=-deleted)
+                if self.parent_id is not None:
+                    Comment.objects.filter(pk=self.parent_id).update(reply_count=F('reply_count') - 1)
+        return result
+
+
+class LikeDislike(ContentRelationModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) 
     is_like = models.BooleanField()
     posted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='likes_dislikes')
@@ -50,9 +129,16 @@ class LikeDislike(models.Model):
     Ziming: 
     Check the comments in "Comment" model for the usage of these fields
     """
-    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True) # It is not a good idea to delete a content type anyway
-    content_id = models.UUIDField()
-    content_object = GenericForeignKey('content_type', 'content_id')
+
+    class Meta(ContentRelationModel.Meta):
+        constraints = [
+            # one like/dislike per user per content (likes of deleted users, posted_by = NULL, are kept)
+            models.UniqueConstraint(
+                fields=['posted_by', 'content_type', 'content_id'],
+                condition=models.Q(posted_by__isnull=False),
+                name='unique_like_dislike_per_user_content',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -60,6 +146,9 @@ class LikeDislike(models.Model):
         This makes sure that when a like/dislike is saved (either newly created or updated), 
         the like_count/dislike_count in the relevant BaseContentModel will be automatically updated,  
         and we don't need to manually handle such behaviour in routes (or views if you perfer to call it this way)
+
+        The counts are changed with single "col = col + n" statements (see user_interactions/counters.py), 
+        so concurrent likes on the same content can't overwrite each other's increments. 
         """
 
         # check if the save() is trigger by a create or an update
@@ -69,34 +158,30 @@ class LikeDislike(models.Model):
         # we shouldn't access it directly, but nothing can actually stop me from doing so  
         is_create = self._state.adding 
 
-        # If updating, store the old value before saving
-        if not is_create:
-            # Important: we can't use self.is_like, since it is been overidden already
-            old_instance = LikeDislike.objects.get(pk=self.pk)
-            old_is_like = old_instance.is_like
-
-        super(LikeDislike, self).save(*args, **kwargs) # Save the LikeDislike entity
-
-        # start updating count fields in BaseContentModel
-        content_object = self.content_object
-        if content_object:
-            # For new likes/dislikes
+        with transaction.atomic():
             if is_create:
+                super(LikeDislike, self).save(*args, **kwargs) # Save the LikeDislike entity
                 if self.is_like:
-                    content_object.like_count += 1
+                    deltas = {'like_count': 1}
                 else:
-                    content_object.dislike_count += 1
-            # For updated likes/dislikes
+                    deltas = {'dislike_count': 1}
             else:
-                # Switch from like to dislike
-                if old_is_like and not self.is_like:
-                    content_object.like_count -= 1
-                    content_object.dislike_count += 1
+                # Flip is_like only if it actually differs from the stored value. 
+                # The UPDATE locks the row, so when two requests flip the same like concurrently, only one of them sees a change.
+                # This replaces the old "LikeDislike.objects.get(pk=self.pk)" read, which raced with concurrent updates.
+                flipped = LikeDislike.objects.filter(pk=self.pk).exclude(is_like=self.is_like).update(is_like=self.is_like)
+                super(LikeDislike, self).save(*args, **kwargs) # Save the LikeDislike entity
+                if not flipped:
+                    deltas = {}
                 # Switch from dislike to like
-                elif not old_is_like and self.is_like:
-                    content_object.dislike_count -= 1
-                    content_object.like_count += 1
-            content_object.save()
+                elif self.is_like:
+                    deltas = {'like_count': 1, 'dislike_count': -1}
+                # Switch from like to dislike
+                else:
+                    deltas = {'like_count': -1, 'dislike_count': 1}
+
+            update_content_counters(self.content_type_id, self.content_id, **deltas)
+        self._sync_cached_content_object(deltas)
 
     def delete(self, *args, **kwargs):
         """
@@ -105,17 +190,31 @@ class LikeDislike(models.Model):
         the like_count/dislike_count in the relevant BaseContentModel will be automatically updated, 
         and we don't need to manually handle such behaviour in routes (or views if you perfer to call it this way)
         """
-        # Store content_object before deletion
-        content_object = self.content_object    
-        # Call the real delete() method
-        super(LikeDislike, self).delete(*args, **kwargs)    
-        # Update like/dislike counts after deletion
-        if content_object:
+        with transaction.atomic():
+            # Call the real delete() method
+            result = super(LikeDislike, self).delete(*args, **kwargs)
+            # Only count rows that were really deleted, a concurrent delete of the same like/dislike must not decrement twice
+            if not result[1].get(self._meta.label, 0):
+                return result
+            # Update like/dislike counts after deletion
             if self.is_like:
-                content_object.like_count -= 1
+                deltas = {'like_count': -1}
             else:
-                content_object.dislike_count -= 1
-            content_object.save()
+                deltas = {'dislike_count': -1}
+            update_content_counters(self.content_type_id, self.content_id, **deltas)
+        self._sync_cached_content_object(deltas)
+        return result
+
+    def _sync_cached_content_object(self, deltas):
+        """
+        The counters are updated in the DB only, so if content_object has already been loaded on this instance, 
+        keep its in-memory counts in step with what we just wrote (no extra query, no save).
+        """
+        content_object = self._meta.get_field('content_object').get_cached_value(self, default=None)
+        if content_object is None:
+            return
+        for field, delta in deltas.items():
+            setattr(content_object, field, getattr(content_object, field) + delta)
 
 """
 Ziming: Since Django doesn't auto-resolve generic many-to-many, we need to manually set-up our intermedia broker table "PlaylistContent" to achieve this
@@ -131,8 +230,85 @@ class Playlist(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_playlists')
 
-class PlaylistContent(models.Model):
-    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='playlistContent_table_entries')
-    content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True) # Its not a good idea to delete a content type anyway
-    content_id = models.UUIDField()
-    content_object = GenericForeignKey('content_type', 'content_id')
\ No newline at end of file
+# Distance between the positions of two consecutive playlist entries, room for 16 inserts/moves in the same spot
+# before the playlist has to be renumbered (see user_interactions/playlists.py)
+POSITION_GAP = 1 << 16
+
+
+class PlaylistContent(ContentRelationModel):
+    """
+    An entry of a playlist, ordered by position. The positions are sparse (POSITION_GAP apart once renumbered),
+    so an insert or a move only writes the moved rows. Use user_interactions/playlists.py to change the order.
+    """
+    # no index of its own, the (playlist, position) index starts with it
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='playlistContent_table_entries', db_index=False)
+    position = models.BigIntegerField()
+
+    class Meta(ContentRelationModel.Meta):
+        ordering = ('position', 'id')
+        indexes = ContentRelationModel.Meta.indexes + [
+            # the entries of a playlist in order, also backs "entries 500 to 550" (LIMIT/OFFSET on the index)
+            models.Index(fields=['playlist', 'position'], name='playlist_content_pos_idx'),
+        ]
+        constraints = [
+            # a content is in a playlist at most once
+            models.UniqueConstraint(fields=['playlist', 'content_type', 'content_id'], name='unique_playlist_content'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        A new entry without a position is appended at the end of its playlist.
+        """
+        if self._state.adding and self.position is None:
+            last = (
+                PlaylistContent.objects.filter(playlist_id=self.playlist_id)
+                .order_by('-position').values_list('position', flat=True).first()
+            )
+            self.position = (last or 0) + POSITION_GAP
+        return super(PlaylistContent, self).save(*args, **kwargs)
+
+
+class Activity(ContentRelationModel):
+    """
+    Something a user did that their friends see in their feed (see user_interactions/activity.py).
+    Points at the like/comment/playlist entry it comes from, so it disappears with it.
+    """
+
+    class Verb(models.IntegerChoices):
+        LIKED = 1, 'LIKED'
+        COMMENTED = 2, 'COMMENTED'
+        PLAYLIST_ADDED = 3, 'PLAYLIST_ADDED'
+    # no index of its own, the (actor, created_at, id) index starts with it
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities', db_index=False)
+    verb = models.IntegerField(choices=Verb.choices)
+    like = models.ForeignKey(LikeDislike, on_delete=models.CASCADE, null=True, related_name='activities')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, related_name='activities')
+    playlist_entry = models.ForeignKey(PlaylistContent, on_delete=models.CASCADE, null=True, related_name='activities')
+    created_at = models.DateTimeField(default=timezone.now)
+    # False for the activities of users with too many friends to copy them in every timeline, their friends read them
+    # from here instead (fan-out on read)
+    fanned_out = models.BooleanField(default=True)
+
+    class Meta(ContentRelationModel.Meta):
+        indexes = ContentRelationModel.Meta.indexes + [
+            models.Index(fields=['actor', 'created_at', 'id'], name='activity_actor_idx'),
+            # only the activities that are not fanned out, merged into the feeds on read
+            models.Index(fields=['created_at', 'id'], condition=models.Q(fanned_out=False), name='activity_unfanned_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    An activity of a friend, copied into the timeline of a user when it happens (fan-out on write).
+    A feed page is then one range read on the (owner, created_at, activity) index, whatever the number of friends.
+    """
+    # no index of its own, the (owner, created_at, activity) index starts with it
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries', db_index=False)
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='timeline_entries')
+    # copy of activity.created_at, so the timeline is ordered on its own index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'activity'], name='timeline_owner_idx'),
+        ]
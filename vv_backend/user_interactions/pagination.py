@@ -0,0 +1,22 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class CommentThreadPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination of the top level comments of a content, newest first.
+    Every page is a range read on the partial (content_type, content_id, created_at, id) index of Comment,
+    so the first page of a video with 500k comments reads page_size rows, no COUNT(*) and no OFFSET.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.COMMENT_PAGINATION['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = settings.COMMENT_PAGINATION['MAX_PAGE_SIZE']
+
+
+class CommentReplyPagination(CommentThreadPagination):
+    """
+    Replies of a comment, oldest first, on the (parent, created_at, id) index.
+    """
+    ordering = ('created_at', 'id')
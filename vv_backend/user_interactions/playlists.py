@@ -0,0 +1,177 @@
+"""
+Ordered playlists: adding, moving and reordering PlaylistContent entries.
+
+Every entry has a sparse integer position (POSITION_GAP apart once renumbered), the playlist is read in
+(position, id) order on the (playlist, position) index. Placing k entries between two neighbours gives them evenly spaced
+positions in the gap between the neighbours, so an insert, a move or a bulk reorder of k entries writes k rows whatever the
+size of the playlist. Only when a gap is exhausted (after ~16 inserts in the same spot) is the playlist renumbered,
+once, in bulk.
+
+The changes of a playlist are serialised by locking its row, so concurrent changes never compute the same positions.
+A content is in a playlist at most once (the unique_playlist_content constraint), adding it again is a no-op.
+
+Sample usage:
+
+    add(playlist, video_type, [video.id])                   # at the end
+    add(playlist, video_type, [video.id], after=None)       # at the start
+    add(playlist, video_type, [video.id], after=entry.id)   # right after an entry
+    move(playlist, [entry_3.id, entry_1.id], after=entry_7.id)
+    remove(playlist, [entry_1.id])
+    entries, next_cursor = read_entries(playlist, cursor=None, limit=50)
+"""
+
+import base64
+import binascii
+
+from django.db import transaction
+from django.db.models import Q
+
+from user_interactions import activity
+from user_interactions.models import POSITION_GAP, Activity, Playlist, PlaylistContent
+
+# `after` value placing the entries at the end of the playlist
+END = 'end'
+
+
+class PlaylistError(ValueError):
+    """
+    A change that doesn't apply to this playlist, the message is meant for the client.
+    """
+
+
+def _lock(playlist):
+    list(Playlist.objects.select_for_update().filter(pk=playlist.pk).values_list('pk', flat=True))
+
+
+def _entries(playlist):
+    return PlaylistContent.objects.filter(playlist=playlist)
+
+
+def _slot(playlist, after, exclude):
+    """
+    (low, high): positions of the entry `after` and of the entry following it, the new entries go strictly between.
+    None for a missing side (start or end of the playlist). Entries in `exclude` (the ones being moved) are ignored.
+    """
+    entries = _entries(playlist).exclude(pk__in=exclude)
+    if after == END:
+        return entries.order_by('-position').values_list('position', flat=True).first(), None
+    low = None
+    if after is not None:
+        low = entries.filter(pk=after).values_list('position', flat=True).first()
+        if low is None:
+            raise PlaylistError(f"Entry {after} is not in the playlist.")
+        entries = entries.filter(position__gt=low)
+    return low, entries.order_by('position').values_list('position', flat=True).first()
+
+
+def _renumber(playlist, exclude, gap):
+    """
+    Spread the entries (but the excluded ones) `gap` apart again.
+    """
+    pks = _entries(playlist).exclude(pk__in=exclude).order_by('position', 'id').values_list('pk', flat=True)
+    PlaylistContent.objects.bulk_update(
+        [PlaylistContent(pk=pk, position=(i + 1) * gap) for i, pk in enumerate(pks)], ['position'], batch_size=1000,
+    )
+
+
+def _positions(playlist, count, after, exclude=()):
+    """
+    `count` increasing positions for entries placed after the entry `after` (None: at the start, END: at the end).
+    """
+    low, high = _slot(playlist, after, exclude)
+    if high is None:
+        return [(low or 0) + (i + 1) * POSITION_GAP for i in range(count)]
+    if low is None:
+        return [high - (count - i) * POSITION_GAP for i in range(count)]
+    step = (high - low) // (count + 1)
+    if step < 1:
+        _renumber(playlist, exclude, gap=max(POSITION_GAP, 2 * (count + 1)))
+        return _positions(playlist, count, after, exclude)
+    return [low + (i + 1) * step for i in range(count)]
+
+
+def add(playlist, content_type, content_ids, after=END):
+    """
+    Add contents to a playlist, in this order, after the entry `after`. Contents already in the playlist are skipped.
+    Returns the new entries.
+    """
+    with transaction.atomic():
+        _lock(playlist)
+        existing = set(
+            _entries(playlist).filter(content_type=content_type, content_id__in=content_ids).values_list('content_id', flat=True)
+        )
+        new_ids = [content_id for content_id in dict.fromkeys(content_ids) if content_id not in existing]
+        if not new_ids:
+            return []
+        positions = _positions(playlist, len(new_ids), after)
+        entries = PlaylistContent.objects.bulk_create([
+            PlaylistContent(playlist=playlist, content_type=content_type, content_id=content_id, position=position)
+            for content_id, position in zip(new_ids, positions)
+        ])
+        if playlist.is_public:
+            # shown in the feeds of the owner's friends (see user_interactions/activity.py)
+            activity.record_many(playlist.created_by_id, Activity.Verb.PLAYLIST_ADDED, [
+                (content_type.id, entry.content_id, {'playlist_entry': entry}) for entry in entries
+            ])
+        return entries
+
+
+def move(playlist, entry_ids, after):
+    """
+    Move entries, in this order, right after the entry `after` (None: to the start, END: to the end).
+    Only the moved entries are written (unless the gap has to be renumbered).
+    """
+    entry_ids = list(dict.fromkeys(entry_ids))
+    if after is not None and after != END and after in entry_ids:
+        raise PlaylistError("An entry can't be moved after itself.")
+    with transaction.atomic():
+        _lock(playlist)
+        if _entries(playlist).filter(pk__in=entry_ids).count() != len(entry_ids):
+            raise PlaylistError("Some entries are not in the playlist.")
+        positions = _positions(playlist, len(entry_ids), after, exclude=entry_ids)
+        PlaylistContent.objects.bulk_update(
+            [PlaylistContent(pk=pk, position=position) for pk, position in zip(entry_ids, positions)], ['position'],
+        )
+
+
+def remove(playlist, entry_ids):
+    """
+    Remove entries from a playlist, the others keep their positions. Returns the number of entries removed.
+    """
+    deleted, _ = _entries(playlist).filter(pk__in=entry_ids).delete()
+    return deleted
+
+
+# Reading
+
+def encode_cursor(entry):
+    return base64.urlsafe_b64encode(f"{entry.position}|{entry.pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    (position, entry pk) of a cursor, raises ValueError if it is malformed.
+    """
+    try:
+        position, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return int(position), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as error:
+        raise ValueError(str(error))
+
+
+def read_entries(playlist, cursor=None, limit=50):
+    """
+    A page of the entries of a playlist in playlist order: (entries, cursor of the next page or None).
+    A keyset range read on the (playlist, position) index past the (position, id) of the cursor, no OFFSET: moving,
+    inserting or removing other entries never shifts the next page, only an entry moved across the cursor is seen twice
+    or not at all.
+    """
+    entries = _entries(playlist).order_by('position', 'id')
+    if cursor:
+        position, pk = decode_cursor(cursor)
+        entries = entries.filter(Q(position__gt=position) | Q(position=position, id__gt=pk))
+    # one extra entry tells whether there is a next page
+    entries = list(entries[:limit + 1])
+    has_next = len(entries) > limit
+    entries = entries[:limit]
+    return entries, encode_cursor(entries[-1]) if has_next else None
@@ -0,0 +1,99 @@
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+
+from content.serializers import ContentCardSerializer
+from user_interactions.generic import CONTENT_MODEL_NAMES
+from user_interactions.models import Activity, Comment, Playlist, PlaylistContent
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    posted_by = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    parent = serializers.PrimaryKeyRelatedField(queryset=Comment.objects.all(), required=False, allow_null=True)
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'text', 'posted_by', 'parent', 'reply_count', 'created_at', 'updated_at')
+        read_only_fields = ('reply_count', )
+
+    def validate_parent(self, parent):
+        content = self.context.get('content')
+        if parent is not None and content is not None and (
+            parent.content_type_id != content['content_type'].id or parent.content_id != content['content_id']
+        ):
+            raise serializers.ValidationError("The parent comment belongs to another content.")
+        return parent
+
+
+class PlaylistSerializer(serializers.ModelSerializer):
+    created_by = serializers.SlugRelatedField(slug_field='username', read_only=True)
+
+    class Meta:
+        model = Playlist
+        fields = ('id', 'name', 'description', 'is_public', 'created_by', 'created_at', 'updated_at')
+
+
+class PlaylistEntrySerializer(serializers.ModelSerializer):
+    content_type = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PlaylistContent
+        fields = ('id', 'content_type', 'content_id')
+
+    def get_content_type(self, entry):
+        # cached per process, no query
+        return ContentType.objects.get_for_id(entry.content_type_id).model
+
+
+class PlaylistItemSerializer(PlaylistEntrySerializer):
+    """
+    An entry with its content as a card. Load the contents with
+    prefetch_content_objects(entries, ContentCardSerializer.card_queryset) first, null if the content was deleted.
+    """
+    content = ContentCardSerializer(source='content_object', read_only=True)
+
+    class Meta(PlaylistEntrySerializer.Meta):
+        fields = PlaylistEntrySerializer.Meta.fields + ('content', )
+
+
+class PlaylistAddSerializer(serializers.Serializer):
+    """
+    Contents to add to a playlist. Without "after" they are appended, "after": null puts them at the start.
+    """
+    content_type = serializers.ChoiceField(choices=CONTENT_MODEL_NAMES)
+    content_ids = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=500)
+    after = serializers.IntegerField(required=False, allow_null=True)
+
+
+class PlaylistMoveSerializer(serializers.Serializer):
+    """
+    Entries to move, in their new order, right after the entry "after" (null: to the start, omitted: to the end).
+    """
+    entries = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=1000)
+    after = serializers.IntegerField(required=False, allow_null=True)
+
+
+class ActivitySerializer(serializers.ModelSerializer):
+    """
+    A feed item. Load the activities with select_related('actor', 'comment', 'playlist_entry__playlist') and their
+    contents with prefetch_content_objects(activities, ContentCardSerializer.card_queryset) first.
+    """
+    actor = serializers.SlugRelatedField(slug_field='username', read_only=True)
+    verb = serializers.CharField(source='get_verb_display', read_only=True)
+    content = ContentCardSerializer(source='content_object', read_only=True)
+    comment = serializers.SerializerMethodField()
+    playlist = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Activity
+        fields = ('id', 'actor', 'verb', 'created_at', 'content', 'comment', 'playlist')
+
+    def get_comment(self, activity):
+        if activity.comment is None:
+            return None
+        return {'id': activity.comment.id, 'text': activity.comment.text}
+
+    def get_playlist(self, activity):
+        if activity.playlist_entry is None:
+            return None
+        playlist = activity.playlist_entry.playlist
+        return {'id': playlist.id, 'name': playlist.name}
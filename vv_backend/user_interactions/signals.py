@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Friendship
+from user_interactions import activity
+from user_interactions.models import Activity, Comment, LikeDislike
+
+
+# Record the activities shown in the feeds of the friends (see user_interactions/activity.py),
+# playlist additions are recorded by user_interactions/playlists.py
+
+@receiver(post_save, sender=LikeDislike)
+def record_like_activity(sender, instance, created, **kwargs):
+    if created and instance.is_like and instance.posted_by_id is not None:
+        activity.record(instance.posted_by_id, Activity.Verb.LIKED, instance.content_type_id, instance.content_id, like=instance)
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.record(instance.posted_by_id, Activity.Verb.COMMENTED, instance.content_type_id, instance.content_id, comment=instance)
+
+
+@receiver(post_delete, sender=Friendship)
+def remove_unfriended_activities(sender, instance, **kwargs):
+    activity.remove_between(instance.requested_by_user_id, instance.sent_to_user_id)
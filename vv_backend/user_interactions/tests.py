@@ -1,9 +1,26 @@
-from django.test import TestCase
+import threading
+import uuid
+from unittest import mock, skipUnless
+
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.contrib.contenttypes.models import ContentType
+
+from rest_framework import status
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.test import APITestCase
 
 from django.contrib.auth import get_user_model
 
 from content.models.content import Video, Podcast
-from user_interactions.models import Comment, LikeDislike, Playlist, PlaylistContent
+from content.models.metadata import ContentTitle
+from content.models.people import ContentPersonnelCast, ContentPersonnelProduce
+from user_interactions.models import Activity, Comment, LikeDislike, Playlist, PlaylistContent, TimelineEntry
+from user_interactions import activity, playlists, view_counts
+from users.friends import get_graph_cache
+from users.models import Friendship
+from user_interactions.view_counts import ViewCountBuffer
 
 User = get_user_model()  # This should be the standard way to make reference to the User model, since we have overridden the default user model
 
@@ -64,6 +81,125 @@ class CommentModelTest(TestCase):
         self.assertEqual(len(Comment.objects.all()), 0)
 
 
+class CommentCountTest(TestCase):
+    """
+    BaseContentModel.comment_count and Comment.reply_count follow comment creations/deletions
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="commentcountuser", email="a@b.com", password="password123")
+        cls.video = Video.objects.create(duration="00:10:00")
+        cls.other_video = Video.objects.create(duration="00:10:00")
+
+    def comment(self, content=None, parent=None):
+        return Comment.objects.create(text="Comment", posted_by=self.user, content_object=content or self.video, parent=parent)
+
+    def test_create_and_delete(self):
+        comment = self.comment()
+        reply = self.comment(parent=comment)
+        self.video.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.video.comment_count, 2)
+        self.assertEqual(comment.reply_count, 1)
+
+        reply.delete()
+        comment.refresh_from_db()
+        self.assertEqual(comment.reply_count, 0)
+
+        self.comment(parent=comment)
+        # deleting a comment also deletes its replies
+        comment.delete()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.comment_count, 0)
+
+    def test_reply_to_reply_is_attached_to_the_thread(self):
+        comment = self.comment()
+        reply = self.comment(parent=comment)
+        reply_to_reply = self.comment(parent=reply)
+        self.assertEqual(reply_to_reply.parent_id, comment.id)
+        comment.refresh_from_db()
+        self.assertEqual(comment.reply_count, 2)
+
+    def test_bulk_delete(self):
+        comments = [self.comment() for _ in range(3)]
+        self.comment(parent=comments[0])
+        kept = self.comment()
+        self.comment(parent=kept)
+        removed_reply = self.comment(parent=kept)
+        self.comment(content=self.other_video)
+
+        Comment.objects.filter(id__in=[c.id for c in comments] + [removed_reply.id]).delete()
+
+        self.video.refresh_from_db()
+        self.other_video.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertEqual(self.video.comment_count, 2)
+        self.assertEqual(self.other_video.comment_count, 1)
+        self.assertEqual(kept.reply_count, 1)
+
+
+class CommentThreadAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="threaduser", email="thread@b.com", password="password123")
+        cls.other_user = User.objects.create_user(username="otheruser", email="other@b.com", password="password123")
+        cls.video = Video.objects.create(duration="00:01:00")
+        cls.comments = [
+            Comment.objects.create(text=f"Comment {i}", posted_by=cls.user, content_object=cls.video) for i in range(5)
+        ]
+        cls.replies = [
+            Comment.objects.create(text=f"Reply {i}", posted_by=cls.user, content_object=cls.video, parent=cls.comments[0])
+            for i in range(3)
+        ]
+
+    def test_list_top_level_comments_newest_first(self):
+        url = reverse('comment_thread', args=['video', self.video.id])
+        seen = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen += [comment['id'] for comment in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [str(comment.id) for comment in reversed(self.comments)])
+
+    def test_list_replies_oldest_first(self):
+        response = self.client.get(reverse('comment_replies', args=[self.comments[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([reply['id'] for reply in response.data['results']], [str(reply.id) for reply in self.replies])
+
+    def test_create_comment_and_reply(self):
+        url = reverse('comment_thread', args=['video', self.video.id])
+        response = self.client.post(url, {'text': "Hello"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.other_user)
+        response = self.client.post(url, {'text': "Hello"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {'text': "Reply", 'parent': str(self.comments[1].id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['posted_by'], "otheruser")
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.comment_count, 10)
+
+        response = self.client.post(reverse('comment_thread', args=['video', uuid.uuid4()]), {'text': "Hello"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_own_comment_only(self):
+        url = reverse('comment_detail', args=[self.comments[0].id])
+        self.client.force_authenticate(self.other_user)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.comment_count, 4)
+
+
 class LikeDislikeModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -158,6 +294,182 @@ class LikeDislikeModelAutoIncrementContent(TestCase):
         self.assertEqual(self.video.dislike_count, 0)
 
 
+@skipUnlessDBFeature('has_select_for_update')
+class LikeDislikeConcurrencyTest(TransactionTestCase):
+    """
+    Hammer one video with likes/dislikes from many threads at once (each thread has its own DB connection),
+    the final counts must be exact, i.e. no increment is lost.
+    """
+
+    thread_count = 8
+    likes_per_thread = 25
+
+    def setUp(self):
+        self.video = Video.objects.create(duration="00:01:00", description="Viral video")
+        self.users = [
+            User.objects.create_user(username=f"hammeruser{i}", email=f"hammer{i}@b.com", password="password123")
+            for i in range(self.thread_count)
+        ]
+
+    def run_in_threads(self, target):
+        errors = []
+
+        def worker(index):
+            try:
+                target(index)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_likes_and_dislikes_are_not_lost(self):
+        # a user can only like a content once, so every like comes from another user
+        likers = User.objects.bulk_create([
+            User(username=f"liker{i}", email=f"liker{i}@b.com")
+            for i in range(self.thread_count * self.likes_per_thread)
+        ])
+
+        def like_many(index):
+            for i in range(self.likes_per_thread):
+                # even threads like, odd threads dislike
+                liker = likers[index * self.likes_per_thread + i]
+                LikeDislike.objects.create(is_like=index % 2 == 0, posted_by=liker, content_object=self.video)
+
+        self.run_in_threads(like_many)
+
+        self.video.refresh_from_db()
+        total = self.thread_count * self.likes_per_thread
+        self.assertEqual(self.video.like_count, total // 2)
+        self.assertEqual(self.video.dislike_count, total // 2)
+        self.assertEqual(LikeDislike.objects.count(), total)
+
+    def test_concurrent_flips_and_deletes_keep_counts_exact(self):
+        like_ids = [
+            LikeDislike.objects.create(is_like=True, posted_by=self.users[i], content_object=self.video).id
+            for i in range(self.thread_count)
+        ]
+
+        def flip_then_delete(index):
+            # every thread flips and deletes the same like/dislike rows, only one of them should be counted each time
+            for like_id in like_ids:
+                like = LikeDislike.objects.get(id=like_id)
+                like.is_like = False
+                like.save()
+            for like_id in like_ids[: self.thread_count // 2]:
+                like = LikeDislike.objects.filter(id=like_id).first()
+                if like:
+                    like.delete()
+
+        self.run_in_threads(flip_then_delete)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.like_count, 0)
+        self.assertEqual(self.video.dislike_count, self.thread_count - self.thread_count // 2)
+
+
+class ViewCountBufferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(duration="00:01:00")
+        cls.podcast = Podcast.objects.create(duration="00:01:00")
+        cls.video_type_id = ContentType.objects.get_for_model(Video).id
+        cls.podcast_type_id = ContentType.objects.get_for_model(Podcast).id
+
+    def setUp(self):
+        self.buffer = ViewCountBuffer(flush_interval=None, max_pending=100, dedup_window=60)
+
+    def test_views_are_coalesced_until_flush(self):
+        for i in range(5):
+            self.buffer.record_view(self.video_type_id, self.video.id, viewer_key=f"user:{i}")
+        self.buffer.record_view(self.podcast_type_id, self.podcast.id)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 0)
+        self.assertEqual(self.buffer.stats()['buffer_depth'], 2)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.video.refresh_from_db()
+        self.podcast.refresh_from_db()
+        self.assertEqual(self.video.view_count, 5)
+        self.assertEqual(self.podcast.view_count, 1)
+
+        stats = self.buffer.stats()
+        self.assertEqual(stats['buffer_depth'], 0)
+        self.assertEqual(stats['views_flushed'], 6)
+        self.assertEqual(stats['flush_count'], 1)
+        self.assertIsNotNone(stats['last_flush_seconds'])
+
+    def test_repeat_views_are_deduplicated_within_window(self):
+        self.assertTrue(self.buffer.record_view(self.video_type_id, self.video.id, viewer_key="user:1"))
+        self.assertFalse(self.buffer.record_view(self.video_type_id, self.video.id, viewer_key="user:1"))
+        # same viewer, other content: counted
+        self.assertTrue(self.buffer.record_view(self.podcast_type_id, self.podcast.id, viewer_key="user:1"))
+
+        with mock.patch('user_interactions.view_counts.time.monotonic', return_value=10 ** 9):
+            # window has passed: counted again
+            self.assertTrue(self.buffer.record_view(self.video_type_id, self.video.id, viewer_key="user:1"))
+
+        self.buffer.flush()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 2)
+        self.assertEqual(self.buffer.stats()['views_deduplicated'], 1)
+
+    def test_flush_when_buffer_is_full(self):
+        self.buffer.max_pending = 2
+        self.buffer.record_view(self.video_type_id, self.video.id)
+        self.buffer.record_view(self.podcast_type_id, self.podcast.id)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 1)
+        self.assertEqual(self.buffer.stats()['buffer_depth'], 0)
+
+    def test_failed_flush_keeps_pending_views(self):
+        self.buffer.record_view(self.video_type_id, self.video.id)
+        with mock.patch('user_interactions.view_counts.update_many_content_counters', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), self.assertLogs('user_interactions.view_counts', level='ERROR'):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.stats()['pending_views'], 1)
+        self.buffer.flush()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 1)
+
+
+class RecordViewAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Video.objects.create(duration="00:01:00")
+
+    def setUp(self):
+        patcher = mock.patch.object(view_counts, 'view_count_buffer', ViewCountBuffer(flush_interval=None))
+        self.buffer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_record_view(self):
+        url = reverse('record_view', args=['video', self.video.id])
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'session_id': 'abc'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.data['counted'])
+        # a client supplied id doesn't make it another viewer
+        response = self.client.post(url, {'session_id': 'def'}, format='json')
+        self.assertFalse(response.data['counted'])
+
+        self.buffer.flush()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.view_count, 1)
+
+    def test_record_view_unknown_content_type(self):
+        url = reverse('record_view', args=['playlist', self.video.id])
+        response = self.client.post(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class PlaylistModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -212,3 +524,288 @@ class PlaylistModelTest(TestCase):
         self.assertIn(video, [pc.content_object for pc in self.playlist.playlistContent_table_entries.all()])
         video.delete()
         self.assertNotIn(video, [pc.content_object for pc in self.playlist.playlistContent_table_entries.all()])
+
+
+class PlaylistOrderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="orderuser", email="order@b.com", password="password123")
+        cls.playlist = Playlist.objects.create(name="ordered", created_by=cls.user)
+        cls.videos = [Video.objects.create(duration="00:01:00", description=f"Video {i}") for i in range(6)]
+        cls.video_type = ContentType.objects.get_for_model(Video)
+
+    def order(self):
+        return [entry.content_id for entry in self.playlist.playlistContent_table_entries.all()]
+
+    def add(self, videos, **kwargs):
+        return playlists.add(self.playlist, self.video_type, [video.id for video in videos], **kwargs)
+
+    def test_add(self):
+        v = self.videos
+        entries = self.add(v[:3])
+        self.add([v[3]], after=None)
+        self.add([v[4]], after=entries[0].id)
+        self.assertEqual(self.order(), [v[3].id, v[0].id, v[4].id, v[1].id, v[2].id])
+
+        # already in the playlist
+        self.assertEqual(self.add([v[0], v[0]]), [])
+        with self.assertRaises(IntegrityError):
+            PlaylistContent.objects.create(playlist=self.playlist, content_object=v[0])
+
+    def test_move_only_writes_the_moved_entries(self):
+        v = self.videos
+        entries = self.add(v)
+        positions = dict(PlaylistContent.objects.values_list('pk', 'position'))
+
+        playlists.move(self.playlist, [entries[5].id, entries[0].id], after=entries[1].id)
+        self.assertEqual(self.order(), [v[1].id, v[5].id, v[0].id, v[2].id, v[3].id, v[4].id])
+        moved = {pk for pk, position in PlaylistContent.objects.values_list('pk', 'position') if positions[pk] != position}
+        self.assertEqual(moved, {entries[5].id, entries[0].id})
+
+        playlists.move(self.playlist, [entries[2].id], after=None)
+        playlists.move(self.playlist, [entries[1].id], after=playlists.END)
+        self.assertEqual(self.order(), [v[2].id, v[5].id, v[0].id, v[3].id, v[4].id, v[1].id])
+
+        with self.assertRaises(playlists.PlaylistError):
+            playlists.move(self.playlist, [entries[1].id], after=entries[1].id)
+
+    def test_renumbered_when_a_gap_is_exhausted(self):
+        v = self.videos
+        first, second, third = self.add(v[:3])
+        # every move halves the gap after the first entry
+        for _ in range(20):
+            playlists.move(self.playlist, [third.id], after=first.id)
+            self.assertEqual(self.order(), [v[0].id, v[2].id, v[1].id])
+            playlists.move(self.playlist, [second.id], after=first.id)
+            self.assertEqual(self.order(), [v[0].id, v[1].id, v[2].id])
+        self.add(v[3:], after=first.id)
+        self.assertEqual(self.order(), [v[0].id, v[3].id, v[4].id, v[5].id, v[1].id, v[2].id])
+
+
+class PlaylistAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", email="owner@b.com", password="password123")
+        cls.other = User.objects.create_user(username="other", email="other@b.com", password="password123")
+        cls.playlist = Playlist.objects.create(name="mine", created_by=cls.owner)
+        cls.videos = [Video.objects.create(duration="00:01:00") for _ in range(10)]
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+        self.entries_url = reverse('playlist_entries', args=[self.playlist.id])
+
+    def test_add_and_window(self):
+        response = self.client.post(self.entries_url, {
+            'content_type': 'video', 'content_ids': [str(video.id) for video in self.videos],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 10)
+
+        first = self.client.get(self.entries_url, {'page_size': 4}).data
+        self.assertEqual([entry['content_id'] for entry in first['results']], [str(video.id) for video in self.videos[:4]])
+        # entries removed before the cursor don't shift the next page
+        PlaylistContent.objects.filter(playlist=self.playlist, content_id__in=[video.id for video in self.videos[:2]]).delete()
+
+        # the playlist, the page of entries, their videos and the titles of the videos
+        with self.assertNumQueries(4):
+            page = self.client.get(replace_query_param(first['next'], 'page_size', 3)).data
+        self.assertEqual([entry['content_id'] for entry in page['results']], [str(video.id) for video in self.videos[4:7]])
+        last = self.client.get(page['next']).data
+        self.assertEqual([entry['content_id'] for entry in last['results']], [str(video.id) for video in self.videos[7:]])
+        self.assertIsNone(last['next'])
+        self.assertEqual(self.client.get(self.entries_url, {'cursor': 'not a cursor'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.entries_url, {'content_type': 'video', 'content_ids': [str(uuid.uuid4())]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_mixed_playlist_renders_in_constant_queries(self):
+        playlist = Playlist.objects.create(name="mixed", created_by=self.owner)
+        videos = [Video(duration="00:01:00") for _ in range(100)]
+        podcasts = [Podcast(duration="00:30:00") for _ in range(100)]
+        Video.objects.bulk_create(videos)
+        Podcast.objects.bulk_create(podcasts)
+        ContentTitle.objects.create(title_text="First video", is_native=True, content_object=videos[0])
+        ContentTitle.objects.create(title_text="First podcast", is_native=True, content_object=podcasts[0])
+        PlaylistContent.objects.bulk_create([
+            PlaylistContent(playlist=playlist, content_object=content, position=i)
+            for i, content in enumerate(content for pair in zip(videos, podcasts) for content in pair)
+        ])
+        podcasts[1].delete()
+
+        url = reverse('playlist_entries', args=[playlist.id])
+        # the playlist, the entries, then the videos, the podcasts and the titles of each
+        with self.assertNumQueries(6):
+            results = self.client.get(url, {'page_size': 200}).data['results']
+        self.assertEqual(len(results), 199)
+        self.assertEqual(results[0]['content']['content_type'], 'video')
+        self.assertEqual(results[0]['content']['title'], "First video")
+        self.assertEqual(results[1]['content']['content_type'], 'podcast')
+        self.assertEqual(results[1]['content']['title'], "First podcast")
+        self.assertEqual(results[1]['content']['duration'], '00:30:00')
+        self.assertEqual([entry['content']['id'] for entry in results[:4:2]], [str(videos[0].id), str(videos[1].id)])
+
+    def test_move_and_remove(self):
+        entries = playlists.add(self.playlist, ContentType.objects.get_for_model(Video), [video.id for video in self.videos[:3]])
+        response = self.client.post(reverse('playlist_move', args=[self.playlist.id]), {
+            'entries': [entries[2].id], 'after': None,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.delete(reverse('playlist_entry', args=[self.playlist.id, entries[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        results = self.client.get(self.entries_url).data['results']
+        self.assertEqual([entry['id'] for entry in results], [entries[2].id, entries[1].id])
+
+    def test_access(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(self.entries_url).status_code, status.HTTP_404_NOT_FOUND)
+        Playlist.objects.filter(pk=self.playlist.pk).update(is_public=True)
+        self.assertEqual(self.client.get(self.entries_url).status_code, status.HTTP_200_OK)
+        response = self.client.post(self.entries_url, {'content_type': 'video', 'content_ids': [str(self.videos[0].id)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN output and planner settings are PostgreSQL specific")
+class ContentRelationIndexTest(TestCase):
+    """
+    Every ContentRelationModel lookup by content uses the (content_type, content_id) index instead of scanning the table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="indexuser", email="index@b.com", password="password123")
+        cls.video = Video.objects.create(duration="00:01:00")
+        cls.content_type = ContentType.objects.get_for_model(Video)
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            # the test tables are tiny, without this the planner rightly prefers a sequential scan
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_content_lookups_use_the_composite_index(self):
+        for model in (Comment, LikeDislike, PlaylistContent, ContentTitle, ContentPersonnelCast, ContentPersonnelProduce):
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.filter(content_type=self.content_type, content_id=self.video.id)
+                self.assertUsesIndex(queryset, f"{model._meta.model_name}_ct_idx")
+
+    def test_generic_relation_prefetch_uses_the_composite_index(self):
+        queryset = LikeDislike.objects.filter(content_type=self.content_type, content_id__in=[self.video.id, uuid.uuid4()])
+        self.assertUsesIndex(queryset, "likedislike_ct_idx")
+
+    def test_one_like_dislike_per_user_per_content(self):
+        LikeDislike.objects.create(is_like=True, posted_by=self.user, content_object=self.video)
+        with self.assertRaises(IntegrityError):
+            LikeDislike.objects.create(is_like=False, posted_by=self.user, content_object=self.video)
+
+
+class ContentGenericRelationTest(TestCase):
+    def test_prefetch_generic_relations(self):
+        user = User.objects.create_user(username="prefetchuser", email="prefetch@b.com", password="password123")
+        videos = [Video.objects.create(duration="00:01:00") for _ in range(3)]
+        for video in videos:
+            LikeDislike.objects.create(is_like=True, posted_by=user, content_object=video)
+            Comment.objects.create(text="Comment", posted_by=user, content_object=video)
+
+        with self.assertNumQueries(3):
+            videos = list(Video.objects.prefetch_related('likes_dislikes', 'comments'))
+            self.assertEqual([len(video.likes_dislikes.all()) for video in videos], [1, 1, 1])
+            self.assertEqual([len(video.comments.all()) for video in videos], [1, 1, 1])
+
+
+@override_settings(ACTIVITY_FEED={'ASYNC': False, 'FANOUT_THRESHOLD': 2})
+class ActivityFeedTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", email="alice@b.com", password="password123")
+        cls.bob = User.objects.create_user(username="bob", email="bob@b.com", password="password123")
+        cls.carol = User.objects.create_user(username="carol", email="carol@b.com", password="password123")
+        cls.videos = [Video.objects.create(duration="00:01:00") for _ in range(5)]
+        for user in (cls.bob, cls.carol):
+            Friendship.objects.create(requested_by_user=cls.alice, sent_to_user=user, status=Friendship.Status.ACCEPTED)
+
+    def setUp(self):
+        get_graph_cache().clear()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse('activity_feed')
+
+    def test_activities_are_fanned_out_to_the_friends(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            like = LikeDislike.objects.create(is_like=True, posted_by=self.bob, content_object=self.videos[0])
+            LikeDislike.objects.create(is_like=False, posted_by=self.bob, content_object=self.videos[1])
+            Comment.objects.create(text="Nice", posted_by=self.carol, content_object=self.videos[2])
+
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.alice).count(), 2)
+        # the timeline, alice's friends, their activities that are not fanned out, the activities, the videos and their titles
+        with self.assertNumQueries(6):
+            feed = self.client.get(self.url).data
+        self.assertEqual([item['verb'] for item in feed['results']], ['COMMENTED', 'LIKED'])
+        self.assertEqual(feed['results'][0]['comment']['text'], "Nice")
+        self.assertEqual(feed['results'][1]['actor'], 'bob')
+        self.assertEqual(feed['results'][1]['content']['id'], str(self.videos[0].id))
+        self.assertIsNone(feed['next'])
+
+        # gone with the like
+        like.delete()
+        self.assertEqual(len(self.client.get(self.url).data['results']), 1)
+
+    def test_public_playlist_additions(self):
+        public = Playlist.objects.create(name="public", created_by=self.bob, is_public=True)
+        private = Playlist.objects.create(name="private", created_by=self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            playlists.add(public, ContentType.objects.get_for_model(Video), [self.videos[0].id, self.videos[1].id])
+            playlists.add(private, ContentType.objects.get_for_model(Video), [self.videos[2].id])
+        results = self.client.get(self.url).data['results']
+        self.assertEqual([item['verb'] for item in results], ['PLAYLIST_ADDED'] * 2)
+        self.assertEqual(results[0]['playlist']['name'], "public")
+
+    def test_users_with_many_friends_are_read_on_fan_out(self):
+        # alice has more than FANOUT_THRESHOLD friends once dave is one of them
+        dave = User.objects.create_user(username="dave", email="dave@b.com", password="password123")
+        Friendship.objects.create(requested_by_user=self.alice, sent_to_user=dave, status=Friendship.Status.ACCEPTED)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(text="Hi", posted_by=self.alice, content_object=self.videos[0])
+            LikeDislike.objects.create(is_like=True, posted_by=dave, content_object=self.videos[1])
+        self.assertFalse(Activity.objects.get(actor=self.alice).fanned_out)
+        self.assertFalse(TimelineEntry.objects.filter(activity__actor=self.alice).exists())
+
+        self.client.force_authenticate(self.bob)
+        results = self.client.get(self.url).data['results']
+        self.assertEqual([(item['actor'], item['verb']) for item in results], [('alice', 'COMMENTED')])
+        self.client.force_authenticate(self.alice)
+        results = self.client.get(self.url).data['results']
+        self.assertEqual([(item['actor'], item['verb']) for item in results], [('dave', 'LIKED')])
+
+    def test_cursor_pagination(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for video in self.videos:
+                LikeDislike.objects.create(is_like=True, posted_by=self.bob, content_object=video)
+        seen = []
+        response = self.client.get(self.url, {'page_size': 2})
+        while True:
+            seen += [item['content']['id'] for item in response.data['results']]
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [str(video.id) for video in reversed(self.videos)])
+
+        response = self.client.get(self.url, {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unfriending_removes_the_activities(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(text="Hi", posted_by=self.alice, content_object=self.videos[0])
+            Comment.objects.create(text="Hi", posted_by=self.bob, content_object=self.videos[0])
+        Friendship.objects.filter(requested_by_user=self.alice, sent_to_user=self.bob).delete()
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.alice, activity__actor=self.bob).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.bob).exists())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.carol).exists())
+
+    def test_trim_timelines(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for video in self.videos:
+                LikeDislike.objects.create(is_like=True, posted_by=self.bob, content_object=video)
+        self.assertEqual(activity.trim_timelines(max_length=3, batch_size=1), 2)
+        newest = TimelineEntry.objects.filter(owner=self.alice).order_by('-created_at').values_list('activity__content_id', flat=True)
+        self.assertEqual(list(newest), [video.id for video in reversed(self.videos[2:])])
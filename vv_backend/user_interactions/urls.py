@@ -0,0 +1,20 @@
+from django.urls import path
+
+from user_interactions.views import RecordViewAPI, ViewCountStatsAPI
+from user_interactions.views import CommentThreadAPI, CommentRepliesAPI, CommentAPI
+from user_interactions.views import PlaylistListCreateAPI, PlaylistAPI, PlaylistEntriesAPI, PlaylistMoveAPI, PlaylistEntryAPI
+from user_interactions.views import FeedAPI
+
+urlpatterns = [
+    path('<str:content_type>/<uuid:content_id>/view/', RecordViewAPI.as_view(), name='record_view'),
+    path('<str:content_type>/<uuid:content_id>/comments/', CommentThreadAPI.as_view(), name='comment_thread'),
+    path('comments/<uuid:pk>/', CommentAPI.as_view(), name='comment_detail'),
+    path('comments/<uuid:pk>/replies/', CommentRepliesAPI.as_view(), name='comment_replies'),
+    path('playlists/', PlaylistListCreateAPI.as_view(), name='playlist_list'),
+    path('playlists/<uuid:pk>/', PlaylistAPI.as_view(), name='playlist_detail'),
+    path('playlists/<uuid:pk>/entries/', PlaylistEntriesAPI.as_view(), name='playlist_entries'),
+    path('playlists/<uuid:pk>/entries/move/', PlaylistMoveAPI.as_view(), name='playlist_move'),
+    path('playlists/<uuid:pk>/entries/<int:entry_pk>/', PlaylistEntryAPI.as_view(), name='playlist_entry'),
+    path('feed/', FeedAPI.as_view(), name='activity_feed'),
+    path('view-stats/', ViewCountStatsAPI.as_view(), name='view_count_stats'),
+]
@@ -0,0 +1,189 @@
+"""
+Buffered ingestion of play events into BaseContentModel.view_count.
+
+Doing "view_count += 1; save()" on every play would rewrite the content row once per view.
+Instead, play events are coalesced in memory per (content_type_id, content_id) and flushed periodically
+(or as soon as MAX_PENDING content rows are waiting) as batched "UPDATE ... SET view_count = view_count + n" statements.
+Repeat views by the same viewer (user/session/IP) within DEDUP_WINDOW seconds are only counted once.
+
+The buffer is per process, so each web worker flushes its own pending counts.
+Pending counts that haven't been flushed yet are lost if the process is killed (they are flushed on a normal exit).
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+from user_interactions.counters import update_many_content_counters
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    def __init__(self, flush_interval=5, max_pending=1000, dedup_window=60 * 30, dedup_max_entries=100_000):
+        # flush_interval=None disables the background flusher, flush() has to be called manually then
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dedup_window = dedup_window
+        self.dedup_max_entries = dedup_max_entries
+
+        self._lock = threading.Lock()
+        # (content_type_id, content_id) -> number of views not written to the DB yet
+        self._pending = {}
+        # (viewer_key, content_type_id, content_id) -> time the view was counted, oldest first
+        self._recent_views = OrderedDict()
+        # only one flush at a time, so a failed flush can safely put its counts back
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stop_event = threading.Event()
+
+        # metrics
+        self._views_received = 0
+        self._views_deduplicated = 0
+        self._views_flushed = 0
+        self._flush_count = 0
+        self._flush_errors = 0
+        self._last_flush_seconds = None
+        self._max_flush_seconds = 0.0
+
+    def record_view(self, content_type_id, content_id, viewer_key=None):
+        """
+        Record one play event. Returns False if it was dropped as a repeat view of the same viewer.
+        """
+        key = (content_type_id, content_id)
+        now = time.monotonic()
+        with self._lock:
+            self._views_received += 1
+            if viewer_key is not None and self._is_repeat_view((viewer_key, *key), now):
+                self._views_deduplicated += 1
+                return False
+            self._pending[key] = self._pending.get(key, 0) + 1
+            should_flush = len(self._pending) >= self.max_pending
+
+        self._ensure_flusher()
+        if should_flush:
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged, the counts stay pending and a failed write must not fail the play event
+        return True
+
+    def _is_repeat_view(self, view_key, now):
+        # drop expired entries (and the oldest ones if we are over the size limit), the dict is ordered by insertion time
+        while self._recent_views:
+            oldest_key, counted_at = next(iter(self._recent_views.items()))
+            if now - counted_at < self.dedup_window and len(self._recent_views) < self.dedup_max_entries:
+                break
+            del self._recent_views[oldest_key]
+
+        if view_key in self._recent_views:
+            return True
+        self._recent_views[view_key] = now
+        return False
+
+    def flush(self):
+        """
+        Write all pending counts to the DB. Returns the number of content rows updated.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            # Group rows that got the same number of views, one UPDATE per (content type, n) instead of one per content.
+            # Most rows get a handful of views between two flushes, so this collapses into a few statements.
+            batches = {}
+            for (content_type_id, content_id), count in pending.items():
+                batches.setdefault((content_type_id, count), []).append(content_id)
+
+            start = time.perf_counter()
+            updated = 0
+            try:
+                with transaction.atomic():
+                    for (content_type_id, count), content_ids in batches.items():
+                        updated += update_many_content_counters(content_type_id, content_ids, view_count=count)
+            except Exception:
+                # keep the counts, they will be retried on the next flush
+                with self._lock:
+                    for key, count in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + count
+                    self._flush_errors += 1
+                logger.exception("Failed to flush %d pending view counts", len(pending))
+                raise
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._views_flushed += sum(pending.values())
+                self._flush_count += 1
+                self._last_flush_seconds = elapsed
+                self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+            return updated
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffer_depth': len(self._pending),
+                'pending_views': sum(self._pending.values()),
+                'dedup_entries': len(self._recent_views),
+                'views_received': self._views_received,
+                'views_deduplicated': self._views_deduplicated,
+                'views_flushed': self._views_flushed,
+                'flush_count': self._flush_count,
+                'flush_errors': self._flush_errors,
+                'last_flush_seconds': self._last_flush_seconds,
+                'max_flush_seconds': self._max_flush_seconds,
+            }
+
+    def _ensure_flusher(self):
+        if not self.flush_interval or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name='view-count-flusher', daemon=True)
+            self._flusher.start()
+        atexit.register(self.stop)
+
+    def _run_flusher(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged, the counts stay pending
+            finally:
+                # this thread has its own DB connection, don't keep it open between flushes
+                connections.close_all()
+
+    def stop(self):
+        """
+        Stop the background flusher and write whatever is still pending.
+        """
+        self._stop_event.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self._stop_event.clear()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+def _buffer_from_settings():
+    options = getattr(settings, 'VIEW_COUNT_BUFFER', {})
+    return ViewCountBuffer(
+        flush_interval=options.get('FLUSH_INTERVAL', 5),
+        max_pending=options.get('MAX_PENDING', 1000),
+        dedup_window=options.get('DEDUP_WINDOW', 60 * 30),
+        dedup_max_entries=options.get('DEDUP_MAX_ENTRIES', 100_000),
+    )
+
+
+# The process-wide buffer used by the views
+view_count_buffer = _buffer_from_settings()
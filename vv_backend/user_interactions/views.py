@@ -1,3 +1,247 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404
 
-# Create your views here.
+from rest_framework import generics, permissions, response, status
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from user_interactions import activity, playlists, view_counts
+from content.serializers import ContentCardSerializer
+from user_interactions.generic import prefetch_content_objects, resolve_content_type
+from user_interactions.models import Activity, Comment, Playlist
+from user_interactions.pagination import CommentThreadPagination, CommentReplyPagination
+from user_interactions.serializers import ActivitySerializer, CommentSerializer
+from user_interactions.serializers import PlaylistSerializer, PlaylistEntrySerializer, PlaylistItemSerializer
+from user_interactions.serializers import PlaylistAddSerializer, PlaylistMoveSerializer
+
+
+# Content.View API (play events)
+class RecordViewAPI(APIView):
+    """
+    Count a play of a video/podcast. The view is buffered and written to view_count in batches (see user_interactions/view_counts.py),
+    so this doesn't query the content at all; views of a non-existing content are simply dropped on flush.
+    """
+    permission_classes = (permissions.AllowAny, )
+
+    def post(self, request, content_type, content_id):
+        content_type = resolve_content_type(content_type)
+        if content_type is None:
+            return response.Response({"detail": "Unknown content type."}, status=status.HTTP_404_NOT_FOUND)
+
+        counted = view_counts.view_count_buffer.record_view(content_type.id, content_id, viewer_key=self.get_viewer_key(request))
+        return response.Response({"counted": counted}, status=status.HTTP_202_ACCEPTED)
+
+    def get_viewer_key(self, request):
+        # Repeat views are de-duplicated per logged-in user, else per server-side session, else per IP.
+        # Nothing the client sends is used, a new value on every request would get every view counted.
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        if request.session.session_key:
+            return f"session:{request.session.session_key}"
+        return f"ip:{request.META.get('REMOTE_ADDR')}"
+
+
+# Content.View API (buffer metrics, admins only)
+class ViewCountStatsAPI(APIView):
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return response.Response(view_counts.view_count_buffer.stats(), status=status.HTTP_200_OK)
+
+
+# Content.Comment API (List top level comments, Create)
+class CommentThreadAPI(generics.ListCreateAPIView):
+    """
+    Top level comments of a video/podcast, newest first and cursor paginated, each with its reply_count.
+    POST creates a comment, or a reply when "parent" is given.
+    """
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
+    serializer_class = CommentSerializer
+    pagination_class = CommentThreadPagination
+
+    def get_content(self):
+        content_type = resolve_content_type(self.kwargs['content_type'])
+        if content_type is None:
+            raise NotFound("Unknown content type.")
+        return {'content_type': content_type, 'content_id': self.kwargs['content_id']}
+
+    def get_queryset(self):
+        content = self.get_content()
+        return Comment.objects.filter(
+            content_type=content['content_type'],
+            content_id=content['content_id'],
+            parent__isnull=True,
+        ).select_related('posted_by')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['content'] = self.get_content()
+        return context
+
+    def perform_create(self, serializer):
+        content = self.get_content()
+        if not content['content_type'].model_class().objects.filter(pk=content['content_id']).exists():
+            raise NotFound("Content not found.")
+        serializer.save(posted_by=self.request.user, **content)
+
+
+# Content.Comment API (List replies)
+class CommentRepliesAPI(generics.ListAPIView):
+    permission_classes = (permissions.AllowAny, )
+    serializer_class = CommentSerializer
+    pagination_class = CommentReplyPagination
+
+    def get_queryset(self):
+        return Comment.objects.filter(parent_id=self.kwargs['pk']).select_related('posted_by')
+
+
+# Content.Comment API (Delete)
+class CommentAPI(generics.DestroyAPIView):
+    permission_classes = (permissions.IsAuthenticated, )
+    queryset = Comment.objects.all()
+
+    def perform_destroy(self, instance):
+        if instance.posted_by_id != self.request.user.pk:
+            raise PermissionDenied("You can only delete your own comments.")
+        instance.delete()
+
+
+# Playlist API (List own playlists, Create)
+class PlaylistListCreateAPI(generics.ListCreateAPIView):
+    permission_classes = (permissions.IsAuthenticated, )
+    serializer_class = PlaylistSerializer
+
+    def get_queryset(self):
+        return Playlist.objects.filter(created_by=self.request.user).select_related('created_by').order_by('-created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class PlaylistAccessMixin:
+    """
+    Public playlists can be read by everyone, private ones only by their owner (404 for the others).
+    Only the owner can change a playlist.
+    """
+
+    def get_playlist(self, write=False):
+        playlist = get_object_or_404(Playlist.objects.select_related('created_by'), pk=self.kwargs['pk'])
+        if playlist.created_by_id != self.request.user.pk:
+            if not playlist.is_public:
+                raise NotFound()
+            if write:
+                raise PermissionDenied("You can only change your own playlists.")
+        return playlist
+
+
+# Playlist API (Retrieve, Update, Delete)
+class PlaylistAPI(PlaylistAccessMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
+    serializer_class = PlaylistSerializer
+
+    def get_object(self):
+        return self.get_playlist(write=self.request.method not in permissions.SAFE_METHODS)
+
+
+# Playlist API (List entries in order, Add contents)
+class PlaylistEntriesAPI(PlaylistAccessMixin, APIView):
+    """
+    GET: the entries in playlist order with their content as a card, ?cursor= is the "next" of the previous page and
+    ?page_size= the number of entries, read on the (playlist, position) index in one query (see playlists.read_entries()).
+    The contents are then loaded with one query per content type (plus their titles), whatever the number of entries.
+    There is no total count, "next" is null on the last page.
+    POST: add contents, see PlaylistAddSerializer.
+    """
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
+
+    def get(self, request, pk):
+        playlist = self.get_playlist()
+        options = getattr(settings, 'PLAYLIST_PAGINATION', {})
+        try:
+            page_size = int(request.query_params.get('page_size', options.get('PAGE_SIZE', 50)))
+        except ValueError:
+            raise ValidationError({'page_size': "A valid integer is required."})
+        page_size = max(1, min(page_size, options.get('MAX_PAGE_SIZE', 200)))
+        try:
+            entries, cursor = playlists.read_entries(playlist, cursor=request.query_params.get('cursor'), limit=page_size)
+        except ValueError:
+            raise ValidationError({'cursor': "Invalid cursor."})
+        prefetch_content_objects(entries, ContentCardSerializer.card_queryset)
+        return response.Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor', cursor) if cursor else None,
+            'results': PlaylistItemSerializer(entries, many=True).data,
+        })
+
+    def post(self, request, pk):
+        playlist = self.get_playlist(write=True)
+        serializer = PlaylistAddSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        content_type = resolve_content_type(data['content_type'])
+        found = set(content_type.model_class().objects.filter(pk__in=data['content_ids']).values_list('pk', flat=True))
+        missing = [str(content_id) for content_id in data['content_ids'] if content_id not in found]
+        if missing:
+            raise NotFound(f"Content not found: {', '.join(missing)}")
+        try:
+            entries = playlists.add(playlist, content_type, data['content_ids'], after=data.get('after', playlists.END))
+        except playlists.PlaylistError as error:
+            raise ValidationError({'after': str(error)})
+        return response.Response(PlaylistEntrySerializer(entries, many=True).data, status=status.HTTP_201_CREATED)
+
+
+# Playlist API (Move/reorder entries)
+class PlaylistMoveAPI(PlaylistAccessMixin, APIView):
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def post(self, request, pk):
+        playlist = self.get_playlist(write=True)
+        serializer = PlaylistMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            playlists.move(playlist, data['entries'], after=data.get('after', playlists.END))
+        except playlists.PlaylistError as error:
+            raise ValidationError({'detail': str(error)})
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Playlist API (Remove an entry)
+class PlaylistEntryAPI(PlaylistAccessMixin, APIView):
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def delete(self, request, pk, entry_pk):
+        playlist = self.get_playlist(write=True)
+        if not playlists.remove(playlist, [entry_pk]):
+            raise NotFound()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Activity feed API (what the friends liked, commented on or added to their public playlists)
+class FeedAPI(APIView):
+    """
+    Newest first, ?cursor= is the "next" of the previous page and ?page_size= the number of activities (see
+    user_interactions/activity.py). The activities of the page and their actor, comment and playlist are loaded in one
+    query, the contents with one query per content type.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def get(self, request):
+        options = getattr(settings, 'ACTIVITY_FEED', {})
+        try:
+            page_size = int(request.query_params.get('page_size', options.get('PAGE_SIZE', 20)))
+        except ValueError:
+            raise ValidationError({'page_size': "A valid integer is required."})
+        page_size = max(1, min(page_size, options.get('MAX_PAGE_SIZE', 100)))
+        try:
+            activities, cursor = activity.read_feed(
+                request.user, cursor=request.query_params.get('cursor'), limit=page_size,
+                queryset=Activity.objects.select_related('actor', 'comment', 'playlist_entry__playlist'),
+            )
+        except ValueError:
+            raise ValidationError({'cursor': "Invalid cursor."})
+        prefetch_content_objects(activities, ContentCardSerializer.card_queryset)
+        return response.Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor', cursor) if cursor else None,
+            'results': ActivitySerializer(activities, many=True).data,
+        })
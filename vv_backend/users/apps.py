@@ -5,4 +5,9 @@ class UsersConfig(AppConfig):
     name = 'users'
 
     def ready(self):
-        import users.signals
\ No newline at end of file
+        import users.signals
+
+        from django.conf import settings
+        if getattr(settings, 'EXPIRED_TOKEN_SWEEPER', {}).get('RUN_IN_PROCESS'):
+            from users.sweeper import sweeper_from_settings
+            sweeper_from_settings().start()
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""
+Knox token authentication with a process-local cache of the verified tokens.
+
+knox.auth.TokenAuthentication costs, on every authenticated request: a query for the AuthToken rows of the token prefix,
+a query for the user, a query for the other tokens of the user (to delete the expired ones) and, with AUTO_REFRESH,
+an UPDATE of the expiry. CachedTokenAuthentication verifies a token against the DB once, then keeps (digest -> token + user)
+in memory:
+- bounded (least recently used entries are evicted past MAX_ENTRIES) and every entry expires after TTL seconds,
+  which must stay much shorter than knox's TOKEN_TTL. An entry is never used past the expiry of its token.
+- invalidated in this process when the token is deleted (LogoutAPI, LogoutAllAPI, expiry cleanup) or the user is saved
+  (DisableAPI, profile updates), by the signals in users/signals.py. Other processes see it when their entry expires.
+- expiry refreshes (AUTO_REFRESH) are coalesced: at most one UPDATE per token every MIN_REFRESH_INTERVAL seconds per process,
+  the cached expiry is moved forward with it so concurrent requests don't write it again.
+The cached token and user are copied for every request, so a view changing request.user doesn't change the cache.
+
+Sample usage (settings.py):
+
+    REST_FRAMEWORK = {
+        'DEFAULT_AUTHENTICATION_CLASSES': ('users.auth.CachedTokenAuthentication', ),
+    }
+"""
+
+import binascii
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.settings import knox_settings
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class TokenCache:
+    def __init__(self, ttl=60, max_entries=10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        # digest -> (expires at, AuthToken with its user loaded), least recently used first
+        self._tokens = OrderedDict()
+        # user pk -> digests of its cached tokens, to invalidate all the tokens of a user
+        self._digests_by_user = {}
+
+        # metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._refresh_writes = 0
+
+    def get(self, digest):
+        """
+        A copy of the cached AuthToken (and of its user) for this digest, None when it isn't cached or has expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._tokens.get(digest)
+            if entry is None or entry[0] <= now:
+                self._misses += 1
+                return None
+            self._tokens.move_to_end(digest)
+            self._hits += 1
+            auth_token = copy.copy(entry[1])
+        auth_token.user = copy.copy(auth_token.user)
+        return auth_token
+
+    def set(self, auth_token):
+        with self._lock:
+            self._tokens[auth_token.digest] = (time.monotonic() + self.ttl, auth_token)
+            self._tokens.move_to_end(auth_token.digest)
+            self._digests_by_user.setdefault(auth_token.user_id, set()).add(auth_token.digest)
+            while len(self._tokens) > self.max_entries:
+                digest, (_, evicted) = self._tokens.popitem(last=False)
+                self._forget_digest(evicted.user_id, digest)
+                self._evictions += 1
+
+    def claim_refresh(self, digest, new_expiry, min_interval):
+        """
+        Whether the caller should write new_expiry to the DB: only if the expiry known here is more than min_interval
+        seconds older. The cached expiry is moved forward right away, so concurrent requests don't write it too.
+        """
+        with self._lock:
+            entry = self._tokens.get(digest)
+            if entry is None:
+                return True
+            auth_token = entry[1]
+            if (new_expiry - auth_token.expiry).total_seconds() <= min_interval:
+                return False
+            auth_token.expiry = new_expiry
+            self._refresh_writes += 1
+            return True
+
+    def invalidate_token(self, digest):
+        with self._lock:
+            entry = self._tokens.pop(digest, None)
+            if entry is not None:
+                self._forget_digest(entry[1].user_id, digest)
+                self._invalidations += 1
+
+    def invalidate_user(self, user_pk):
+        with self._lock:
+            for digest in self._digests_by_user.pop(user_pk, ()):
+                if self._tokens.pop(digest, None) is not None:
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._digests_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._tokens),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'refresh_writes': self._refresh_writes,
+                'hit_rate': self._hits / lookups if lookups else None,
+            }
+
+    def _forget_digest(self, user_pk, digest):
+        digests = self._digests_by_user.get(user_pk)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests_by_user[user_pk]
+
+
+def _options():
+    options = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+    return {
+        'enabled': options.get('ENABLED', True),
+        'ttl': options.get('TTL', 60),
+        'max_entries': options.get('MAX_ENTRIES', 10_000),
+    }
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _token_cache
+    if _token_cache is None:
+        options = _options()
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = TokenCache(ttl=options['ttl'], max_entries=options['max_entries'])
+    return _token_cache
+
+
+@receiver(setting_changed)
+def _reset_token_cache(setting, **kwargs):
+    global _token_cache
+    if setting == 'TOKEN_AUTH_CACHE':
+        _token_cache = None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement of knox.auth.TokenAuthentication, see the module docstring.
+    """
+
+    def authenticate_credentials(self, token):
+        if not _options()['enabled']:
+            return super().authenticate_credentials(token)
+
+        try:
+            digest = hash_token(token.decode('utf-8'))
+        except (TypeError, UnicodeDecodeError, binascii.Error):
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        cache = get_token_cache()
+        auth_token = cache.get(digest)
+        if auth_token is not None:
+            if auth_token.expiry is None or auth_token.expiry > timezone.now():
+                if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                    self.renew_token(auth_token)
+                return self.validate_user(auth_token)
+            # expired, let knox delete it
+            cache.invalidate_token(digest)
+
+        user, auth_token = super().authenticate_credentials(token)
+        cache.set(auth_token)
+        return user, auth_token
+
+    def renew_token(self, auth_token):
+        new_expiry = timezone.now() + knox_settings.TOKEN_TTL
+        current_expiry = auth_token.expiry
+        auth_token.expiry = new_expiry
+        if (new_expiry - current_expiry).total_seconds() <= knox_settings.MIN_REFRESH_INTERVAL:
+            return
+        if not _options()['enabled'] or get_token_cache().claim_refresh(auth_token.digest, new_expiry, knox_settings.MIN_REFRESH_INTERVAL):
+            # a plain UPDATE, like knox's save(update_fields=('expiry',)) but without the signals
+            type(auth_token).objects.filter(digest=auth_token.digest).update(expiry=new_expiry)
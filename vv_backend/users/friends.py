@@ -0,0 +1,277 @@
+"""
+Friendship transitions and friend graph queries.
+
+A Friendship row stands for an unordered pair of users (unique on (least, greatest) of the two ids), whoever asked
+first. Requests go PENDING -> ACCEPTED/REJECTED with conditional UPDATEs, so concurrent accepts/rejects of the same
+request can't both apply. A request to someone who already asked us accepts their request.
+
+The graph queries work on the friend ids (the adjacency set) of users: friends are read from the two
+(user, status) indexes, one side per index. FriendGraphCache keeps the adjacency sets in memory per process:
+- bounded (least recently used users are evicted past MAX_USERS) and every entry expires after TTL seconds,
+- invalidated in this process for both users of a friendship when it changes (signals in users/signals.py and the
+  transitions below); other processes see the change when their entry expires.
+Mutual friends are then a set intersection and friend-of-friend suggestions count the friends of (at most
+SUGGESTION_FANOUT of) our friends, loaded in one query for those not cached.
+
+Sample usage:
+
+    send_request(alice, bob, message="Hi!")
+    accept_request(friendship, bob)
+    friend_ids(alice.pk)                    # frozenset({bob.pk, ...})
+    mutual_friend_ids(alice.pk, carol.pk)
+    suggest_friends(alice.pk, limit=10)     # [(user pk, number of mutual friends), ...] most mutual friends first
+"""
+
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Friendship
+
+
+class FriendshipError(ValueError):
+    """
+    A transition that doesn't apply to this friendship, the message is meant for the client.
+    """
+
+
+class FriendGraphCache:
+    def __init__(self, ttl=5 * 60, max_users=100_000):
+        self.ttl = ttl
+        self.max_users = max_users
+
+        self._lock = threading.Lock()
+        # user pk -> (expires at, frozenset of friend pks), least recently used first
+        self._friends = OrderedDict()
+        # bumped by every invalidation, a set loaded from the DB before an invalidation is not cached
+        self.generation = 0
+
+        # metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, user_pk):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._friends.get(user_pk)
+            if entry is None or entry[0] <= now:
+                self._misses += 1
+                return None
+            self._friends.move_to_end(user_pk)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, user_pk, friends, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._friends[user_pk] = (time.monotonic() + self.ttl, friends)
+            self._friends.move_to_end(user_pk)
+            while len(self._friends) > self.max_users:
+                self._friends.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *user_pks):
+        with self._lock:
+            self.generation += 1
+            for user_pk in user_pks:
+                self._friends.pop(user_pk, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._friends.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'users': len(self._friends),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / lookups if lookups else None,
+            }
+
+
+def _options():
+    options = getattr(settings, 'FRIEND_GRAPH', {})
+    return {
+        'cache_enabled': options.get('CACHE_ENABLED', True),
+        'cache_ttl': options.get('CACHE_TTL', 5 * 60),
+        'cache_max_users': options.get('CACHE_MAX_USERS', 100_000),
+        'suggestion_fanout': options.get('SUGGESTION_FANOUT', 200),
+    }
+
+
+_graph_cache = None
+_graph_cache_lock = threading.Lock()
+
+
+def get_graph_cache():
+    global _graph_cache
+    if _graph_cache is None:
+        options = _options()
+        with _graph_cache_lock:
+            if _graph_cache is None:
+                _graph_cache = FriendGraphCache(ttl=options['cache_ttl'], max_users=options['cache_max_users'])
+    return _graph_cache
+
+
+@receiver(setting_changed)
+def _reset_graph_cache(setting, **kwargs):
+    global _graph_cache
+    if setting == 'FRIEND_GRAPH':
+        _graph_cache = None
+
+
+def invalidate_friendship(friendship):
+    """
+    Drop the cached friends of both users, now and again once the transaction commits (a concurrent reader could
+    have cached the state before the commit meanwhile).
+    """
+    user_pks = (friendship.requested_by_user_id, friendship.sent_to_user_id)
+    get_graph_cache().invalidate(*user_pks)
+    transaction.on_commit(lambda: get_graph_cache().invalidate(*user_pks))
+
+
+# Graph queries
+
+def friend_ids_many(user_pks):
+    """
+    {user pk: frozenset of the pks of their friends}, one query for all the users whose friends aren't cached.
+    """
+    use_cache = _options()['cache_enabled']
+    cache = get_graph_cache()
+    result = {}
+    missing = []
+    for user_pk in dict.fromkeys(user_pks):
+        friends = cache.get(user_pk) if use_cache else None
+        if friends is None:
+            missing.append(user_pk)
+        else:
+            result[user_pk] = friends
+    if not missing:
+        return result
+
+    generation = cache.generation
+    loaded = {user_pk: set() for user_pk in missing}
+    edges = Friendship.objects.filter(
+        Q(requested_by_user__in=missing) | Q(sent_to_user__in=missing), status=Friendship.Status.ACCEPTED,
+    ).values_list('requested_by_user', 'sent_to_user')
+    for requested_by, sent_to in edges:
+        if requested_by in loaded:
+            loaded[requested_by].add(sent_to)
+        if sent_to in loaded:
+            loaded[sent_to].add(requested_by)
+    for user_pk, friends in loaded.items():
+        result[user_pk] = frozenset(friends)
+        if use_cache:
+            cache.set(user_pk, result[user_pk], generation)
+    return result
+
+
+def friend_ids(user_pk):
+    return friend_ids_many([user_pk])[user_pk]
+
+
+def mutual_friend_ids(user_pk, other_pk):
+    friends = friend_ids_many([user_pk, other_pk])
+    return friends[user_pk] & friends[other_pk]
+
+
+def suggest_friends(user_pk, limit=20):
+    """
+    Friends of friends who aren't friends yet (and with no pending or rejected request either way), most mutual
+    friends first: [(user pk, number of mutual friends), ...].
+    """
+    friends = friend_ids(user_pk)
+    pending = Friendship.objects.filter(
+        Q(requested_by_user=user_pk) | Q(sent_to_user=user_pk), status__in=[Friendship.Status.PENDING, Friendship.Status.REJECTED],
+    ).values_list('requested_by_user', 'sent_to_user')
+    excluded = set(friends) | {user_pk} | {pk for pair in pending for pk in pair}
+
+    fanout = _options()['suggestion_fanout']
+    sampled = random.sample(sorted(friends), fanout) if len(friends) > fanout else friends
+    mutual_counts = Counter()
+    for friends_of_friend in friend_ids_many(sampled).values():
+        mutual_counts.update(friends_of_friend - excluded)
+    return sorted(mutual_counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+
+
+# Transitions
+
+def get_pair(user_pk, other_pk):
+    return Friendship.objects.filter(
+        Q(requested_by_user=user_pk, sent_to_user=other_pk) | Q(requested_by_user=other_pk, sent_to_user=user_pk)
+    ).first()
+
+
+def send_request(from_user, to_user, message=None):
+    """
+    Ask to_user to be friends, returns the friendship. If to_user already asked, their request is accepted instead.
+    """
+    if from_user.pk == to_user.pk:
+        raise FriendshipError("You can't befriend yourself.")
+    with transaction.atomic():
+        friendship = get_pair(from_user.pk, to_user.pk)
+        if friendship is None:
+            try:
+                with transaction.atomic():
+                    return Friendship.objects.create(requested_by_user=from_user, sent_to_user=to_user, message=message)
+            except IntegrityError:
+                # created concurrently by the other user
+                friendship = get_pair(from_user.pk, to_user.pk)
+
+        if friendship.status == Friendship.Status.ACCEPTED:
+            raise FriendshipError("You are already friends.")
+        if friendship.status == Friendship.Status.PENDING:
+            if friendship.sent_to_user_id == from_user.pk:
+                accept_request(friendship, from_user)
+            return friendship
+        # REJECTED: only the user who declined can start over
+        if friendship.requested_by_user_id == from_user.pk:
+            raise FriendshipError("Your friend request was declined.")
+        Friendship.objects.filter(pk=friendship.pk).update(
+            requested_by_user=from_user, sent_to_user=to_user, status=Friendship.Status.PENDING,
+            message=message, created_at=timezone.now(), friend_since=None,
+        )
+        friendship.refresh_from_db()
+        return friendship
+
+
+def accept_request(friendship, user):
+    if friendship.sent_to_user_id != user.pk:
+        raise FriendshipError("Only the recipient of a friend request can accept it.")
+    if not friendship.accept():
+        raise FriendshipError("This friend request is not pending anymore.")
+    invalidate_friendship(friendship)
+    return friendship
+
+
+def reject_request(friendship, user):
+    if friendship.sent_to_user_id != user.pk:
+        raise FriendshipError("Only the recipient of a friend request can reject it.")
+    if not friendship.reject():
+        raise FriendshipError("This friend request is not pending anymore.")
+    invalidate_friendship(friendship)
+    return friendship
+
+
+def remove_friendship(user, other_pk):
+    """
+    Unfriend, or cancel/delete a request between the two users. Returns whether there was one.
+    """
+    deleted, _ = Friendship.objects.filter(
+        Q(requested_by_user=user.pk, sent_to_user=other_pk) | Q(requested_by_user=other_pk, sent_to_user=user.pk)
+    ).delete()
+    return bool(deleted)
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from knox.models import AuthToken
+from rest_framework.test import APIRequestFactory
+
+from users.auth import get_token_cache
+from users.models import User
+from users.views import ProfileAPI
+
+BENCHMARK_EMAIL = 'bench-token-auth@example.com'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark authenticated requests/sec on the profile endpoint with knox's TokenAuthentication "
+        "vs the cached token authentication (users/auth.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per measurement.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=BENCHMARK_EMAIL).first()
+        if user is None:
+            user = User.objects.create_user(username='bench-token-auth', email=BENCHMARK_EMAIL, password='benchmark')
+        auth_token, token = AuthToken.objects.create(user)
+
+        view = ProfileAPI.as_view()
+        factory = APIRequestFactory()
+
+        def run():
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    response = view(factory.get('/user/profile/', HTTP_AUTHORIZATION=f'Token {token}'))
+                    response.render()
+                elapsed = time.perf_counter() - start
+            return options['requests'] / elapsed, len(captured) / options['requests']
+
+        try:
+            with override_settings(TOKEN_AUTH_CACHE={'ENABLED': False}):
+                uncached = run()
+            get_token_cache().clear()
+            cached = run()
+        finally:
+            auth_token.delete()
+
+        self.stdout.write(f"{'':>8} {'requests/sec':>14} {'queries/request':>16}")
+        self.stdout.write(f"{'knox':>8} {uncached[0]:>14.0f} {uncached[1]:>16.2f}")
+        self.stdout.write(f"{'cached':>8} {cached[0]:>14.0f} {cached[1]:>16.2f}")
+        self.stdout.write(f"Speedup: x{cached[0] / uncached[0]:.1f}, {get_token_cache().stats()}")
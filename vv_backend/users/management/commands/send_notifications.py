@@ -0,0 +1,36 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.notifications import worker_from_settings
+
+
+class Command(BaseCommand):
+    help = "Deliver the queued emails/ntfy pushes of the notification outbox (see users/notifications.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send everything that is due and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        worker = worker_from_settings()
+
+        if options['once']:
+            total = 0
+            try:
+                while True:
+                    delivered = worker.deliver_pending()
+                    total += delivered
+                    if delivered < worker.batch_size:
+                        break
+            finally:
+                worker.close()
+            self.stdout.write(f"Processed {total} notifications.")
+            return
+
+        # finish the current batch on Ctrl+C / SIGTERM instead of dying in the middle of it
+        signal.signal(signal.SIGINT, lambda *_: worker.stop())
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        self.stdout.write("Notification worker started.")
+        worker.run(poll_interval=getattr(settings, 'NOTIFICATION_OUTBOX', {}).get('POLL_INTERVAL', 2))
+        self.stdout.write("Notification worker stopped.")
@@ -0,0 +1,31 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from users.sweeper import sweeper_from_settings
+
+
+class Command(BaseCommand):
+    help = "Delete the expired email verifications, password resets and knox tokens (see users/sweeper.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Sweep every EXPIRED_TOKEN_SWEEPER['INTERVAL'] seconds instead of once.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows deleted per statement, defaults to EXPIRED_TOKEN_SWEEPER['BATCH_SIZE'].")
+
+    def handle(self, *args, **options):
+        sweeper = sweeper_from_settings()
+        if options['batch_size']:
+            sweeper.batch_size = options['batch_size']
+
+        if not options['loop']:
+            for label, count in sweeper.sweep().items():
+                self.stdout.write(f"{label}: {count} expired rows deleted")
+            self.stdout.write(f"Done in {sweeper.stats()['last_run_seconds']:.2f}s.")
+            return
+
+        # finish the current sweep on Ctrl+C / SIGTERM
+        signal.signal(signal.SIGINT, lambda *_: sweeper.stop())
+        signal.signal(signal.SIGTERM, lambda *_: sweeper.stop())
+        self.stdout.write("Expired token sweeper started.")
+        sweeper.run()
+        self.stdout.write(f"Expired token sweeper stopped: {sweeper.stats()}")
@@ -1,6 +1,8 @@
 import uuid
 
 from django.db import models
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 from django_countries.fields import CountryField
@@ -42,6 +44,8 @@ class User(AbstractUser):
     bio = models.TextField(blank=True)
     # TODO: Nishil: Move profile pictures to S3
     profile_picture = models.ImageField(null=True, blank=True, upload_to='assets/profile_pictures/')
+    # {size: {format: storage name}} of the resized copies of profile_picture, see users/profile_pictures.py
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # TODO: Should this be moved to a separate file, eg: common/...? will it take effect if we update the file and models are already migrated after?
     # Also take a look at this: https://github.com/jacksonllee/iso639
@@ -92,6 +96,12 @@ class EmailVerification(models.Model):
     cooldown = models.DurationField(default="0:30:00", blank=True, null=True)   # 30 minutes
     # is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # the expired token sweeper (users/sweeper.py) range scans it
+            models.Index(fields=['expires_at'], name='users_email_verif_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"User Email Verification: {self.user.email}"
 
@@ -111,6 +121,51 @@ class PasswordReset(models.Model):
     cooldown = models.DurationField(default="0:30:00", blank=True, null=True)   # 30 minutes
     # is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # the expired token sweeper (users/sweeper.py) range scans it
+            models.Index(fields=['expires_at'], name='users_pwd_reset_expiry_idx'),
+        ]
+
+
+class OutboundNotification(models.Model):
+    """
+    Outbox of emails/ntfy pushes to send, written in the same transaction as whatever triggered them (see users/signals.py)
+    and delivered in batches by the send_notifications worker (see users/notifications.py).
+    """
+
+    class Channel(models.TextChoices):
+        EMAIL = "email", "Email"
+        NTFY = "ntfy", "ntfy"
+    channel = models.CharField(max_length=10, choices=Channel.choices)
+
+    class Status(models.IntegerChoices):
+        PENDING = 0, "PENDING"
+        SENT = 1, "SENT"
+        FAILED = 2, "FAILED"    # gave up after max attempts
+        SENDING = 3, "SENDING"  # claimed by a worker until next_attempt_at
+    status = models.IntegerField(choices=Status.choices, default=Status.PENDING)
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list, blank=True)    # email addresses, unused for ntfy
+
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # the worker polls "status = PENDING AND next_attempt_at <= now ORDER BY next_attempt_at"
+            models.Index(fields=['status', 'next_attempt_at'], name='users_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} notification: {self.subject}"
+
 
 # TODO: Nishil: Add UserSettings Functionality
 # class UserSettings(models.Model):
@@ -118,9 +173,13 @@ class PasswordReset(models.Model):
 
 
 class Friendship(models.Model):
+    """
+    One row per pair of users, whoever asked first (see users/friends.py for the transitions and the graph queries).
+    """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    requested_by_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="requested_friendships")
-    sent_to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="receieved_friendships")
+    # no index of their own, the (user, status) indexes below start with them
+    requested_by_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="requested_friendships", db_index=False)
+    sent_to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="receieved_friendships", db_index=False)
 
     # Friendship status, default = PENDING
     class Status(models.IntegerChoices):
@@ -135,6 +194,40 @@ class Friendship(models.Model):
     message = models.TextField(null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    # not a field updated from request payload, but internal update when a friendship is accepted
-    # TODO write corresponding auto update function by creating functions like "Friendship.accept()"
+    # not a field updated from request payload, set by accept()
     friend_since = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # the friends (status = ACCEPTED) or pending requests of a user, from either side
+            models.Index(fields=['requested_by_user', 'status'], name='users_friend_from_status_idx'),
+            models.Index(fields=['sent_to_user', 'status'], name='users_friend_to_status_idx'),
+        ]
+        constraints = [
+            # one row per unordered pair: a request from B to A finds the one from A to B
+            models.UniqueConstraint(
+                Least('requested_by_user', 'sent_to_user'), Greatest('requested_by_user', 'sent_to_user'),
+                name='users_friendship_pair_unique',
+            ),
+            models.CheckConstraint(check=~models.Q(requested_by_user=models.F('sent_to_user')), name='users_friendship_not_self'),
+        ]
+
+    def accept(self):
+        """
+        PENDING -> ACCEPTED. A conditional UPDATE, so of two concurrent transitions only one applies.
+        Returns whether this call accepted it.
+        """
+        now = timezone.now()
+        updated = Friendship.objects.filter(pk=self.pk, status=self.Status.PENDING).update(status=self.Status.ACCEPTED, friend_since=now)
+        if updated:
+            self.status, self.friend_since = self.Status.ACCEPTED, now
+        return bool(updated)
+
+    def reject(self):
+        """
+        PENDING -> REJECTED. Returns whether this call rejected it.
+        """
+        updated = Friendship.objects.filter(pk=self.pk, status=self.Status.PENDING).update(status=self.Status.REJECTED)
+        if updated:
+            self.status = self.Status.REJECTED
+        return bool(updated)
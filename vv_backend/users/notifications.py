@@ -0,0 +1,207 @@
+"""
+Outbox for outbound notifications (verification/reset password emails, and the ntfy.sh pushes used for testing).
+
+Sending an email (SMTP) and posting to ntfy.sh inside post_save made registration/password reset requests as slow as
+the mail server and a third-party HTTP round-trip, and failed the request when either of them was down.
+Instead, the signals only write an OutboundNotification row (in the same transaction as the EmailVerification/PasswordReset),
+and the send_notifications worker drains the outbox in batches:
+- a batch is claimed first (marked SENDING for CLAIM_TIMEOUT seconds, committed), then sent outside of any transaction,
+  so no row stays locked while waiting on the mail server. A batch claimed by a worker that died is due again once its
+  claim times out.
+- emails go through one reused mail connection, one message at a time, and each is marked SENT as soon as it went out,
+  so a failure halfway through a batch never sends the earlier ones again
+- ntfy pushes go through one reused HTTP session (keep-alive)
+- failed notifications are retried with exponential backoff, and marked FAILED after MAX_ATTEMPTS
+
+Sample usage:
+
+    queue_email("Email Verification", message, [user.email])
+    python manage.py send_notifications            # worker, polls the outbox forever
+    python manage.py send_notifications --once     # send what is due and exit
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+import requests
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import OutboundNotification
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    return OutboundNotification.objects.create(
+        channel=OutboundNotification.Channel.EMAIL,
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+
+
+def queue_ntfy(title, message):
+    # ntfy.sh is only used to see the emails while developing, nothing to do without a topic
+    if not settings.NTFY_TOPIC:
+        return None
+    return OutboundNotification.objects.create(
+        channel=OutboundNotification.Channel.NTFY,
+        subject=title,
+        body=message,
+    )
+
+
+class NotificationWorker:
+    def __init__(self, batch_size=100, max_attempts=5, retry_backoff=30, max_retry_backoff=60 * 60, http_timeout=10,
+                 claim_timeout=10 * 60):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        # seconds before the first retry, doubled on every further attempt, up to max_retry_backoff
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.http_timeout = http_timeout
+        # seconds a claimed batch is left to this worker before others may send it
+        self.claim_timeout = claim_timeout
+
+        # both are kept open between batches
+        self._mail_connection = None
+        self._http = requests.Session()
+        self._stop_event = threading.Event()
+
+    def claim_batch(self):
+        """
+        Claim up to batch_size due notifications: they are marked SENDING until now + claim_timeout and the claim is
+        committed before anything is sent. Rows are selected with SKIP LOCKED, so concurrent workers claim different ones.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                OutboundNotification.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    status__in=[OutboundNotification.Status.PENDING, OutboundNotification.Status.SENDING],
+                    next_attempt_at__lte=now,
+                )
+                .order_by('next_attempt_at')[:self.batch_size]
+            )
+            if batch:
+                OutboundNotification.objects.filter(pk__in=[n.pk for n in batch]).update(
+                    status=OutboundNotification.Status.SENDING,
+                    next_attempt_at=now + timedelta(seconds=self.claim_timeout),
+                )
+        return batch
+
+    def deliver_pending(self):
+        """
+        Claim and send one batch of due notifications. Returns the number of notifications in the batch.
+        """
+        batch = self.claim_batch()
+        for notification in batch:
+            if notification.channel == OutboundNotification.Channel.EMAIL:
+                send = self._send_email
+            else:
+                send = self._send_push
+            try:
+                send(notification)
+            except Exception as e:
+                self._schedule_retry(notification, e)
+            else:
+                self._mark_sent(notification)
+        return len(batch)
+
+    def _send_email(self, notification):
+        message = EmailMessage(notification.subject, notification.body, notification.from_email, notification.recipients)
+        message.connection = self._get_mail_connection()
+        try:
+            message.send()
+        except Exception:
+            # the connection may be broken, a new one is opened for the next email
+            self._close_mail_connection()
+            raise
+
+    def _send_push(self, notification):
+        response = self._http.post(
+            f"https://ntfy.sh/{settings.NTFY_TOPIC}",
+            data=notification.body.encode("utf-8"),
+            headers={"Title": notification.subject},
+            timeout=self.http_timeout,
+        )
+        response.raise_for_status()
+
+    def _mark_sent(self, notification):
+        OutboundNotification.objects.filter(pk=notification.pk).update(
+            status=OutboundNotification.Status.SENT,
+            sent_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            last_error='',
+        )
+
+    def _schedule_retry(self, notification, error):
+        notification.attempts += 1
+        notification.last_error = repr(error)
+        notification.status = OutboundNotification.Status.PENDING
+        if notification.attempts >= self.max_attempts:
+            notification.status = OutboundNotification.Status.FAILED
+            logger.error("Giving up on notification %s after %d attempts: %r", notification.pk, notification.attempts, error)
+        else:
+            backoff = min(self.retry_backoff * 2 ** (notification.attempts - 1), self.max_retry_backoff)
+            notification.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+        notification.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    def _get_mail_connection(self):
+        if self._mail_connection is None:
+            self._mail_connection = get_connection(fail_silently=False)
+            # opened explicitly, so sending doesn't open and close a new SMTP connection per email
+            self._mail_connection.open()
+        return self._mail_connection
+
+    def _close_mail_connection(self):
+        if self._mail_connection is not None:
+            try:
+                self._mail_connection.close()
+            except Exception:
+                pass  # the connection is broken anyway, a new one is opened for the next send
+            self._mail_connection = None
+
+    def run(self, poll_interval=2):
+        """
+        Drain the outbox until stop() is called. Full batches are followed by the next one right away,
+        otherwise the worker waits poll_interval seconds before polling again.
+        """
+        while not self._stop_event.is_set():
+            try:
+                delivered = self.deliver_pending()
+            except Exception:
+                logger.exception("Failed to deliver pending notifications")
+                delivered = 0
+            finally:
+                close_old_connections()
+            if delivered < self.batch_size:
+                self._stop_event.wait(poll_interval)
+        self.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def close(self):
+        self._close_mail_connection()
+        self._http.close()
+
+
+def worker_from_settings():
+    options = getattr(settings, 'NOTIFICATION_OUTBOX', {})
+    return NotificationWorker(
+        batch_size=options.get('BATCH_SIZE', 100),
+        max_attempts=options.get('MAX_ATTEMPTS', 5),
+        retry_backoff=options.get('RETRY_BACKOFF', 30),
+        max_retry_backoff=options.get('MAX_RETRY_BACKOFF', 60 * 60),
+        http_timeout=options.get('HTTP_TIMEOUT', 10),
+        claim_timeout=options.get('CLAIM_TIMEOUT', 10 * 60),
+    )
@@ -0,0 +1,186 @@
+"""
+Resized variants of the profile pictures.
+
+Every client used to download the original upload (often several MB) to show a 40px avatar. After an upload, the
+variants (PROFILE_PICTURES['SIZES'] square crops, in every format of PROFILE_PICTURES['FORMATS']) are generated with Pillow
+off the request thread, once the transaction commits, by a small pool of background threads. They are written through
+a Django storage (PROFILE_PICTURES['STORAGE'], an alias of STORAGES: the local filesystem by default, or S3 with
+django-storages), and their names are saved in User.profile_picture_variants. UserSerializer renders their URLs, and
+falls back to the original until the variants are ready.
+
+The uploads themselves are streamed to a temporary file by Django (FILE_UPLOAD_HANDLERS), not buffered in memory.
+
+Sample usage:
+
+    schedule_variants(user)                      # after saving a new profile_picture
+    generate_variants(user.pk)                   # synchronously, e.g. from a shell
+    variant_urls(user)                           # {'64': {'webp': url, 'jpeg': url}, '256': {...}}
+"""
+
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from users.auth import get_token_cache
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and options of every supported variant format
+FORMATS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+}
+
+
+def _options():
+    options = getattr(settings, 'PROFILE_PICTURES', {})
+    return {
+        'sizes': options.get('SIZES', (64, 256)),
+        'formats': options.get('FORMATS', ('webp', 'jpeg')),
+        'quality': options.get('QUALITY', 80),
+        'storage': options.get('STORAGE', 'default'),
+        'workers': options.get('WORKERS', 2),
+        'async': options.get('ASYNC', True),
+    }
+
+
+def get_storage():
+    return storages[_options()['storage']]
+
+
+def render_variants(image_file, sizes, formats, quality):
+    """
+    {(size, format): encoded bytes} for an image file. Only one decoded copy of the image is kept in memory.
+    """
+    with Image.open(image_file) as image:
+        # JPEG can be decoded at a fraction of its size directly, a lot cheaper for big photos
+        image.draft('RGB', (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        variants = {}
+        for size in sorted(sizes, reverse=True):
+            resized = ImageOps.fit(image, (size, size), method=Image.LANCZOS)
+            for fmt in formats:
+                pillow_format, params = FORMATS[fmt]
+                output = resized if fmt != 'jpeg' or resized.mode == 'RGB' else resized.convert('RGB')
+                buffer = BytesIO()
+                output.save(buffer, pillow_format, quality=quality, **params)
+                variants[size, fmt] = buffer.getvalue()
+        return variants
+
+
+def generate_variants(user_pk):
+    """
+    Generate and store the variants of the current profile picture of a user, and delete the previous ones.
+    Returns the new {size: {format: storage name}}, None if the user has no picture (anymore).
+    """
+    user = User.objects.filter(pk=user_pk).only('pk', 'profile_picture').first()
+    if user is None or not user.profile_picture:
+        return None
+    original = user.profile_picture.name
+    options = _options()
+    storage = get_storage()
+
+    with user.profile_picture.open('rb') as image_file:
+        rendered = render_variants(image_file, options['sizes'], options['formats'], options['quality'])
+
+    variants = {}
+    for (size, fmt), content in rendered.items():
+        name = storage.save(f"{_variants_dir(user.pk)}/{_stem(original)}_{size}.{fmt}", ContentFile(content))
+        variants.setdefault(str(size), {})[fmt] = name
+
+    # only if the picture wasn't replaced meanwhile, the job of the new picture writes its own variants
+    updated = User.objects.filter(pk=user.pk, profile_picture=original).update(profile_picture_variants=variants)
+    # update() sends no post_save, drop the user cached by the token authentication ourselves
+    get_token_cache().invalidate_user(user.pk)
+    _delete_orphaned_variants(user.pk, original)
+    return variants if updated else None
+
+
+def _variants_dir(user_pk):
+    return f"profile_pictures/variants/{user_pk}"
+
+
+def _stem(original):
+    # a new name per original, so the URLs of a new picture are never served stale from a CDN/browser cache
+    return hashlib.sha1(original.encode()).hexdigest()[:12]
+
+
+def _delete_orphaned_variants(user_pk, original):
+    """
+    Delete the variant files of a user that are neither the variants saved on the row nor, when the picture was replaced
+    since `original`, the files of the new picture (its own job may be writing them). The previous variants are found by
+    listing the files, not from User.profile_picture_variants: a full save of an older User instance may have written
+    stale names back over it.
+    """
+    storage = get_storage()
+    try:
+        _, files = storage.listdir(_variants_dir(user_pk))
+    except FileNotFoundError:
+        return
+    # read after listing: the job of a newer picture only writes its files once that picture is saved
+    current = User.objects.filter(pk=user_pk).values('profile_picture', 'profile_picture_variants').first() or {}
+    keep = {name for names in (current.get('profile_picture_variants') or {}).values() for name in names.values()}
+    picture = current.get('profile_picture')
+    pending = f"{_stem(picture)}_" if picture and picture != original else None
+    for filename in files:
+        name = f"{_variants_dir(user_pk)}/{filename}"
+        if name not in keep and not (pending and filename.startswith(pending)):
+            storage.delete(name)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_options()['workers'], thread_name_prefix='profile-picture')
+    return _executor
+
+
+def _generate_in_background(user_pk):
+    try:
+        generate_variants(user_pk)
+    except Exception:
+        logger.exception("Failed to generate the profile picture variants of user %s", user_pk)
+    finally:
+        # this thread has its own DB connection
+        close_old_connections()
+
+
+def schedule_variants(user):
+    """
+    Generate the variants of the user's new profile picture once the transaction commits, in the background
+    (synchronously with PROFILE_PICTURES['ASYNC'] = False).
+    """
+    user_pk = user.pk
+    if _options()['async']:
+        transaction.on_commit(lambda: _get_executor().submit(_generate_in_background, user_pk))
+    else:
+        transaction.on_commit(lambda: generate_variants(user_pk))
+
+
+def variant_urls(user):
+    """
+    {size: {format: url}} of the user's variants, empty until they are generated.
+    """
+    storage = get_storage()
+    return {
+        size: {fmt: storage.url(name) for fmt, name in names.items()}
+        for size, names in (user.profile_picture_variants or {}).items()
+    }
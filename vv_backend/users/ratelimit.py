@@ -0,0 +1,177 @@
+"""
+Rate limiting of the unauthenticated auth endpoints (login, register, resend verification email, password reset).
+
+RateLimitThrottle is a DRF throttle (REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES']), so it runs in APIView.initial(),
+before the view touches the DB. A view opts in with `rate_limit_scope`, and RATE_LIMITS['RULES'][scope] gives a rate
+per key type: 'ip' (the client address, see DRF's NUM_PROXIES) and 'email' (the email of the request body).
+A request over any of its limits gets a 429 with a Retry-After header.
+
+Two interchangeable backends keep the counters:
+- InMemoryRateLimitBackend: a token bucket per key in this process, a few microseconds per request. Every process
+  has its own buckets, so the effective limit is multiplied by the number of processes.
+- CacheRateLimitBackend: a sliding window counter in a Django cache (e.g. Redis) shared by all the processes,
+  two cache round trips per request and key.
+Pick one with RATE_LIMITS['BACKEND'] and always go through get_rate_limit_backend().
+
+This only sheds bursts. The per user cooldowns of the email verifications/password resets (EmailVerification.cooldown,
+PasswordReset.cooldown) are enforced by their serializers.
+
+Sample usage:
+
+    class LoginAPI(knox_views.LoginView):
+        rate_limit_scope = 'login'          # RATE_LIMITS['RULES']['login'] = {'ip': '30/m', 'email': '10/m'}
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    '10/m' -> (10, 60): number of requests allowed per period in seconds.
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class InMemoryRateLimitBackend:
+    """
+    Token bucket per key: holds up to `limit` tokens, refilled at limit/period tokens per second, a request takes one.
+    Bounded, the least recently used buckets are dropped past max_keys (they would be full again soon anyway).
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [tokens, time of the last refill], least recently used first
+        self._buckets = OrderedDict()
+
+    def hit(self, key, limit, period):
+        """
+        Count a request. Returns (allowed, seconds to wait before the next request is allowed).
+        """
+        now = time.monotonic()
+        refill_rate = limit / period
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(limit), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * refill_rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0
+            return False, (1 - bucket[0]) / refill_rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheRateLimitBackend:
+    """
+    Sliding window counter in a Django cache: the count of the current fixed window plus the count of the previous one,
+    weighted by how much of it still overlaps the sliding window.
+    """
+
+    def __init__(self, cache='default'):
+        self.cache = cache
+
+    def hit(self, key, limit, period):
+        cache = caches[self.cache]
+        now = time.time()
+        window = int(now // period)
+        current_key = f"ratelimit:{key}:{window}"
+        previous_key = f"ratelimit:{key}:{window - 1}"
+
+        cache.add(current_key, 0, timeout=period * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # expired between add() and incr()
+            cache.set(current_key, 1, timeout=period * 2)
+            current = 1
+        previous = cache.get(previous_key, 0)
+
+        elapsed = (now % period) / period
+        if previous * (1 - elapsed) + current <= limit:
+            return True, 0
+        return False, period - now % period
+
+    def reset(self):
+        # the counters expire by themselves, and clearing the whole cache would drop more than them
+        pass
+
+
+def _options():
+    options = getattr(settings, 'RATE_LIMITS', {})
+    return {
+        'backend': options.get('BACKEND', 'users.ratelimit.InMemoryRateLimitBackend'),
+        'options': options.get('OPTIONS', {}),
+        'rules': options.get('RULES', {}),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_rate_limit_backend():
+    options = _options()
+    return import_string(options['backend'])(**options['options'])
+
+
+@receiver(setting_changed)
+def _reset_rate_limit_backend(setting, **kwargs):
+    if setting == 'RATE_LIMITS':
+        get_rate_limit_backend.cache_clear()
+
+
+class RateLimitThrottle(BaseThrottle):
+    """
+    Applies RATE_LIMITS['RULES'][view.rate_limit_scope], views without a rate_limit_scope are not limited.
+    """
+
+    def allow_request(self, request, view):
+        self._wait = None
+        scope = getattr(view, 'rate_limit_scope', None)
+        rules = _options()['rules'].get(scope) if scope else None
+        if not rules:
+            return True
+
+        backend = get_rate_limit_backend()
+        for key_type, rate in rules.items():
+            ident = self.get_key(key_type, request)
+            if ident is None:
+                continue
+            limit, period = parse_rate(rate)
+            allowed, wait = backend.hit(f"{scope}:{key_type}:{ident}", limit, period)
+            if not allowed:
+                self._wait = wait
+                return False
+        return True
+
+    def get_key(self, key_type, request):
+        if key_type == 'ip':
+            return self.get_ident(request)
+        if key_type == 'email':
+            data = request.data
+            email = data.get('email') if hasattr(data, 'get') else None
+            return email.strip().lower() if isinstance(email, str) and email.strip() else None
+        raise ValueError(f"Unknown rate limit key type: {key_type}")
+
+    def wait(self):
+        return self._wait
@@ -2,33 +2,65 @@ from datetime import timedelta
 
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
 # from rest_framework.validators import UniqueValidator
 
 from django_countries.serializer_fields import CountryField
 
-from users.models import EmailVerification, PasswordReset
+from users.models import EmailVerification, Friendship, PasswordReset
+from users.profile_pictures import schedule_variants, variant_urls
 from users.exceptions import UserUpdateValidationMessage
 
 
 # NOTE: All Data transform + validation logic should be here and just the presentation logic should be in views.
 
 
+def with_last_request(users, model):
+    """
+    Annotate the users with the created_at/cooldown/sent_count of their latest EmailVerification or PasswordReset,
+    so the cooldown is checked with the same query that looks the user up.
+    """
+    latest = model.objects.filter(user=OuterRef('pk')).order_by('-created_at')
+    return users.annotate(
+        last_request_at=Subquery(latest.values('created_at')[:1]),
+        last_request_cooldown=Subquery(latest.values('cooldown')[:1]),
+        last_request_sent_count=Subquery(latest.values('sent_count')[:1]),
+    )
+
+
+def check_cooldown(user):
+    """
+    Raise a 429 while the cooldown of the user's latest request (see with_last_request()) is running.
+    """
+    if user.last_request_at is None or not user.last_request_cooldown:
+        return
+    wait = (user.last_request_at + user.last_request_cooldown - timezone.now()).total_seconds()
+    if wait > 0:
+        raise exceptions.Throttled(wait=wait, detail="An email was sent recently, please wait before requesting another one.")
+
+
 class UserSerializer(serializers.ModelSerializer):
     country = CountryField(country_dict=True, required=False)
+    # resized copies of profile_picture, {size: {format: url}}, empty until they are generated
+    profile_picture_urls = serializers.SerializerMethodField()
 
     class Meta:
         model = get_user_model()
         fields = (
             'email', 'username',
             'first_name', 'last_name', 'gender', 'dob',
-            'bio', 'profile_picture',
+            'bio', 'profile_picture', 'profile_picture_urls',
             'city', 'state', 'country',
             'preferred_language',
             'has_finished_onboarding'
         )
+
+    def get_profile_picture_urls(self, user):
+        return variant_urls(user)
     
     def update(self, instance, validated_data):
         email_updated = False
@@ -53,6 +85,8 @@ class UserSerializer(serializers.ModelSerializer):
             raise UserUpdateValidationMessage({"detail": "Email updated. Please verify your new email to login with it."}, code="email_updated", status_code=202)
         
         instance = super().update(instance, validated_data)
+        if validated_data.get('profile_picture'):
+            schedule_variants(instance)
         return instance
 
 
@@ -91,12 +125,15 @@ class RegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('password2')
         user = get_user_model().objects.create_user(**validated_data)
+        if user.profile_picture:
+            schedule_variants(user)
         
         # Create a EmailVerification instance for the new user
         _ = EmailVerification.objects.create(
             user=user,
             sent_to=user.email,
-            expires_at=timezone.now() + timedelta(minutes=30)
+            expires_at=timezone.now() + timedelta(minutes=30),
+            sent_count=1,
         )
         # a verification email should be sent to the user by the post_save signal at this point
         
@@ -155,20 +192,27 @@ class VerifyEmailSerializer(serializers.ModelSerializer):
         # fields = ('sent_to', 'token', )
         fields = ('token', )
 
-    def validate_token(self, value):
-        if not EmailVerification.objects.filter(token=value, expires_at__gt=timezone.now()).exists():
-            raise serializers.ValidationError("Invalid or expired token.")
-        return value
+    def validate(self, data):
+        # the verification (and its user) found here is handed over to create(), so the token is only looked up once
+        email_verification = (
+            EmailVerification.objects
+            .select_related('user')
+            .filter(token=data['token'], expires_at__gt=timezone.now())
+            .first()
+        )
+        if email_verification is None:
+            raise serializers.ValidationError({'token': "Invalid or expired token."})
+        data['email_verification'] = email_verification
+        return data
     
     def create(self, validated_data):
-        # TODO: Nishil - Check: We should not have to check if email_verification.expires_at > timezone.now()
-        # here if we're already doing that in the validate_token method
-        email_verification = EmailVerification.objects.get(token=validated_data['token'], expires_at__gt=timezone.now())
+        email_verification = validated_data['email_verification']
         user = email_verification.user
         user.email = email_verification.sent_to
         user.is_verified = True
-        user.save()
-        email_verification.delete()
+        with transaction.atomic():
+            user.save(update_fields=['email', 'is_verified'])
+            email_verification.delete()
         return user
 
 
@@ -179,28 +223,33 @@ class ResendVerificationEmailSerializer(serializers.ModelSerializer):
         model = EmailVerification
         fields = ('email', )
 
-    def validate_email(self, value):
-        user = get_user_model().objects.filter(email=value)
+    def validate(self, data):
+        # the user found here is handed over to create() (like LoginSerializer does), so it is only looked up once
+        user = with_last_request(get_user_model().objects.filter(email=data['email']), EmailVerification).first()
         # NOTE: Nishil - we should not have to check if user is_active if we are 
         # implementing and overriding either the user model's default manager or something else (auth backend?)
-        if not user.exists() or not user.get().is_active:
-            raise serializers.ValidationError("No user found with this email.")
-        if user.get().is_verified:
-            raise serializers.ValidationError("User is already verified.")
-        return value
+        if user is None or not user.is_active:
+            raise serializers.ValidationError({'email': "No user found with this email."})
+        if user.is_verified:
+            raise serializers.ValidationError({'email': "User is already verified."})
+        check_cooldown(user)
+        data['user'] = user
+        return data
     
     def create(self, validated_data):
-        user = get_user_model().objects.get(email=validated_data['email'])
+        user = validated_data['user']
 
-        # Delete any previous EmailVerification instances for the user
-        EmailVerification.objects.filter(user=user).delete()
+        with transaction.atomic():
+            # Delete any previous EmailVerification instances for the user
+            EmailVerification.objects.filter(user=user).delete()
 
-        # Create a new EmailVerification instance for the user
-        _ = EmailVerification.objects.create(
-            user=user,
-            sent_to=user.email,
-            expires_at=timezone.now() + timedelta(minutes=30)
-        )
+            # Create a new EmailVerification instance for the user
+            _ = EmailVerification.objects.create(
+                user=user,
+                sent_to=user.email,
+                expires_at=timezone.now() + timedelta(minutes=30),
+                sent_count=(user.last_request_sent_count or 0) + 1,
+            )
         # a verification email should be sent to the user by the post_save signal at this point
         return user
 
@@ -212,25 +261,30 @@ class PasswordResetRequestSerializer(serializers.ModelSerializer):
         model = get_user_model()
         fields = ('email', )
     
-    def validate_email(self, value):
-        user = get_user_model().objects.filter(email=value)
+    def validate(self, data):
+        # the user found here is handed over to create(), so it is only looked up once
+        user = with_last_request(get_user_model().objects.filter(email=data['email']), PasswordReset).first()
         # NOTE: Nishil - we should not have to check if user is_active if we are
         # implementing and overriding either the user model's default manager or something else (auth backend?)
-        if not user.exists() or not user.get().is_active:
-            raise serializers.ValidationError("No user found with this email.")
-        return value
+        if user is None or not user.is_active:
+            raise serializers.ValidationError({'email': "No user found with this email."})
+        check_cooldown(user)
+        data['user'] = user
+        return data
     
     def create(self, validated_data):
-        user = get_user_model().objects.get(email=validated_data['email'])
+        user = validated_data['user']
 
-        # Delete any previous PasswordReset instances for the user
-        PasswordReset.objects.filter(user=user).delete()
+        with transaction.atomic():
+            # Delete any previous PasswordReset instances for the user
+            PasswordReset.objects.filter(user=user).delete()
 
-        # Create a new PasswordReset instance for the user
-        _ = PasswordReset.objects.create(
-            user=user,
-            expires_at=timezone.now() + timedelta(minutes=15)
-        )
+            # Create a new PasswordReset instance for the user
+            _ = PasswordReset.objects.create(
+                user=user,
+                expires_at=timezone.now() + timedelta(minutes=15),
+                sent_count=(user.last_request_sent_count or 0) + 1,
+            )
         # a password reset email should be sent to the user by the post_save signal at this point
         return user
 
@@ -247,17 +301,63 @@ class PasswordResetSerializer(serializers.ModelSerializer):
     def validate(self, data):
         if data['password'] != data['password2']:
             raise serializers.ValidationError({'password': 'Passwords must match.'})
+        # the reset (and its user) found here is handed over to create(), so the token is only looked up once
+        password_reset = (
+            PasswordReset.objects
+            .select_related('user')
+            .filter(token=data['token'], expires_at__gt=timezone.now())
+            .first()
+        )
+        if password_reset is None:
+            raise serializers.ValidationError({'token': "Invalid or expired token"})
+        data['password_reset'] = password_reset
         return data
     
-    def validate_token(self, value):
-        if not PasswordReset.objects.filter(token=value, expires_at__gt=timezone.now()).exists():
-            raise serializers.ValidationError("Invalid or expired token")
-        return value
-    
     def create(self, validated_data):
-        password_reset = PasswordReset.objects.get(token=validated_data['token'], expires_at__gt=timezone.now())
+        password_reset = validated_data['password_reset']
         user = password_reset.user
         user.set_password(validated_data['password'])
-        user.save()
-        password_reset.delete()
+        with transaction.atomic():
+            # consuming the token and checking it was still there is one statement, so two concurrent resets can't both use it
+            deleted, _ = PasswordReset.objects.filter(pk=password_reset.pk).delete()
+            if not deleted:
+                raise serializers.ValidationError({'token': "Invalid or expired token"})
+            user.save(update_fields=['password'])
         return user
+
+
+class FriendSerializer(serializers.ModelSerializer):
+    """
+    Public card of another user, in the friend lists.
+    """
+    profile_picture_urls = serializers.SerializerMethodField()
+
+    class Meta:
+        model = get_user_model()
+        fields = ('id', 'username', 'first_name', 'last_name', 'profile_picture_urls')
+
+    def get_profile_picture_urls(self, user):
+        return variant_urls(user)
+
+
+class FriendSuggestionSerializer(FriendSerializer):
+    # set by FriendSuggestionsAPI
+    mutual_friend_count = serializers.IntegerField(read_only=True)
+
+    class Meta(FriendSerializer.Meta):
+        fields = FriendSerializer.Meta.fields + ('mutual_friend_count', )
+
+
+class FriendshipSerializer(serializers.ModelSerializer):
+    requested_by_user = FriendSerializer(read_only=True)
+    sent_to_user = FriendSerializer(read_only=True)
+    status = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = Friendship
+        fields = ('id', 'requested_by_user', 'sent_to_user', 'status', 'message', 'created_at', 'friend_since')
+
+
+class FriendRequestSerializer(serializers.Serializer):
+    user = serializers.PrimaryKeyRelatedField(queryset=get_user_model().objects.filter(is_active=True))
+    message = serializers.CharField(required=False, allow_blank=True, allow_null=True)
@@ -1,49 +1,57 @@
 # FOR TESTING ONLY
 from django.conf import settings
-import requests
-ntfy_topic = settings.NTFY_TOPIC
 dhost_url = settings.DHOST_URL
 
 # from urllib.parse import urlencode
 
-from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from knox.models import AuthToken
 
-from users.models import EmailVerification, PasswordReset
+from users.auth import get_token_cache
+from users.friends import invalidate_friendship
+from users.models import EmailVerification, Friendship, PasswordReset, User
+from users.notifications import queue_email, queue_ntfy
 
 
-# TODO: Nishil: Move to Celery & add .delay? async?
+# The emails are not sent here, only queued in the outbox (in the same transaction as the instance when there is one),
+# the send_notifications worker delivers them. See users/notifications.py
 @receiver(post_save, sender=EmailVerification)
 def send_email_verification(sender, instance, created, **kwargs):
     if created:
         message = f"{dhost_url}/user/verify-email?sent_to={instance.user.email}&token={instance.token}"
-        send_mail(
-            "Email Verification",
-            f"{message}",
-            "from@example.com:",
-            [instance.sent_to],
-            fail_silently=False,
-        )
-        _ = requests.post(
-            f"https://ntfy.sh/{ntfy_topic}",
-            data=message.encode("utf-8"),
-            headers={"Title": "Email Verification"}
-        )
+        with transaction.atomic():
+            queue_email("Email Verification", message, [instance.sent_to], from_email="from@example.com")
+            queue_ntfy("Email Verification", message)
 
 @receiver(post_save, sender=PasswordReset)
 def send_reset_password(sender, instance, created, **kwargs):
     if created:
         message = f"{dhost_url}/user/reset-password?sent_to={instance.user.email}&token={instance.token}"
-        send_mail(
-            "Reset Password",
-            f"{message}",
-            "from@example.com",
-            [instance.user.email],
-            fail_silently=False,
-        )
-        _ = requests.post(
-            f"https://ntfy.sh/{ntfy_topic}",
-            data=message.encode("utf-8"),
-            headers={"Title": "Reset Password"}
-        )
+        with transaction.atomic():
+            queue_email("Reset Password", message, [instance.user.email], from_email="from@example.com")
+            queue_ntfy("Reset Password", message)
+
+
+# Keep the token authentication cache in sync (see users/auth.py)
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # LogoutAPI, LogoutAllAPI and the expired tokens knox cleans up
+    get_token_cache().invalidate_token(instance.digest)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user_tokens(sender, instance, **kwargs):
+    # DisableAPI, profile updates...
+    get_token_cache().invalidate_user(instance.pk)
+
+
+# Keep the friend graph cache in sync (see users/friends.py), accept()/reject() invalidate it themselves
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_cached_friends(sender, instance, **kwargs):
+    invalidate_friendship(instance)
@@ -0,0 +1,129 @@
+"""
+Sweeper of the expired EmailVerification, PasswordReset and knox AuthToken rows.
+
+They were only deleted when used (or, for knox tokens, when their user happens to authenticate again), so abandoned
+ones piled up forever. The sweeper deletes the expired rows in batches of BATCH_SIZE, each batch its own short
+statement pair (select the pks on the expiry index, delete them), so it never holds locks on a big range of rows.
+It can run as a command (cron) or as a background thread of the web process (EXPIRED_TOKEN_SWEEPER['RUN_IN_PROCESS']).
+
+Sample usage:
+
+    python manage.py sweep_expired_tokens            # one run
+    python manage.py sweep_expired_tokens --loop     # every INTERVAL seconds, until interrupted
+    sweeper_from_settings().sweep()                  # {'users.EmailVerification': 12, ...}
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from knox.models import AuthToken
+
+from users.models import EmailVerification, PasswordReset
+
+logger = logging.getLogger(__name__)
+
+# model -> its expiry field, rows with a NULL expiry (knox tokens without TTL) never expire
+EXPIRING_MODELS = {
+    EmailVerification: 'expires_at',
+    PasswordReset: 'expires_at',
+    AuthToken: 'expiry',
+}
+
+
+class ExpiredTokenSweeper:
+    def __init__(self, batch_size=1000, interval=60 * 60):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # metrics
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._swept = {model._meta.label: 0 for model in EXPIRING_MODELS}
+        self._last_run = {}
+        self._last_run_seconds = None
+
+    def sweep(self, now=None):
+        """
+        Delete every row expired at `now`. Returns {model label: number of rows deleted}.
+        """
+        now = now or timezone.now()
+        start = time.perf_counter()
+        swept = {}
+        for model, field in EXPIRING_MODELS.items():
+            swept[model._meta.label] = self._sweep_model(model, field, now)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._runs += 1
+            for label, count in swept.items():
+                self._swept[label] += count
+            self._last_run = swept
+            self._last_run_seconds = elapsed
+        logger.info("Swept expired tokens in %.2fs: %s", elapsed, swept)
+        return swept
+
+    def _sweep_model(self, model, field, now):
+        expired = model._base_manager.filter(**{f'{field}__lte': now})
+        total = 0
+        while True:
+            pks = list(expired.order_by(field).values_list('pk', flat=True)[:self.batch_size])
+            if not pks:
+                break
+            model._base_manager.filter(pk__in=pks).delete()
+            total += len(pks)
+            if len(pks) < self.batch_size:
+                break
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'runs': self._runs,
+                'swept': dict(self._swept),
+                'last_run': dict(self._last_run),
+                'last_run_seconds': self._last_run_seconds,
+            }
+
+    def run(self):
+        """
+        Sweep every `interval` seconds until stop() is called.
+        """
+        while not self._stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Failed to sweep expired tokens")
+            finally:
+                close_old_connections()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Run in a background daemon thread of this process.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name='expired-token-sweeper', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def sweeper_from_settings():
+    options = getattr(settings, 'EXPIRED_TOKEN_SWEEPER', {})
+    return ExpiredTokenSweeper(
+        batch_size=options.get('BATCH_SIZE', 1000),
+        interval=options.get('INTERVAL', 60 * 60),
+    )
@@ -1,9 +1,27 @@
+import shutil
+import tempfile
 import uuid
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-from django.test import TestCase
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from users.models import Friendship
+from users.models import Friendship, EmailVerification, OutboundNotification
+from users.notifications import NotificationWorker, queue_email
+from users.sweeper import ExpiredTokenSweeper
+from users import friends
+from users.models import PasswordReset
+from knox.models import AuthToken
+from PIL import Image
+
+from users.profile_pictures import generate_variants, get_storage
+from users.serializers import UserSerializer
 
 User = get_user_model() # This should be the standard way to make reference to the User model, since we have overridden the default user model
 # NOTE: ``from django.conf import settings ... settings.AUTH_USER_MODEL`` is string name of the user model, not the model itself.
@@ -27,18 +45,18 @@ class FriendshipModelTest(TestCase):
         cls.user2 = User.objects.create_user(username="friendshipuser2", email="b@c.com", password="password123")
         cls.user3 = User.objects.create_user(username="friendshipuser3", email="c@d.com", password="password123")
         cls.friendship = Friendship.objects.create(
-            requested_by=cls.user1,
-            sent_to=cls.user2,
+            requested_by_user=cls.user1,
+            sent_to_user=cls.user2,
             # default: PENDING, so no need to set status here
         )
         cls.friendship2 = Friendship.objects.create(
-            requested_by=cls.user2,
-            sent_to=cls.user3,
+            requested_by_user=cls.user2,
+            sent_to_user=cls.user3,
         )
 
     def test_friendship_creation(self):
-        self.assertEqual(self.friendship.requested_by, self.user1)
-        self.assertEqual(self.friendship.sent_to, self.user2)
+        self.assertEqual(self.friendship.requested_by_user, self.user1)
+        self.assertEqual(self.friendship.sent_to_user, self.user2)
         self.assertEqual(self.friendship.status, Friendship.Status.PENDING)
 
     def test_friendship_deletion_with_request_user(self):
@@ -71,3 +89,262 @@ class FriendshipModelTest(TestCase):
         self.friendship2.status = Friendship.Status.ACCEPTED
         self.friendship2.save()
         self.assertEqual(Friendship.objects.get(id=self.friendship2.id).status, Friendship.Status.ACCEPTED,)
+
+
+class FriendGraphTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b, cls.c, cls.d, cls.e = [
+            User.objects.create_user(username=f"graph{name}", email=f"{name}@graph.com", password="password123") for name in "abcde"
+        ]
+        for requester, recipient in ((cls.a, cls.b), (cls.a, cls.c), (cls.b, cls.d), (cls.c, cls.d), (cls.c, cls.e)):
+            friends.accept_request(friends.send_request(requester, recipient), recipient)
+
+    def setUp(self):
+        friends.get_graph_cache().clear()
+
+    def test_graph_queries(self):
+        a, b, c, d, e = self.a, self.b, self.c, self.d, self.e
+        self.assertEqual(friends.friend_ids(a.pk), {b.pk, c.pk})
+        self.assertEqual(friends.friend_ids(d.pk), {b.pk, c.pk})
+        self.assertEqual(friends.mutual_friend_ids(a.pk, d.pk), {b.pk, c.pk})
+        self.assertEqual(friends.suggest_friends(a.pk), [(d.pk, 2), (e.pk, 1)])
+
+        # a pending request is not suggested again
+        friends.send_request(a, e)
+        self.assertEqual(friends.suggest_friends(a.pk), [(d.pk, 2)])
+
+    def test_cache(self):
+        a, b, c = self.a, self.b, self.c
+        friends.friend_ids(a.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(friends.friend_ids(a.pk), {b.pk, c.pk})
+        friends.remove_friendship(a, b.pk)
+        self.assertEqual(friends.friend_ids(a.pk), {c.pk})
+        self.assertNotIn(a.pk, friends.friend_ids(b.pk))
+
+        with override_settings(FRIEND_GRAPH={'CACHE_ENABLED': False}):
+            friends.friend_ids(a.pk)
+            with self.assertNumQueries(1):
+                friends.friend_ids(a.pk)
+
+    def test_transitions(self):
+        a, d, e = self.a, self.d, self.e
+        friendship = friends.send_request(d, a, message="Hi")
+        self.assertEqual(friendship.status, Friendship.Status.PENDING)
+        with self.assertRaises(friends.FriendshipError):
+            friends.accept_request(friendship, d)
+
+        # a request back accepts the pending one
+        friendship = friends.send_request(a, d)
+        self.assertEqual(friendship.status, Friendship.Status.ACCEPTED)
+        self.assertIsNotNone(Friendship.objects.get(pk=friendship.pk).friend_since)
+        self.assertIn(d.pk, friends.friend_ids(a.pk))
+        with self.assertRaises(friends.FriendshipError):
+            friends.send_request(d, a)
+
+        friendship = friends.send_request(e, a)
+        friends.reject_request(friendship, a)
+        with self.assertRaises(friends.FriendshipError):
+            friends.send_request(e, a)
+        # the user who declined can still ask
+        self.assertEqual(friends.send_request(a, e).sent_to_user, e)
+
+    def test_one_row_per_pair(self):
+        with self.assertRaises(IntegrityError):
+            Friendship.objects.create(requested_by_user=self.b, sent_to_user=self.a)
+
+
+@override_settings(NTFY_TOPIC='')
+class NotificationOutboxTest(TestCase):
+    """
+    mail.outbox is the locmem email backend the test runner swaps in for SMTP.
+    """
+
+    def setUp(self):
+        self.worker = NotificationWorker(batch_size=10, max_attempts=2, retry_backoff=30)
+        self.addCleanup(self.worker.close)
+
+    def test_signal_only_queues_the_email(self):
+        user = User.objects.create_user(username="outboxuser", email="outbox@b.com", password="password123")
+        EmailVerification.objects.create(user=user, sent_to=user.email, expires_at=timezone.now() + timedelta(minutes=30))
+
+        self.assertEqual(len(mail.outbox), 0)
+        notification = OutboundNotification.objects.get()
+        self.assertEqual(notification.recipients, ["outbox@b.com"])
+        self.assertEqual(notification.status, OutboundNotification.Status.PENDING)
+
+        self.assertEqual(self.worker.deliver_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Email Verification")
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, OutboundNotification.Status.SENT)
+        self.assertEqual(notification.attempts, 1)
+
+    def test_batch_is_sent_with_one_connection(self):
+        for i in range(5):
+            queue_email("Hello", "Body", [f"user{i}@b.com"])
+        with mock.patch('users.notifications.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(self.worker.deliver_pending(), 5)
+            self.assertEqual(self.worker.deliver_pending(), 0)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        notification = queue_email("Hello", "Body", ["user@b.com"])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=ConnectionError("SMTP down")):
+            self.worker.deliver_pending()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, OutboundNotification.Status.PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn("SMTP down", notification.last_error)
+        self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=20))
+
+        # not due yet
+        self.assertEqual(self.worker.deliver_pending(), 0)
+
+        OutboundNotification.objects.update(next_attempt_at=timezone.now())
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=ConnectionError("SMTP down")):
+            self.worker.deliver_pending()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, OutboundNotification.Status.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_partial_failure_does_not_resend_the_sent_emails(self):
+        notifications = [queue_email("Hello", "Body", [f"user{i}@b.com"]) for i in range(3)]
+        send_messages = mail.get_connection().send_messages.__func__
+
+        def fail_second(backend, messages):
+            if messages[0].to == ["user0@b.com"]:
+                # the whole batch was claimed before sending
+                statuses = set(OutboundNotification.objects.values_list('status', flat=True))
+                self.assertEqual(statuses, {OutboundNotification.Status.SENDING})
+            if messages[0].to == ["user1@b.com"]:
+                raise ConnectionError("SMTP down")
+            return send_messages(backend, messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', autospec=True, side_effect=fail_second):
+            self.assertEqual(self.worker.deliver_pending(), 3)
+        self.assertEqual([message.to for message in mail.outbox], [["user0@b.com"], ["user2@b.com"]])
+        statuses = [OutboundNotification.objects.get(pk=n.pk).status for n in notifications]
+        self.assertEqual(statuses, [OutboundNotification.Status.SENT, OutboundNotification.Status.PENDING, OutboundNotification.Status.SENT])
+
+        OutboundNotification.objects.filter(status=OutboundNotification.Status.PENDING).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.worker.deliver_pending(), 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_expired_claim_is_sent_again(self):
+        queue_email("Hello", "Body", ["user@b.com"])
+        self.assertEqual(len(self.worker.claim_batch()), 1)
+        # claimed, not due for other workers
+        self.assertEqual(self.worker.deliver_pending(), 0)
+
+        # the worker that claimed it died
+        OutboundNotification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.worker.deliver_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(NTFY_TOPIC='test-topic')
+    def test_ntfy_push(self):
+        user = User.objects.create_user(username="ntfyuser", email="ntfy@b.com", password="password123")
+        with mock.patch('requests.Session.post') as post:
+            EmailVerification.objects.create(user=user, sent_to=user.email, expires_at=timezone.now() + timedelta(minutes=30))
+            post.assert_not_called()
+            self.assertEqual(self.worker.deliver_pending(), 2)
+        post.assert_called_once()
+        self.assertEqual(post.call_args.kwargs['headers'], {"Title": "Email Verification"})
+        self.assertEqual(OutboundNotification.objects.filter(status=OutboundNotification.Status.SENT).count(), 2)
+
+
+class ExpiredTokenSweeperTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="sweeper", email="sweeper@example.com", password="Cc123456789")
+
+    def test_sweeps_only_expired_rows_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            EmailVerification.objects.create(user=self.user, sent_to=self.user.email, expires_at=now - timedelta(minutes=i + 1))
+        valid = EmailVerification.objects.create(user=self.user, sent_to=self.user.email, expires_at=now + timedelta(minutes=30))
+        PasswordReset.objects.create(user=self.user, expires_at=now - timedelta(minutes=1))
+        expired_token, _ = AuthToken.objects.create(self.user, expiry=timedelta(seconds=-1))
+        valid_token, _ = AuthToken.objects.create(self.user, expiry=None)
+
+        sweeper = ExpiredTokenSweeper(batch_size=2)
+        swept = sweeper.sweep()
+
+        self.assertEqual(swept, {'users.EmailVerification': 5, 'users.PasswordReset': 1, 'knox.AuthToken': 1})
+        self.assertEqual(list(EmailVerification.objects.all()), [valid])
+        self.assertFalse(PasswordReset.objects.exists())
+        self.assertEqual(list(AuthToken.objects.values_list('digest', flat=True)), [valid_token.digest])
+
+        self.assertEqual(sweeper.sweep()['users.EmailVerification'], 0)
+        self.assertEqual(sweeper.stats()['runs'], 2)
+        self.assertEqual(sweeper.stats()['swept']['users.EmailVerification'], 5)
+
+
+class ProfilePictureVariantsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, PROFILE_PICTURES={'SIZES': (32, 64), 'ASYNC': False})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username="avatar", email="avatar@example.com", password="Cc123456789")
+
+    def upload(self, size=(800, 600), color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('avatar.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_generated_after_upload(self):
+        serializer = UserSerializer(self.user, data={'profile_picture': self.upload()}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.profile_picture_variants), {'32', '64'})
+        storage = get_storage()
+        with storage.open(self.user.profile_picture_variants['64']['webp']) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (64, 64))
+            self.assertEqual(image.format, 'WEBP')
+        with storage.open(self.user.profile_picture_variants['32']['jpeg']) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (32, 32))
+
+        urls = UserSerializer(self.user).data['profile_picture_urls']
+        self.assertTrue(urls['32']['jpeg'].endswith('.jpeg'))
+
+    def test_previous_variants_are_deleted(self):
+        self.user.profile_picture = self.upload(color='red')
+        self.user.save()
+        old_variants = generate_variants(self.user.pk)
+
+        self.user.profile_picture = self.upload(color='blue')
+        self.user.save()
+        new_variants = generate_variants(self.user.pk)
+
+        storage = get_storage()
+        self.assertFalse(storage.exists(old_variants['64']['webp']))
+        self.assertTrue(storage.exists(new_variants['64']['webp']))
+
+    def test_stale_variants_written_back_are_still_deleted(self):
+        self.user.profile_picture = self.upload(color='red')
+        self.user.save()
+        generate_variants(self.user.pk)
+        stale = User.objects.get(pk=self.user.pk)
+
+        self.user.profile_picture = self.upload(color='blue')
+        self.user.save()
+        first_blue = generate_variants(self.user.pk)
+        # an instance loaded before the regeneration writes the red variants back
+        stale.profile_picture = self.user.profile_picture
+        stale.save()
+        new_variants = generate_variants(self.user.pk)
+
+        storage = get_storage()
+        _, files = storage.listdir(f"profile_pictures/variants/{self.user.pk}")
+        self.assertEqual(
+            sorted(files), sorted(name.rsplit('/', 1)[1] for names in new_variants.values() for name in names.values()),
+        )
+        self.assertFalse(storage.exists(first_blue['64']['webp']))
@@ -1,3 +1,8 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -5,9 +10,19 @@ from .models import User
 from django.utils import timezone
 from .models import EmailVerification
 from .models import PasswordReset
+from .auth import get_token_cache
+from .ratelimit import get_rate_limit_backend
+from .friends import get_graph_cache
+
+
+class RateLimitResetMixin:
+    # the in-memory rate limit buckets live as long as the process, don't let other tests use them up
+    def setUp(self):
+        get_rate_limit_backend().reset()
+        super().setUp()
 
 
-class UserRegistrationTestCase(APITestCase):
+class UserRegistrationTestCase(RateLimitResetMixin, APITestCase):
     data = {
         'email': 'test@example.com',
         'password': 'password123',
@@ -50,7 +65,7 @@ class UserRegistrationTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
-class VerifyEmailTestCase(APITestCase):
+class VerifyEmailTestCase(RateLimitResetMixin, APITestCase):
     data = {
         'email': 'test@example.com',
         'password': 'password123',
@@ -78,8 +93,9 @@ class VerifyEmailTestCase(APITestCase):
         pass
 
 
-class BaseTestCase(APITestCase):
+class BaseTestCase(RateLimitResetMixin, APITestCase):
     def setUp(self) -> None:
+        super().setUp()
         self.user_data = {
             'email': 'test@example.com',
             'password': 'password123',
@@ -206,3 +222,182 @@ class PasswordResetTestCase(BaseTestCase):
         }
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TokenAuthCacheTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        get_token_cache().clear()
+        self.token = self.get_token()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_cached_token_does_no_auth_queries(self):
+        url = reverse('profile')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.user_data['email'])
+        self.assertEqual([query for query in captured if 'knox_authtoken' in query['sql'] or 'users_user' in query['sql']], [])
+        self.assertEqual(get_token_cache().stats()['hits'], 1)
+
+    def test_logout_invalidates_the_token(self):
+        self.client.get(reverse('profile'))
+        self.assertEqual(self.client.post(reverse('logout')).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_all_invalidates_the_tokens(self):
+        other_token = self.get_token()
+        self.client.get(reverse('profile'))
+        self.client.post(reverse('logoutall'))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_token}')
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_disable_invalidates_the_token(self):
+        self.client.get(reverse('profile'))
+        self.assertEqual(self.client.delete(reverse('disable')).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthFlowQueryCountTestCase(BaseTestCase):
+    """
+    Every auth flow looks its user/token up once, and writes inside one transaction.
+    """
+
+    def assertLookups(self, table, count, func):
+        with CaptureQueriesContext(connection) as captured:
+            response = func()
+        lookups = [query for query in captured if query['sql'].startswith('SELECT') and f'"{table}"' in query['sql']]
+        self.assertEqual(len(lookups), count, [query['sql'] for query in lookups])
+        return response
+
+    def create_unverified_user(self):
+        data = {**self.user_data, 'email': 'other@example.com', 'username': 'otheruser'}
+        self.client.post(reverse('register'), data, format='json')
+        return data
+
+    def test_register(self):
+        data = {**self.user_data, 'email': 'new@example.com', 'username': 'newuser'}
+        # the username unique check
+        response = self.assertLookups('users_user', 1, lambda: self.client.post(reverse('register'), data, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_login(self):
+        data = {'email': self.user_data['email'], 'password': self.user_data['password']}
+        response = self.assertLookups('users_user', 1, lambda: self.client.post(reverse('login'), data, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_verify(self):
+        data = self.create_unverified_user()
+        token = EmailVerification.objects.get(sent_to=data['email']).token
+        url = f"{reverse('verify_email')}?token={token}"
+        response = self.assertLookups('users_emailverification', 1, lambda: self.client.get(url))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get(email=data['email']).is_verified)
+        self.assertFalse(EmailVerification.objects.filter(token=token).exists())
+
+    def test_resend(self):
+        data = self.create_unverified_user()
+        # past the cooldown of the verification sent on registration
+        EmailVerification.objects.filter(sent_to=data['email']).update(created_at=timezone.now() - timedelta(hours=1))
+        response = self.assertLookups(
+            'users_user', 1,
+            lambda: self.client.post(reverse('resend_email_verification'), {'email': data['email']}, format='json'),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(EmailVerification.objects.filter(sent_to=data['email']).count(), 1)
+
+        response = self.client.post(reverse('resend_email_verification'), {'email': self.user_data['email']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
+    def test_reset_request_and_reset(self):
+        url = reverse('reset_password_request')
+        response = self.assertLookups('users_user', 1, lambda: self.client.post(url, {'email': self.user_data['email']}, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        token = PasswordReset.objects.get().token
+        data = {'token': token, 'password': 'newpassword', 'password2': 'newpassword'}
+        response = self.assertLookups('users_passwordreset', 1, lambda: self.client.post(reverse('reset_password'), data, format='json'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the token can only be used once
+        response = self.client.post(reverse('reset_password'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('token', response.data)
+
+
+class RateLimitTestCase(BaseTestCase):
+    @override_settings(RATE_LIMITS={'RULES': {'login': {'ip': '2/m'}}})
+    def test_login_is_limited_per_ip_before_any_query(self):
+        data = {'email': self.user_data['email'], 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('login'), data, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('login'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(RATE_LIMITS={'RULES': {'password_reset_request': {'email': '1/h'}}})
+    def test_reset_request_is_limited_per_email(self):
+        url = reverse('reset_password_request')
+        self.assertEqual(self.client.post(url, {'email': self.user_data['email']}, format='json').status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {'email': self.user_data['email'].upper()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # other emails are not affected
+        self.assertEqual(self.client.post(url, {'email': 'unknown@example.com'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RATE_LIMITS={'RULES': {}})
+    def test_model_cooldown(self):
+        url = reverse('reset_password_request')
+        self.assertEqual(self.client.post(url, {'email': self.user_data['email']}, format='json').status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {'email': self.user_data['email']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(PasswordReset.objects.get().sent_count, 1)
+
+        PasswordReset.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.client.post(url, {'email': self.user_data['email']}, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(PasswordReset.objects.get().sent_count, 2)
+
+
+class FriendsAPITestCase(APITestCase):
+    def setUp(self):
+        get_graph_cache().clear()
+        self.alice = User.objects.create_user(username="alice", email="alice@example.com", password="password123")
+        self.bob = User.objects.create_user(username="bob", email="bob@example.com", password="password123")
+        self.carol = User.objects.create_user(username="carol", email="carol@example.com", password="password123")
+
+    def befriend(self, requester, recipient):
+        self.client.force_authenticate(requester)
+        friendship = self.client.post(reverse('friend_requests'), {'user': str(recipient.pk)}, format='json').data
+        self.client.force_authenticate(recipient)
+        pending = self.client.get(reverse('friend_requests')).data['results']
+        self.assertEqual([request['id'] for request in pending], [friendship['id']])
+        response = self.client.post(reverse('friend_request_accept', args=[friendship['id']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'ACCEPTED')
+
+    def test_friends_mutual_and_suggestions(self):
+        self.befriend(self.alice, self.bob)
+        self.befriend(self.bob, self.carol)
+
+        self.client.force_authenticate(self.bob)
+        friends = self.client.get(reverse('friend_list')).data['results']
+        self.assertEqual([friend['username'] for friend in friends], ['alice', 'carol'])
+
+        self.client.force_authenticate(self.alice)
+        mutual = self.client.get(reverse('mutual_friends', args=[self.carol.pk])).data['results']
+        self.assertEqual([friend['username'] for friend in mutual], ['bob'])
+        suggestions = self.client.get(reverse('friend_suggestions')).data
+        self.assertEqual([(user['username'], user['mutual_friend_count']) for user in suggestions], [('carol', 1)])
+
+        response = self.client.delete(reverse('friend_detail', args=[self.bob.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(reverse('friend_list')).data['results'], [])
+
+    def test_only_the_recipient_answers(self):
+        self.client.force_authenticate(self.alice)
+        friendship = self.client.post(reverse('friend_requests'), {'user': str(self.bob.pk)}, format='json').data
+        self.assertEqual(self.client.post(reverse('friend_request_accept', args=[friendship['id']])).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('friend_requests'), {'user': str(self.alice.pk)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,6 +5,8 @@ from users.views import LoginAPI, LogoutAPI, LogoutAllAPI
 from users.views import ProfileAPI, UpdateAPI, DisableAPI
 from users.views import VerifyEmailAPI, ResendVerificationEmailAPI
 from users.views import PasswordResetRequestAPI, PasswordResetAPI
+from users.views import FriendListAPI, MutualFriendListAPI, FriendSuggestionsAPI
+from users.views import FriendRequestListCreateAPI, FriendRequestAnswerAPI, FriendAPI
 # from users.views import GoogleLoginAPI, GoogleCallbackAPI
 
 urlpatterns = [
@@ -24,6 +26,14 @@ urlpatterns = [
     path('reset-password-request/', PasswordResetRequestAPI.as_view(), name='reset_password_request'),
     path('reset-password/', PasswordResetAPI.as_view(), name='reset_password'),
 
+    path('friends/', FriendListAPI.as_view(), name='friend_list'),
+    path('friends/suggestions/', FriendSuggestionsAPI.as_view(), name='friend_suggestions'),
+    path('friends/requests/', FriendRequestListCreateAPI.as_view(), name='friend_requests'),
+    path('friends/requests/<uuid:pk>/accept/', FriendRequestAnswerAPI.as_view(transition='accept'), name='friend_request_accept'),
+    path('friends/requests/<uuid:pk>/reject/', FriendRequestAnswerAPI.as_view(transition='reject'), name='friend_request_reject'),
+    path('friends/<uuid:user_pk>/', FriendAPI.as_view(), name='friend_detail'),
+    path('friends/<uuid:user_pk>/mutual/', MutualFriendListAPI.as_view(), name='mutual_friends'),
+
     # # social login
     # path('login-google/', GoogleLoginAPI.as_view(), name='login-google'),
     # path('login-google/callback/', GoogleCallbackAPI.as_view(), name='login-google-callback'),
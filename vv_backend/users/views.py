@@ -6,12 +6,16 @@ from django.http import HttpResponseRedirect
 from django.utils import timezone
 
 from rest_framework import generics, permissions, response, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
 
-from users.models import PasswordReset
+from users import friends
+from users.models import Friendship, PasswordReset
 from users.serializers import UserSerializer, RegistrationSerializer, LoginSerializer
 from users.serializers import PasswordResetRequestSerializer, PasswordResetSerializer
 from users.serializers import VerifyEmailSerializer, ResendVerificationEmailSerializer
+from users.serializers import FriendSerializer, FriendSuggestionSerializer, FriendshipSerializer, FriendRequestSerializer
 
 import knox.views as knox_views
 
@@ -19,6 +23,8 @@ import knox.views as knox_views
 # User.Register API (Create)
 class RegistrationAPI(generics.CreateAPIView):
     permission_classes = (permissions.AllowAny, )
+    # see RATE_LIMITS in settings.py
+    rate_limit_scope = 'register'
     serializer_class = RegistrationSerializer
 
     def post(self, request):
@@ -38,6 +44,8 @@ class RegistrationAPI(generics.CreateAPIView):
 # User.Login API
 class LoginAPI(knox_views.LoginView):
     permission_classes = (permissions.AllowAny, )
+    # see RATE_LIMITS in settings.py
+    rate_limit_scope = 'login'
     # To get 'options' request to show proper https actions based on our serializer
 
     def get_serializer(self, *args, **kwargs):
@@ -143,6 +151,7 @@ class ResendVerificationEmailAPI(APIView):
     If the verification email for the new email is expired, the user should update their email again.
     """
     permission_classes = (permissions.AllowAny, )
+    rate_limit_scope = 'resend_verification'
 
     def get_serializer(self, *args, **kwargs):
         return ResendVerificationEmailSerializer(*args, **kwargs)
@@ -160,6 +169,7 @@ class ResendVerificationEmailAPI(APIView):
 
 class PasswordResetRequestAPI(APIView):
     permission_classes = (permissions.AllowAny, )
+    rate_limit_scope = 'password_reset_request'
 
     def get_serializer(self, *args, **kwargs):
         return PasswordResetRequestSerializer(*args, **kwargs)
@@ -176,6 +186,7 @@ class PasswordResetRequestAPI(APIView):
 # User.PasswordReset API
 class PasswordResetAPI(APIView):
     permission_classes = (permissions.AllowAny, )
+    rate_limit_scope = 'password_reset'
 
     def get_serializer(self, *args, **kwargs):
         return PasswordResetSerializer(*args, **kwargs)
@@ -209,6 +220,117 @@ class DisableAPI(generics.DestroyAPIView):
         }, status=status.HTTP_204_NO_CONTENT)
 
 
+# User.Friends API (the friend graph, see users/friends.py)
+class FriendListPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class FriendListAPI(generics.ListAPIView):
+    """
+    The friends of the logged-in user, by username. The friend ids come from the friend graph cache.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+    serializer_class = FriendSerializer
+    pagination_class = FriendListPagination
+
+    def get_friend_ids(self):
+        return friends.friend_ids(self.request.user.pk)
+
+    def get_queryset(self):
+        return get_user_model().objects.filter(pk__in=self.get_friend_ids()).order_by('username', 'pk')
+
+
+class MutualFriendListAPI(FriendListAPI):
+    """
+    The friends the logged-in user has in common with another user.
+    """
+
+    def get_friend_ids(self):
+        return friends.mutual_friend_ids(self.request.user.pk, self.kwargs['user_pk'])
+
+
+class FriendSuggestionsAPI(generics.ListAPIView):
+    """
+    Friends of friends, most mutual friends first. ?limit= (at most 50, default 20).
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+    serializer_class = FriendSuggestionSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        try:
+            limit = min(max(int(self.request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            raise ValidationError({'limit': "A valid integer is required."})
+        suggestions = friends.suggest_friends(self.request.user.pk, limit=limit)
+        users = get_user_model().objects.in_bulk([user_pk for user_pk, _ in suggestions])
+        results = []
+        for user_pk, mutual_friend_count in suggestions:
+            if user_pk in users:
+                users[user_pk].mutual_friend_count = mutual_friend_count
+                results.append(users[user_pk])
+        return results
+
+
+class FriendRequestListCreateAPI(generics.ListCreateAPIView):
+    """
+    GET: pending friend requests received by the logged-in user (?direction=sent for the ones they sent).
+    POST: send a friend request, accepts theirs instead if the other user already sent one.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+    serializer_class = FriendshipSerializer
+    pagination_class = FriendListPagination
+
+    def get_queryset(self):
+        side = 'requested_by_user' if self.request.query_params.get('direction') == 'sent' else 'sent_to_user'
+        return (
+            Friendship.objects.filter(**{side: self.request.user}, status=Friendship.Status.PENDING)
+            .select_related('requested_by_user', 'sent_to_user').order_by('-created_at')
+        )
+
+    def create(self, request, *args, **kwargs):
+        serializer = FriendRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            friendship = friends.send_request(request.user, serializer.validated_data['user'], serializer.validated_data.get('message'))
+        except friends.FriendshipError as error:
+            raise ValidationError({'detail': str(error)})
+        return response.Response(FriendshipSerializer(friendship).data, status=status.HTTP_201_CREATED)
+
+
+class FriendRequestAnswerAPI(APIView):
+    """
+    Accept or reject (`transition`) a pending friend request received by the logged-in user.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+    transition = None
+
+    def post(self, request, pk):
+        friendship = Friendship.objects.filter(pk=pk, sent_to_user=request.user).select_related('requested_by_user', 'sent_to_user').first()
+        if friendship is None:
+            raise NotFound()
+        answer = friends.accept_request if self.transition == 'accept' else friends.reject_request
+        try:
+            answer(friendship, request.user)
+        except friends.FriendshipError as error:
+            raise ValidationError({'detail': str(error)})
+        return response.Response(FriendshipSerializer(friendship).data, status=status.HTTP_200_OK)
+
+
+class FriendAPI(APIView):
+    """
+    DELETE: unfriend a user, or cancel the pending request between the logged-in user and them.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def delete(self, request, user_pk):
+        if not friends.remove_friendship(request.user, user_pk):
+            raise NotFound()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
 # # Social Logins
 
 # # Google
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Additional Apps:
     'django_extensions',
@@ -150,17 +151,67 @@ AUTH_USER_MODEL = 'users.User'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Notification outbox, drained by "python manage.py send_notifications" (users/notifications.py)
+NOTIFICATION_OUTBOX = {
+    'BATCH_SIZE': 100,              # notifications claimed per batch (sent over one mail connection)
+    'POLL_INTERVAL': 2,             # seconds between two polls of the outbox when it is empty
+    'MAX_ATTEMPTS': 5,              # then the notification is marked FAILED
+    'RETRY_BACKOFF': 30,            # seconds before the first retry, doubled on every further attempt
+    'MAX_RETRY_BACKOFF': 60 * 60,   # 1 hour
+    'HTTP_TIMEOUT': 10,             # seconds, ntfy.sh pushes
+    'CLAIM_TIMEOUT': 10 * 60,       # seconds, then a batch claimed by a worker that died is sent by another one
+}
+
 # TODO: Nishil: Remove this once profile pictures are moved to S3
 # To store profile pictures
 MEDIA_ROOT = BASE_DIR / 'assets/profile_pictures'
 MEDIA_URL = '/assets/profile_pictures/'
 
+# Stream every upload to a temporary file, never buffer it in memory whatever its size
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Resumable chunked uploads of the video/podcast files (content/uploads.py)
+MEDIA_UPLOADS = {
+    'TEMP_DIR': None,                       # where the uploads are assembled, defaults to <system temp dir>/vv_uploads. Same filesystem as MEDIA_ROOT: finalizing is then a rename
+    'CHUNK_SIZE': 8 * 1024 * 1024,          # default chunk size, clients can pick theirs between MIN_CHUNK_SIZE and MAX_CHUNK_SIZE
+    'MIN_CHUNK_SIZE': 256 * 1024,
+    'MAX_CHUNK_SIZE': 64 * 1024 * 1024,
+    'MAX_SIZE': 20 * 1024 ** 3,             # 20 GB per file
+    'EXPIRY': timedelta(days=1),            # unfinished uploads are deleted past this by "python manage.py sweep_expired_uploads"
+    'FFPROBE': 'ffprobe',                   # used to read the duration of the uploaded files, None to skip it
+}
+
+# Byte serving of the video/podcast files, with Range support (content/streaming.py)
+MEDIA_STREAMING = {
+    'OFFLOAD': None,                        # 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd): the web server sends the bytes
+    'OFFLOAD_PREFIX': '/protected-media/',  # internal nginx location aliased to MEDIA_ROOT, with 'x-accel-redirect'
+    'BLOCK_SIZE': 64 * 1024,                # bytes read at a time when Django sends a range itself
+}
+
+# Resized variants of the profile pictures, generated in the background after an upload (users/profile_pictures.py)
+PROFILE_PICTURES = {
+    'SIZES': (64, 256),             # pixels, square
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'STORAGE': 'default',           # alias in STORAGES, e.g. {'BACKEND': 'storages.backends.s3.S3Storage', ...} for S3
+    'WORKERS': 2,                   # background threads resizing the pictures, per process
+    'ASYNC': True,                  # False: resize in the request, once its transaction commits (tests)
+}
+
 
 # Django REST Framework
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'knox.auth.TokenAuthentication',
+        # knox.auth.TokenAuthentication with a cache of the verified tokens (see TOKEN_AUTH_CACHE below)
+        'users.auth.CachedTokenAuthentication',
+    ),
+
+    # only limits the views that set a rate_limit_scope, see RATE_LIMITS below
+    'DEFAULT_THROTTLE_CLASSES': (
+        'users.ratelimit.RateLimitThrottle',
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -198,6 +249,123 @@ REST_KNOX = {
     # 'MIN_REFRESH_INTERVAL': 60 * 60 * 24 * 7, # 7 days
 }
 
+# Rate limits of the auth endpoints, per view rate_limit_scope and per key type (users/ratelimit.py)
+RATE_LIMITS = {
+    'BACKEND': 'users.ratelimit.InMemoryRateLimitBackend',   # per process, or 'users.ratelimit.CacheRateLimitBackend' shared by all of them
+    'OPTIONS': {},                                          # e.g. {'cache': 'default'} for the cache backend
+    'RULES': {
+        'login': {'ip': '30/m', 'email': '10/m'},
+        'register': {'ip': '10/h'},
+        'resend_verification': {'ip': '10/h', 'email': '5/h'},
+        'password_reset_request': {'ip': '10/h', 'email': '5/h'},
+        'password_reset': {'ip': '30/h'},
+    },
+}
+
+# Deletion of the expired EmailVerification/PasswordReset/knox AuthToken rows (users/sweeper.py)
+EXPIRED_TOKEN_SWEEPER = {
+    'BATCH_SIZE': 1000,         # rows deleted per statement
+    'INTERVAL': 60 * 60,        # seconds between two runs with --loop or RUN_IN_PROCESS
+    'RUN_IN_PROCESS': False,    # sweep from a background thread of every web process, instead of "python manage.py sweep_expired_tokens"
+}
+
+# Cache of the verified knox tokens, per process (users/auth.py)
+TOKEN_AUTH_CACHE = {
+    'ENABLED': True,
+    'TTL': 60,              # seconds, keep it much shorter than TOKEN_TTL: other processes accept a logged out token this long
+    'MAX_ENTRIES': 10_000,  # least recently used tokens are evicted past this
+}
+
+# Friend graph queries and their per process cache of the friend ids (users/friends.py)
+FRIEND_GRAPH = {
+    'CACHE_ENABLED': True,
+    'CACHE_TTL': 60 * 5,            # seconds, how long other processes can serve friends changed elsewhere
+    'CACHE_MAX_USERS': 100_000,     # least recently used users are evicted past this
+    'SUGGESTION_FANOUT': 200,       # friend-of-friend suggestions look at the friends of at most this many friends
+}
+
+# Activity feed, fanned out to the timelines of the friends (user_interactions/activity.py)
+ACTIVITY_FEED = {
+    'FANOUT_THRESHOLD': 1000,       # the activities of users with more friends are merged into the feeds on read
+    'BATCH_SIZE': 1000,             # timeline entries per INSERT
+    'MAX_TIMELINE_LENGTH': 1000,    # older entries are deleted by "python manage.py trim_timelines"
+    'WORKERS': 2,                   # background threads doing the fan-out
+    'ASYNC': True,                  # False: fan out in the request, once the transaction commits
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,           # upper bound for ?page_size=
+}
+
+# Cursor pagination of the video feed (content/pagination.py)
+CONTENT_FEED_PAGINATION = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,   # upper bound for ?page_size=
+}
+
+# Cursor pagination of the comment threads (user_interactions/pagination.py)
+COMMENT_PAGINATION = {
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,   # upper bound for ?page_size=
+}
+
+# Keyset (cursor) pagination of the playlist entries (user_interactions/playlists.py)
+PLAYLIST_PAGINATION = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 200,   # upper bound for ?page_size=
+}
+
+# Trending videos, refreshed by "python manage.py refresh_trending" (content/trending.py)
+TRENDING = {
+    'TOP_K': 50,            # length of every precomputed list
+    'WINDOW_DAYS': 30,      # only videos uploaded within this window can trend
+    'LIKE_WEIGHT': 10,      # a like counts as this many views
+    'GRAVITY': 1.5,         # how fast the score of a video decays with its age
+}
+
+# Related contents and home feed recommendations, rebuilt by "python manage.py build_recommendations" (content/recommendations.py)
+RECOMMENDATIONS = {
+    'TOP_N': 20,                    # related contents kept per content
+    'USER_TOP_N': 50,               # recommendations kept per user
+    'LIKE_WEIGHT': 1.0,             # weight of a like in the co-occurrences
+    'PLAYLIST_WEIGHT': 1.0,         # weight of a playlist entry in the co-occurrences
+    'CONTENT_WEIGHT': 0.3,          # weight of the metadata (categories, tags, ...) similarity, 0 to ignore it
+    'MAX_ROW_ITEMS': 500,           # users/playlists with more contents are sampled down to this many
+    'MAX_FEATURE_FREQUENCY': 0.05,  # metadata found on a larger share of the contents is ignored
+    'BLOCK_SIZE': 2000,             # contents/users scored per sparse matrix product, bounds the memory used
+    'CHUNK_SIZE': 10_000,           # rows per DB fetch while loading
+    'BATCH_SIZE': 5000,             # rows per INSERT
+    'SEED': 0,                      # of the sampling, the same data gives the same lists
+}
+
+# In-process cache of the Category/Language/Region/Hashtag/Tag lookups (content/lookups.py)
+METADATA_LOOKUP_CACHE = {
+    'TTL': 60 * 5,          # seconds, how long another process can serve a row changed elsewhere
+    'MAX_ENTRIES': 10_000,  # per model, least recently used entries are evicted past this
+    'SHARED_CACHE': None,   # alias in CACHES of an optional cache shared by all processes, e.g. 'default'
+}
+
+# Video full-text search (content/search.py)
+CONTENT_SEARCH = {
+    'BACKEND': 'content.search.PostgresSearchBackend',   # or 'content.search.InMemorySearchBackend' (tests, local development)
+    'OPTIONS': {'config': 'simple'},                      # text search configuration of the Postgres backend
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,                                 # upper bound for ?limit=
+}
+
+# Cached anonymous responses of the video list/detail and trending endpoints (content/response_cache.py)
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'default',     # alias in CACHES, use a cache shared by all processes (e.g. Redis) so they all see the invalidations
+    'TIMEOUT': 60 * 5,      # seconds, also bounds how long a renamed tag/category/language or the counters of a list can be stale
+}
+
+# Buffered view counts (user_interactions/view_counts.py)
+VIEW_COUNT_BUFFER = {
+    'FLUSH_INTERVAL': 5,                # seconds between two flushes of the pending view counts to the DB
+    'MAX_PENDING': 1000,                # flush early once this many contents have pending views
+    'DEDUP_WINDOW': 60 * 30,            # 30 minutes, repeat views by the same viewer within this window are counted once
+    'DEDUP_MAX_ENTRIES': 100_000,       # upper bound of remembered (viewer, content) pairs
+}
+
 # Google OAuth2 credentials from Google Developer Console
 GOOGLE_OAUTH = {
     'client_id': config['Google']['OAUTH2_CLIENT_ID'],
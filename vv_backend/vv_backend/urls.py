@@ -18,7 +18,9 @@ from django.conf import settings
 from django.urls import path, include
 
 urlpatterns = [
-    path('user/', include('users.urls'))
+    path('user/', include('users.urls')),
+    path('content/', include('content.urls')),
+    path('interactions/', include('user_interactions.urls')),
 ]
 
 